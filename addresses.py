@@ -0,0 +1,105 @@
+"""
+Postal addresses as value objects, with formatted copies kept on the row.
+
+Customers, suppliers and our company each store their addresses as separate
+columns (addr1, addr2, city, ...). Address.of() normalises them: it strips
+whitespace and turns empty strings into None. Address.format() lays them out
+as the block printed on documents:
+
+    10 Hughes, A204
+    Irvine, CA 92618
+    USA
+
+Missing parts are left out, so a null field never shows up as "None" or as a
+stray comma.
+
+The formatted blocks are also materialised in *_formatted columns:
+Customer.ship_to_formatted / bill_to_formatted, Supplier.address_formatted /
+bill_to_formatted and OurCompany.address_formatted. models.py registers them
+with keep_formatted(). They are rebuilt in before_insert / before_update, and
+only when one of their source columns changed, so screens and document
+renderers read a ready-made string instead of formatting per document. Core
+bulk loaders add them with formatted_values(). Existing databases are
+backfilled by update_address_schema.py.
+
+formatted() falls back to formatting on the fly for a row whose column is
+still empty, e.g. a database that has not been backfilled yet.
+"""
+from collections import namedtuple
+
+from sqlalchemy import event, inspect
+
+_specs = {}  # model class -> {formatted column: (addr1, addr2, city, state, zip, country) attribute names}
+
+
+class Address(namedtuple("Address", "line1 line2 city state postal_code country")):
+    __slots__ = ()
+
+    @classmethod
+    def of(cls, *values):
+        return cls(*(" ".join(str(v).split()) or None if v is not None else None for v in values))
+
+    def city_line(self):
+        region = " ".join(p for p in (self.state, self.postal_code) if p)
+        return ", ".join(p for p in (self.city, region) if p)
+
+    def lines(self):
+        return [p for p in (self.line1, self.line2, self.city_line(), self.country) if p]
+
+    def format(self):
+        return "\n".join(self.lines())
+
+
+def with_name(name, formatted):
+    """Prefixes an address block with the addressee, skipping whichever is empty."""
+    return "\n".join(p for p in (name, formatted) if p)
+
+
+def keep_formatted(cls, **columns):
+    """
+    Keeps each formatted column of `cls` in step with its source attributes,
+    given as column=(addr1, addr2, city, state, zip, country) attribute names.
+    """
+    _specs[cls] = columns
+
+    @event.listens_for(cls, "before_insert")
+    def fill(mapper, connection, target):
+        for column, fields in columns.items():
+            setattr(target, column, Address.of(*(getattr(target, f) for f in fields)).format() or None)
+
+    @event.listens_for(cls, "before_update")
+    def refresh(mapper, connection, target):
+        state = inspect(target)
+        for column, fields in columns.items():
+            if any(state.attrs[f].history.has_changes() for f in fields):
+                setattr(target, column, Address.of(*(getattr(target, f) for f in fields)).format() or None)
+
+
+def formatted_values(cls, row):
+    """The formatted columns for a plain row dict (for Core bulk inserts)."""
+    return {
+        column: Address.of(*(row.get(f) for f in fields)).format() or None
+        for column, fields in _specs[cls].items()
+    }
+
+
+def formatted(obj, column):
+    """The materialised address block of `obj`, formatting it if it was never stored."""
+    value = getattr(obj, column)
+    if value is None:
+        value = Address.of(*(getattr(obj, f) for f in _specs[type(obj)][column])).format()
+    return value
+
+
+def refresh_all(session, cls):
+    """Recomputes the formatted columns of every row of `cls`. Returns the number of rows changed."""
+    changed = 0
+    for obj in session.query(cls):
+        values = {column: Address.of(*(getattr(obj, f) for f in fields)).format() or None
+                  for column, fields in _specs[cls].items()}
+        if any(getattr(obj, column) != value for column, value in values.items()):
+            for column, value in values.items():
+                setattr(obj, column, value)
+            changed += 1
+    session.commit()
+    return changed
@@ -0,0 +1,237 @@
+"""
+HTTP/JSON API over the ERP models.
+
+Runs alongside the interactive CLI so several staff members and integrations
+can read and write the same database concurrently. Every request gets its own
+AsyncSession from a pooled async engine; nothing is shared between requests.
+
+Run with:
+    uvicorn api:app --host 0.0.0.0 --port 8000 --workers 1
+"""
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from fastapi import FastAPI, Depends, HTTPException, Body, Query
+from sqlalchemy import select, func, or_, DateTime
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.exc import StaleDataError
+
+import db_config
+from models import (
+    Base, DATABASE_URL,
+    Supplier, Customer, Product,
+    PurchaseOrder, PurchaseOrderLine,
+    CustomerOrder, CustomerOrderLine,
+)
+import services
+from services import ValidationError
+
+# The CLI's database through its async driver (aiosqlite / aiomysql / asyncpg)
+ASYNC_DATABASE_URL = db_config.async_url(DATABASE_URL)
+
+# Orders are created through the service layer so the API shares the CLI's validation rules
+ORDER_CREATORS = {
+    PurchaseOrder: (services.create_po, "supplier_id"),
+    CustomerOrder: (services.create_co, "customer_id"),
+}
+
+# Columns clients may never set directly
+READ_ONLY_FIELDS = {"id", "version_id"}
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# path -> (model, searchable columns, line model, line FK column)
+RESOURCES = {
+    "suppliers": (Supplier, ["name", "contact_name", "email", "city", "country"], None, None),
+    "customers": (Customer, ["customer_name", "contact_name", "email_address", "ship_to_city"], None, None),
+    "products": (Product, ["sku", "sku_number", "name", "description", "category"], None, None),
+    "purchase-orders": (PurchaseOrder, ["po_number", "vendor_reference", "status", "notes"], PurchaseOrderLine, "po_id"),
+    "customer-orders": (CustomerOrder, ["invoice_number", "po_number", "status", "notes"], CustomerOrderLine, "co_id"),
+}
+
+
+def create_async_db_engine(db_url=ASYNC_DATABASE_URL, pool_size=10, max_overflow=20):
+    options = db_config.engine_options(db_url)
+    # Concurrent requests need a real pool, SQLite included
+    options.update(pool_size=pool_size, max_overflow=max_overflow, pool_pre_ping=True)
+    is_sqlite = make_url(db_url).get_backend_name() == "sqlite"
+    if is_sqlite:
+        options.pop("connect_args", None)  # aiosqlite already gives each connection its own thread
+    engine = create_async_engine(db_url, **options)
+    if is_sqlite:
+        db_config.install_sqlite_pragmas(engine.sync_engine)
+    return engine
+
+
+def row_to_dict(obj):
+    """Serializes a model instance's columns (and lines, for orders) to JSON-safe values."""
+    data = {}
+    for col in obj.__table__.columns:
+        val = getattr(obj, col.key)
+        if isinstance(val, datetime):
+            val = val.isoformat()
+        data[col.key] = val
+    if "lines" in obj.__dict__:
+        data["lines"] = [row_to_dict(l) for l in obj.lines]
+    return data
+
+
+def coerce_fields(model, payload):
+    """
+    Validates payload keys against the model's columns and converts ISO date
+    strings for DateTime columns. Raises 422 for unknown or read-only fields.
+    """
+    columns = {c.key: c for c in model.__table__.columns}
+    unknown = [k for k in payload if k not in columns or k in READ_ONLY_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown or read-only fields: {', '.join(unknown)}")
+
+    values = {}
+    for key, val in payload.items():
+        if isinstance(columns[key].type, DateTime) and isinstance(val, str):
+            try:
+                val = datetime.fromisoformat(val)
+            except ValueError:
+                raise HTTPException(status_code=422, detail=f"Invalid date for '{key}': {val}")
+        values[key] = val
+    return values
+
+
+def create_app(db_url=ASYNC_DATABASE_URL):
+    engine = create_async_db_engine(db_url)
+    SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        yield
+        await engine.dispose()
+
+    app = FastAPI(title="ERP API", lifespan=lifespan)
+    app.state.engine = engine
+
+    async def get_db():
+        async with SessionLocal() as session:
+            yield session
+
+    for path, (model, search_cols, line_model, line_fk) in RESOURCES.items():
+        _register_resource(app, get_db, path, model, search_cols, line_model, line_fk)
+
+    return app
+
+
+def _register_resource(app, get_db, path, model, search_cols, line_model, line_fk):
+    has_lines = line_model is not None
+
+    def base_query():
+        stmt = select(model)
+        if has_lines:
+            stmt = stmt.options(selectinload(model.lines))
+        return stmt
+
+    async def load_or_404(session, item_id):
+        obj = (await session.execute(base_query().where(model.id == item_id))).scalar_one_or_none()
+        if obj is None:
+            raise HTTPException(status_code=404, detail=f"{model.__name__} {item_id} not found")
+        return obj
+
+    async def commit_or_409(session):
+        try:
+            await session.commit()
+        except IntegrityError as e:
+            await session.rollback()
+            raise HTTPException(status_code=409, detail=str(e.orig))
+        except StaleDataError:
+            await session.rollback()
+            raise HTTPException(status_code=409, detail=f"{model.__name__} was modified by another request; reload and retry")
+
+    @app.get(f"/{path}", name=f"list_{path}")
+    async def list_items(
+        q: str = Query(None, description="Case-insensitive substring search"),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        offset: int = Query(0, ge=0),
+        session: AsyncSession = Depends(get_db),
+    ):
+        stmt = base_query()
+        count_stmt = select(func.count()).select_from(model)
+        if q:
+            cond = or_(*[getattr(model, c).ilike(f"%{q}%") for c in search_cols])
+            stmt = stmt.where(cond)
+            count_stmt = count_stmt.where(cond)
+
+        total = (await session.execute(count_stmt)).scalar_one()
+        rows = (await session.execute(stmt.order_by(model.id).limit(limit).offset(offset))).scalars().all()
+        return {
+            "items": [row_to_dict(r) for r in rows],
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+        }
+
+    @app.get(f"/{path}/{{item_id}}", name=f"get_{path}")
+    async def get_item(item_id: int, session: AsyncSession = Depends(get_db)):
+        return row_to_dict(await load_or_404(session, item_id))
+
+    @app.post(f"/{path}", status_code=201, name=f"create_{path}")
+    async def create_item(payload: dict = Body(...), session: AsyncSession = Depends(get_db)):
+        payload = dict(payload)
+        lines = payload.pop("lines", None) or []
+        if lines and not has_lines:
+            raise HTTPException(status_code=422, detail="Unknown or read-only fields: lines")
+
+        if model in ORDER_CREATORS:
+            creator, parent_key = ORDER_CREATORS[model]
+            parent_id = payload.pop(parent_key, None)
+            try:
+                obj = await session.run_sync(creator, parent_id, payload, lines)
+            except ValidationError as e:
+                raise HTTPException(status_code=422, detail=e.errors)
+            except IntegrityError as e:
+                raise HTTPException(status_code=409, detail=str(e.orig))
+            return row_to_dict(await load_or_404(session, obj.id))
+
+        obj = model(**coerce_fields(model, payload))
+        session.add(obj)
+        await commit_or_409(session)
+        return row_to_dict(await load_or_404(session, obj.id))
+
+    @app.patch(f"/{path}/{{item_id}}", name=f"update_{path}")
+    async def update_item(item_id: int, payload: dict = Body(...), session: AsyncSession = Depends(get_db)):
+        obj = await load_or_404(session, item_id)
+        payload = dict(payload)
+        lines = payload.pop("lines", None)
+        if lines is not None and not has_lines:
+            raise HTTPException(status_code=422, detail="Unknown or read-only fields: lines")
+
+        # Optimistic locking: clients echo back the version_id they read
+        expected_version = payload.pop("version_id", None)
+        if expected_version is not None and hasattr(obj, "version_id") and expected_version != obj.version_id:
+            raise HTTPException(status_code=409, detail={
+                "message": f"{model.__name__} {item_id} was modified by another user",
+                "current": row_to_dict(obj),
+            })
+
+        for key, val in coerce_fields(model, payload).items():
+            setattr(obj, key, val)
+        if lines is not None:
+            # Lines are replaced as a whole; delete-orphan cascade removes the old ones
+            obj.lines = [line_model(**coerce_fields(line_model, {k: v for k, v in l.items() if k not in ("id", line_fk)}))
+                         for l in lines]
+
+        await commit_or_409(session)
+        session.expire(obj)
+        return row_to_dict(await load_or_404(session, item_id))
+
+    @app.delete(f"/{path}/{{item_id}}", status_code=204, name=f"delete_{path}")
+    async def delete_item(item_id: int, session: AsyncSession = Depends(get_db)):
+        obj = await load_or_404(session, item_id)
+        await session.delete(obj)
+        await commit_or_409(session)
+
+
+app = create_app()
@@ -0,0 +1,87 @@
+"""
+Load test for the ERP API (api.py).
+
+Fires a fixed number of GET requests at a fixed concurrency and reports
+requests per second plus latency percentiles.
+
+Usage:
+    uvicorn api:app --port 8000 &
+    python api_load_test.py --url http://127.0.0.1:8000 --concurrency 32 --requests 5000
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+import httpx
+
+DEFAULT_PATHS = [
+    "/products?limit=50",
+    "/customers?limit=50",
+    "/suppliers?limit=50",
+    "/purchase-orders?limit=20",
+    "/customer-orders?limit=20",
+    "/customers?q=tea&limit=20",
+]
+
+
+def percentile(sorted_vals, pct):
+    if not sorted_vals:
+        return 0.0
+    idx = min(len(sorted_vals) - 1, int(round(pct / 100.0 * (len(sorted_vals) - 1))))
+    return sorted_vals[idx]
+
+
+async def run_load(base_url, paths, concurrency, total_requests):
+    latencies = []
+    errors = 0
+    path_cycle = itertools.cycle(paths)
+    remaining = iter(range(total_requests))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+
+        async def worker():
+            nonlocal errors
+            for _ in remaining:
+                path = next(path_cycle)
+                t0 = time.perf_counter()
+                try:
+                    resp = await client.get(path)
+                    if resp.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - t0)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the ERP HTTP API.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--path", action="append", help="Path to request (repeatable). Defaults to a mix of list endpoints.")
+    args = parser.parse_args()
+
+    paths = args.path or DEFAULT_PATHS
+    print(f"Target: {args.url}  Concurrency: {args.concurrency}  Requests: {args.requests}")
+
+    latencies, errors, elapsed = asyncio.run(run_load(args.url, paths, args.concurrency, args.requests))
+    latencies.sort()
+
+    print(f"Completed:   {len(latencies)} requests in {elapsed:.2f}s")
+    print(f"Errors:      {errors}")
+    print(f"Throughput:  {len(latencies) / elapsed:.1f} req/s")
+    print(f"Latency p50: {percentile(latencies, 50) * 1000:.1f} ms")
+    print(f"Latency p95: {percentile(latencies, 95) * 1000:.1f} ms")
+    print(f"Latency p99: {percentile(latencies, 99) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
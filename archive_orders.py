@@ -0,0 +1,325 @@
+"""
+Archival of settled orders into per-year history databases.
+
+Orders that are settled (POs Closed/Cancelled, COs Invoiced/Cancelled) and
+older than --months are moved out of the working tables of app.db. Each order
+goes to archive/history_<year>.db, by the year of its order date, together
+with its dependent rows:
+
+    PO  -> purchase_order_lines, documents (PurchaseOrder)
+    CO  -> customer_order_lines, invoices, invoice_lines, documents (CustomerOrder / Invoice)
+
+Orders with a Queued or Running render job stay until the job finishes.
+Document files stay where they are; only their rows move. The next
+`document_search.py index` drops them from the search index.
+
+The move runs on one SQLite connection with the year's file ATTACHed. Rows
+are copied with INSERT ... SELECT into the history file and committed there
+first. Only then are they deleted from app.db in a second transaction. (Under
+WAL, SQLite does not make a transaction atomic across attached files.) A
+crash between the two leaves rows in both places. Re-running is safe: the copy
+skips rows already in history unchanged, and the delete only removes rows
+present there. SQLite can hand an archived order's id to a new order, so a
+live row whose id is in history with different data is never copied over it:
+the year is refused with an ArchiveError and left in app.db. The delete transaction also logs each removed row to change_log
+(see change_log.py) as a delete with the year it was archived to.
+
+History is read through open_history(). It attaches every history file and
+creates TEMP views, all_<table>, that UNION ALL the live table with each
+year's table and add an `archive` column ('current' or the year). Views are
+read-only, and the history files are only written by this job. SQLite allows
+10 attached files per connection, so at most 10 years can be open at once.
+
+Usage:
+    python archive_orders.py run --months 18 --dry-run
+    python archive_orders.py run --months 18
+    python archive_orders.py status
+    python archive_orders.py find PO-2023-0042
+"""
+import argparse
+import contextlib
+import glob
+import os
+import re
+from datetime import datetime
+
+from sqlalchemy import text
+from tabulate import tabulate
+
+from models import Base, get_engine, DATABASE_URL
+
+ARCHIVE_DIR = "./archive"
+DEFAULT_MONTHS = 18
+MAX_ATTACHED = 10
+SETTLED_PO = ("Closed", "Cancelled")
+SETTLED_CO = ("Invoiced", "Cancelled")
+
+# Temp tables filled per run: the order ids being archived, and the invoices hanging off them
+_PO = "SELECT id FROM temp.archive_ids WHERE kind = 'po' AND year = :year"
+_CO = "SELECT id FROM temp.archive_ids WHERE kind = 'co' AND year = :year"
+_INV = f"SELECT id FROM main.invoices WHERE customer_order_id IN ({_CO})"
+
+# (table, WHERE clause on the live table) in parent-first order; deletes run in reverse
+ARCHIVE_PLAN = [
+    ("purchase_orders", f"id IN ({_PO})"),
+    ("purchase_order_lines", f"po_id IN ({_PO})"),
+    ("customer_orders", f"id IN ({_CO})"),
+    ("customer_order_lines", f"co_id IN ({_CO})"),
+    ("invoices", f"customer_order_id IN ({_CO})"),
+    ("invoice_lines", f"invoice_id IN ({_INV})"),
+    ("documents", f"(reference_type = 'PurchaseOrder' AND reference_id IN ({_PO})) "
+                  f"OR (reference_type = 'CustomerOrder' AND reference_id IN ({_CO})) "
+                  f"OR (reference_type = 'Invoice' AND reference_id IN ({_INV}))"),
+]
+ARCHIVED_TABLES = [table for table, _ in ARCHIVE_PLAN]
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def months_ago(months, now=None):
+    now = now or datetime.now()
+    year, month = divmod(now.year * 12 + now.month - 1 - months, 12)
+    return now.replace(year=year, month=month + 1, day=min(now.day, 28))
+
+
+def history_path(year, archive_dir=ARCHIVE_DIR):
+    return os.path.join(archive_dir, f"history_{year}.db")
+
+
+def history_years(archive_dir=ARCHIVE_DIR):
+    years = []
+    for path in glob.glob(os.path.join(archive_dir, "history_*.db")):
+        match = re.fullmatch(r"history_(\d{4})\.db", os.path.basename(path))
+        if match:
+            years.append(int(match.group(1)))
+    return sorted(years)
+
+
+def _ensure_history_db(year, archive_dir):
+    """Creates the year's file with the archived tables' schema from models.py."""
+    os.makedirs(archive_dir, exist_ok=True)
+    engine = get_engine(f"sqlite:///{history_path(year, archive_dir)}")
+    Base.metadata.create_all(engine, tables=[Base.metadata.tables[t] for t in ARCHIVED_TABLES])
+    engine.dispose()
+
+
+def _columns(conn, schema, table):
+    return [row[1] for row in conn.exec_driver_sql(f'PRAGMA {schema}.table_info("{table}")')]
+
+
+def _shared_columns(conn, schema, table):
+    """Columns present in both the live table and the history copy (app.db may predate a schema update)."""
+    history = set(_columns(conn, schema, table))
+    return [c for c in _columns(conn, "main", table) if c in history]
+
+
+def _attach(conn, year, archive_dir):
+    conn.exec_driver_sql(f"ATTACH DATABASE ? AS h{year}", (history_path(year, archive_dir),))
+
+
+@contextlib.contextmanager
+def _autocommit(engine):
+    """
+    An autocommit connection (ATTACH/DETACH cannot run inside a transaction, so
+    transactions are opened explicitly). History files and views are dropped
+    before the connection goes back to the pool.
+    """
+    if engine.dialect.name != "sqlite":
+        raise ArchiveError("Order archival uses ATTACHed SQLite files and needs the SQLite backend.")
+    conn = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        yield conn
+    finally:
+        for table in ARCHIVED_TABLES:
+            conn.exec_driver_sql(f"DROP VIEW IF EXISTS temp.all_{table}")
+        for row in conn.exec_driver_sql("PRAGMA database_list").fetchall():
+            if re.fullmatch(r"h\d{4}", row[1]):
+                conn.exec_driver_sql(f"DETACH DATABASE {row[1]}")
+        conn.close()
+
+
+@contextlib.contextmanager
+def _transaction(conn):
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.exec_driver_sql("ROLLBACK")
+        raise
+    conn.exec_driver_sql("COMMIT")
+
+
+def select_candidates(conn, cutoff):
+    """Fills temp.archive_ids with settled orders dated before cutoff. Returns {year: (pos, cos)}."""
+    conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS archive_ids (kind TEXT, id INTEGER, year INTEGER, "
+                         "PRIMARY KEY (kind, id))")
+    conn.exec_driver_sql("DELETE FROM temp.archive_ids")
+    def busy(kind):
+        return f"SELECT target_id FROM main.render_jobs WHERE status IN ('Queued', 'Running') AND kind = '{kind}'"
+
+    params = {"cutoff": cutoff.strftime("%Y-%m-%d %H:%M:%S"),  # DateTime columns are stored as ISO text
+              "po_1": SETTLED_PO[0], "po_2": SETTLED_PO[1], "co_1": SETTLED_CO[0], "co_2": SETTLED_CO[1]}
+    conn.execute(text(
+        "INSERT INTO temp.archive_ids (kind, id, year) "
+        "SELECT 'po', id, CAST(strftime('%Y', date) AS INTEGER) FROM main.purchase_orders "
+        f"WHERE status IN (:po_1, :po_2) AND date < :cutoff AND id NOT IN ({busy('po_pdf')})"), params)
+    conn.execute(text(
+        "INSERT INTO temp.archive_ids (kind, id, year) "
+        "SELECT 'co', id, CAST(strftime('%Y', date) AS INTEGER) FROM main.customer_orders "
+        f"WHERE status IN (:co_1, :co_2) AND date < :cutoff AND id NOT IN ({busy('invoice_excel')}) "
+        "AND id NOT IN (SELECT customer_order_id FROM main.invoices WHERE customer_order_id IS NOT NULL "
+        f"AND id IN ({busy('invoice_pdf')}))"), params)
+    rows = conn.exec_driver_sql("SELECT year, kind, count(*) FROM temp.archive_ids GROUP BY year, kind").fetchall()
+    summary = {}
+    for year, kind, n in rows:
+        pos, cos = summary.get(year, (0, 0))
+        summary[year] = (pos + n, cos) if kind == "po" else (pos, cos + n)
+    return dict(sorted(summary.items()))
+
+
+def archive_orders(engine, months=DEFAULT_MONTHS, archive_dir=ARCHIVE_DIR, dry_run=False, now=None):
+    """
+    Moves settled orders older than `months` into per-year history files.
+    Returns {year: {table: rows moved}} (for a dry run: {year: {'purchase_orders': n, 'customer_orders': n}}).
+    """
+    cutoff = months_ago(months, now)
+    with _autocommit(engine) as conn:
+        candidates = select_candidates(conn, cutoff)
+        if dry_run:
+            return {year: {"purchase_orders": pos, "customer_orders": cos} for year, (pos, cos) in candidates.items()}
+
+        moved = {}
+        for year in candidates:
+            _ensure_history_db(year, archive_dir)
+            _attach(conn, year, archive_dir)
+            try:
+                schema = f"h{year}"
+                counts = dict.fromkeys(ARCHIVED_TABLES, 0)
+                with _transaction(conn):
+                    for table, where in ARCHIVE_PLAN:
+                        cols = ", ".join(f'"{c}"' for c in _shared_columns(conn, schema, table))
+                        # An id already in history must hold the same row (a crash re-run); anything else
+                        # is a reused id, and copying over it would destroy history
+                        conflicts = conn.execute(text(
+                            f"SELECT id FROM (SELECT {cols} FROM main.{table} WHERE {where} "
+                            f"EXCEPT SELECT {cols} FROM {schema}.{table}) "
+                            f"WHERE id IN (SELECT id FROM {schema}.{table}) ORDER BY id"), {"year": year}).scalars().all()
+                        if conflicts:
+                            raise ArchiveError(
+                                f"{table} id(s) {', '.join(str(i) for i in conflicts[:10])} are already in "
+                                f"{history_path(year, archive_dir)} with different data; nothing archived for {year}")
+                        conn.execute(text(
+                            f"INSERT INTO {schema}.{table} ({cols}) SELECT {cols} FROM main.{table} "
+                            f"WHERE ({where}) AND id NOT IN (SELECT id FROM {schema}.{table})"), {"year": year})
+                with _transaction(conn):
+                    for table, where in reversed(ARCHIVE_PLAN):
+                        # Only rows that made it into history are removed
+                        moved_rows = f"FROM main.{table} WHERE ({where}) AND id IN (SELECT id FROM {schema}.{table})"
+                        # Change log consumers see archived rows as deletes
+                        conn.execute(text(
+                            "INSERT INTO main.change_log (table_name, row_id, operation, data, changed_at) "
+                            f"SELECT '{table}', id, 'delete', '{{\"archived_to\": ' || :year || ', \"id\": ' || id || '}}', "
+                            f":now {moved_rows}"), {"year": year, "now": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")})
+                        counts[table] = conn.execute(text(f"DELETE {moved_rows}"), {"year": year}).rowcount
+                moved[year] = counts
+            finally:
+                conn.exec_driver_sql(f"DETACH DATABASE h{year}")
+        return moved
+
+
+def open_history(conn, archive_dir=ARCHIVE_DIR):
+    """
+    Attaches every history file to an autocommit SQLite connection and creates
+    TEMP views all_<table> (live rows plus archived rows, with an `archive`
+    column). Returns the attached years.
+    """
+    years = history_years(archive_dir)
+    if len(years) > MAX_ATTACHED:
+        raise ArchiveError(f"{len(years)} history files exceed SQLite's limit of {MAX_ATTACHED} attached databases")
+    attached = {row[1] for row in conn.exec_driver_sql("PRAGMA database_list")}
+    for year in years:
+        if f"h{year}" not in attached:
+            _attach(conn, year, archive_dir)
+    for table in ARCHIVED_TABLES:
+        parts = [f"SELECT {', '.join(_columns(conn, 'main', table))}, 'current' AS archive FROM main.{table}"]
+        for year in years:
+            cols = set(_columns(conn, f"h{year}", table))
+            select_list = ", ".join(c if c in cols else f"NULL AS {c}" for c in _columns(conn, "main", table))
+            parts.append(f"SELECT {select_list}, '{year}' AS archive FROM h{year}.{table}")
+        conn.exec_driver_sql(f"DROP VIEW IF EXISTS temp.all_{table}")
+        conn.exec_driver_sql(f"CREATE TEMP VIEW all_{table} AS " + " UNION ALL ".join(parts))
+    return years
+
+
+@contextlib.contextmanager
+def history_connection(engine, archive_dir=ARCHIVE_DIR):
+    """Context manager yielding a connection with the all_* views ready."""
+    with _autocommit(engine) as conn:
+        open_history(conn, archive_dir)
+        yield conn
+
+
+def find_order(engine, number, archive_dir=ARCHIVE_DIR):
+    """Looks a PO number or invoice number up across live and archived orders."""
+    with history_connection(engine, archive_dir) as conn:
+        pos = conn.execute(text(
+            "SELECT 'PO', po.id, po.po_number, po.date, po.status, s.name, po.archive, "
+            "(SELECT count(*) FROM all_purchase_order_lines l WHERE l.po_id = po.id AND l.archive = po.archive) "
+            "FROM all_purchase_orders po LEFT JOIN suppliers s ON s.id = po.supplier_id "
+            "WHERE po.po_number = :n OR po.vendor_reference = :n"), {"n": number}).fetchall()
+        cos = conn.execute(text(
+            "SELECT 'CO', co.id, co.invoice_number, co.date, co.status, c.customer_name, co.archive, "
+            "(SELECT count(*) FROM all_customer_order_lines l WHERE l.co_id = co.id AND l.archive = co.archive) "
+            "FROM all_customer_orders co LEFT JOIN customers c ON c.id = co.customer_id "
+            "WHERE co.invoice_number = :n OR co.po_number = :n"), {"n": number}).fetchall()
+        return [tuple(r) for r in pos + cos]
+
+
+def archive_status(engine, archive_dir=ARCHIVE_DIR):
+    """Row counts per table for the live database and each history file."""
+    with history_connection(engine, archive_dir) as conn:
+        rows = []
+        for table in ARCHIVED_TABLES:
+            counts = dict(conn.exec_driver_sql(
+                f"SELECT archive, count(*) FROM all_{table} GROUP BY archive").fetchall())
+            rows.append([table] + [counts.get(k, 0) for k in ["current"] + [str(y) for y in history_years(archive_dir)]])
+        return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move settled orders into per-year history databases.")
+    parser.add_argument("--db-url", default=DATABASE_URL)
+    parser.add_argument("--dir", default=ARCHIVE_DIR, help="History folder (default: %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    r = sub.add_parser("run", help="Archive settled orders")
+    r.add_argument("--months", type=int, default=DEFAULT_MONTHS, help="Only orders older than this")
+    r.add_argument("--dry-run", action="store_true", help="Show what would move")
+    sub.add_parser("status", help="Rows per table, live and per year")
+    f = sub.add_parser("find", help="Find an order by PO, invoice or vendor reference number")
+    f.add_argument("number")
+    args = parser.parse_args()
+
+    engine = get_engine(args.db_url)
+    try:
+        if args.command == "run":
+            result = archive_orders(engine, args.months, args.dir, args.dry_run)
+            if not result:
+                print("Nothing to archive.")
+            for year, counts in result.items():
+                detail = ", ".join(f"{t}: {n}" for t, n in counts.items() if n)
+                print(f"{year}: {'would move' if args.dry_run else 'moved'} {detail}")
+        elif args.command == "status":
+            years = [str(y) for y in history_years(args.dir)]
+            print(tabulate(archive_status(engine, args.dir), headers=["Table", "current"] + years, tablefmt="grid"))
+        elif args.command == "find":
+            rows = find_order(engine, args.number, args.dir)
+            print(tabulate(rows, headers=["Type", "ID", "Number", "Date", "Status", "Party", "Archive", "Lines"],
+                           tablefmt="grid") if rows else "Not found.")
+    except ArchiveError as e:
+        print(f"Error: {e}")
+
+
+if __name__ == "__main__":
+    main()
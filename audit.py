@@ -0,0 +1,289 @@
+"""
+Audit trail for customers, suppliers and orders.
+
+The edit screens (edit_customer, edit_supplier, edit_purchase_order,
+edit_customer_order) change rows in place. Every flush that touches one of
+the audited tables appends one audit_entries row per changed row. The rows
+are written in one executemany from the session's after_flush, so they
+commit or roll back with the edit. Each row holds only what changed, read
+from SQLAlchemy attribute history:
+
+    update   {"column": [old, new], ...} for the changed columns only
+    insert   {} - nothing before it existed
+    delete   {"column": [old, null], ...} for the row as it was deleted
+
+Order lines are filed under their order (entity purchase_order /
+customer_order), so an order's whole history is one range scan on the
+(entity_type, entity_id, changed_at) index.
+
+state_at() rebuilds an entity as of a past moment without stored snapshots.
+It starts from the current row and lines, then walks the entries newer than
+that moment backwards and undoes each one. The cost is proportional to the
+number of edits since then, not to the age of the order.
+
+Entries record who made the change: the name set with acting_as(), else
+ERP_USER, else the OS login. Orders moved out by archive_orders.py no longer
+have a current row, so state_at() returns None for them.
+
+Usage:
+    python audit.py history purchase_order 42
+    python audit.py state purchase_order 42 --at 2025-03-01
+"""
+import argparse
+import contextlib
+import contextvars
+import getpass
+import json
+import os
+from datetime import date, datetime
+
+from sqlalchemy import event, insert, select, inspect
+from sqlalchemy.orm import Mapper, Session, object_session
+from tabulate import tabulate
+
+# table -> (entity_type, column holding the entity id)
+AUDITED_TABLES = {
+    "customers": ("customer", "id"),
+    "suppliers": ("supplier", "id"),
+    "purchase_orders": ("purchase_order", "id"),
+    "purchase_order_lines": ("purchase_order", "po_id"),
+    "customer_orders": ("customer_order", "id"),
+    "customer_order_lines": ("customer_order", "co_id"),
+}
+# entity_type -> (header table, line table or None, line column pointing at the header)
+ENTITIES = {
+    "customer": ("customers", None, None),
+    "supplier": ("suppliers", None, None),
+    "purchase_order": ("purchase_orders", "purchase_order_lines", "po_id"),
+    "customer_order": ("customer_orders", "customer_order_lines", "co_id"),
+}
+# Updates are diffed before the UPDATE runs, so an old value that was never
+# loaded can still be read from the row
+ACTIONS = {"insert": "after_insert", "update": "before_update", "delete": "after_delete"}
+ENV_USER = "ERP_USER"
+PENDING_KEY = "audit_pending"
+
+_audit_table = None
+_actor = contextvars.ContextVar("audit_actor", default=None)
+
+
+def track(audit_table):
+    """Called once by models.py with the audit_entries table."""
+    global _audit_table
+    _audit_table = audit_table
+    if not event.contains(Session, "after_flush", _write_pending):
+        for action, event_name in ACTIONS.items():
+            event.listen(Mapper, event_name, _collect(action))
+        event.listen(Session, "after_flush", _write_pending)
+        event.listen(Session, "after_rollback", lambda session: session.info.pop(PENDING_KEY, None))
+
+
+@contextlib.contextmanager
+def acting_as(name):
+    """Attributes changes made inside the block to `name` (e.g. an API user)."""
+    token = _actor.set(name)
+    try:
+        yield
+    finally:
+        _actor.reset(token)
+
+
+def current_actor():
+    name = _actor.get() or os.environ.get(ENV_USER)
+    if name:
+        return name
+    try:
+        return getpass.getuser()
+    except Exception:
+        return None
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _plain(row):
+    """Values as they are stored in the diffs (dates as ISO strings, decimals as strings)."""
+    return json.loads(json.dumps(row, default=_json_value))
+
+
+def diff(state, action, connection=None):
+    """{column: [old, new]} for one flushed object, from its attribute history."""
+    changes = {}
+    if action == "insert":
+        return changes
+    unloaded = []
+    for attr in state.mapper.column_attrs:
+        column = attr.columns[0]
+        if action == "delete":
+            if attr.key in state.dict:
+                changes[column.name] = [state.dict[attr.key], None]
+            continue
+        history = state.attrs[attr.key].history
+        if not history.has_changes():
+            continue
+        new = history.added[0] if history.added else None
+        if history.deleted:
+            old = history.deleted[0]
+        elif history.unchanged:
+            old = history.unchanged[0]
+        else:
+            unloaded.append(column)  # assigned without being loaded first
+            changes[column.name] = [None, new]
+            continue
+        if old != new:
+            changes[column.name] = [old, new]
+    if unloaded and connection is not None:
+        table = state.mapper.local_table
+        stored = connection.execute(select(*unloaded).where(table.c.id == state.identity[0])).first()
+        for column, old in zip(unloaded, stored or ()):
+            if old == changes[column.name][1]:
+                del changes[column.name]
+            else:
+                changes[column.name][0] = old
+    return changes
+
+
+def _collect(action):
+    def listener(mapper, connection, target):
+        table_name = mapper.local_table.name
+        if _audit_table is None or table_name not in AUDITED_TABLES:
+            return
+        state = inspect(target)
+        changes = diff(state, action, connection)
+        if action == "update" and not changes:
+            return
+        entity_type, entity_column = AUDITED_TABLES[table_name]
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault(PENDING_KEY, []).append(
+                (entity_type, getattr(target, entity_column), table_name, target.id, action, changes))
+    return listener
+
+
+def _write_pending(session, flush_context):
+    record(session, session.info.pop(PENDING_KEY, []))
+
+
+def record(session, entries):
+    """
+    Writes (entity_type, entity_id, table_name, row_id, action, changes)
+    entries in one executemany. Code that updates audited tables with Core
+    statements calls this itself.
+    """
+    if _audit_table is None or not entries:
+        return
+    now, actor = datetime.utcnow(), current_actor()
+    session.connection().execute(insert(_audit_table), [
+        {
+            "entity_type": entity_type, "entity_id": entity_id, "table_name": table_name, "row_id": row_id,
+            "action": action, "changes": json.dumps(changes, default=_json_value, sort_keys=True),
+            "changed_at": now, "changed_by": actor,
+        }
+        for entity_type, entity_id, table_name, row_id, action, changes in entries
+    ])
+
+
+def history(session, entity_type, entity_id, since=None):
+    """Audit entries of one entity, newest first."""
+    t = _audit_table
+    query = (select(t).where(t.c.entity_type == entity_type, t.c.entity_id == entity_id)
+             .order_by(t.c.changed_at.desc(), t.c.id.desc()))
+    if since is not None:
+        query = query.where(t.c.changed_at > since)
+    return session.execute(query).all()
+
+
+def state_at(session, entity_type, entity_id, when):
+    """
+    The entity as it was at `when`: {"row": {...}, "lines": {line_id: {...}}}
+    (lines only for orders), or None if it did not exist yet or no longer exists.
+    """
+    if entity_type not in ENTITIES:
+        raise ValueError(f"Unknown entity '{entity_type}'. Valid options: {', '.join(ENTITIES)}")
+    header_name, line_name, line_column = ENTITIES[entity_type]
+    metadata = _audit_table.metadata
+    header = metadata.tables[header_name]
+    current = session.execute(select(header).where(header.c.id == entity_id)).mappings().first()
+    if current is None:
+        return None
+    rows = {header_name: {entity_id: _plain(dict(current))}}
+    if line_name:
+        rows[line_name] = {}
+        lines = metadata.tables[line_name]
+        for line in session.execute(select(lines).where(lines.c[line_column] == entity_id)).mappings():
+            rows[line_name][line["id"]] = _plain(dict(line))
+
+    for entry in history(session, entity_type, entity_id, since=when):
+        table_rows = rows[entry.table_name]
+        changes = json.loads(entry.changes)
+        if entry.action == "insert":
+            table_rows.pop(entry.row_id, None)
+        elif entry.action == "delete":
+            table_rows[entry.row_id] = {column: old for column, (old, new) in changes.items()}
+        else:
+            row = table_rows.setdefault(entry.row_id, {"id": entry.row_id})
+            for column, (old, new) in changes.items():
+                row[column] = old
+
+    row = rows[header_name].get(entity_id)
+    if row is None:
+        return None
+    state = {"row": row}
+    if line_name:
+        state["lines"] = rows[line_name]
+    return state
+
+
+def print_history(entries):
+    data = []
+    for e in entries:
+        changes = json.loads(e.changes)
+        summary = ", ".join(f"{c}: {old!r} -> {new!r}" for c, (old, new) in sorted(changes.items()))
+        data.append([e.changed_at.strftime("%Y-%m-%d %H:%M:%S"), e.changed_by, e.table_name, e.row_id,
+                     e.action, summary[:100]])
+    print(tabulate(data, headers=["Changed (UTC)", "By", "Table", "Row", "Action", "Changes"]))
+
+
+def main():
+    from models import get_engine, init_db, get_session
+
+    parser = argparse.ArgumentParser(description="Audit trail of customers, suppliers and orders.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    h = sub.add_parser("history", help="List the changes made to one record")
+    h.add_argument("entity", choices=ENTITIES)
+    h.add_argument("id", type=int)
+    s = sub.add_parser("state", help="Show a record as it was at a past date")
+    s.add_argument("entity", choices=ENTITIES)
+    s.add_argument("id", type=int)
+    s.add_argument("--at", required=True, help="YYYY-MM-DD or YYYY-MM-DDTHH:MM (UTC)")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    init_db(engine)
+    session = get_session(engine)
+
+    if args.command == "history":
+        print_history(history(session, args.entity, args.id))
+    elif args.command == "state":
+        try:
+            when = datetime.fromisoformat(args.at)
+        except ValueError:
+            print(f"Error: invalid date '{args.at}'")
+            return
+        state = state_at(session, args.entity, args.id, when)
+        if state is None:
+            print(f"{args.entity} {args.id} did not exist at {when}.")
+            return
+        print(tabulate(sorted(state["row"].items()), headers=["Field", "Value"]))
+        if state.get("lines"):
+            print()
+            columns = sorted({c for line in state["lines"].values() for c in line})
+            print(tabulate([[line.get(c) for c in columns] for _, line in sorted(state["lines"].items())],
+                           headers=columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Online backups of app.db.
+
+A snapshot is taken with SQLite's online backup API in small page steps
+(--pages per step, default 1024 pages = 4 MB). The source connection holds one
+read transaction for the whole copy. Under WAL, readers never block writers,
+so operators keep committing while a multi-GB backup runs. The snapshot is
+still exactly the database as of the moment the backup started, and the
+backup never restarts because of concurrent writes.
+
+Each snapshot is written as:
+    backups/app-YYYYmmdd-HHMMSS.db.gz     gzip of the copied file
+    backups/app-YYYYmmdd-HHMMSS.json      manifest: size, pages, sha256, integrity result
+
+PRAGMA integrity_check runs on the uncompressed copy in a background thread,
+while the archive is being compressed. Its result is written to the manifest.
+
+Retention (prune) keeps the newest --keep-last snapshots, plus the newest
+snapshot of each of the last --keep-daily days and --keep-weekly ISO weeks.
+Snapshots that failed verification never fill a daily or weekly slot.
+
+Restore decompresses into a temporary file next to the destination, checks it,
+and moves it into place with one rename. It refuses to overwrite an existing
+file unless --force is given.
+
+Usage:
+    python backup_db.py backup                       # snapshot + prune
+    python backup_db.py list
+    python backup_db.py restore backups/app-20250101-120000.db.gz restored.db
+    python backup_db.py verify backups/app-20250101-120000.db.gz
+    python backup_db.py prune --keep-last 5 --keep-daily 7 --keep-weekly 8
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.request import pathname2url
+
+from tabulate import tabulate
+
+from document_store import file_sha256, format_size
+
+DB_FILE = "app.db"
+BACKUP_DIR = "./backups"
+PAGES_PER_STEP = 1024
+STEP_SLEEP = 0.005  # seconds between steps, leaves room for checkpoints and other I/O
+COPY_BUFFER = 1024 * 1024
+KEEP_LAST, KEEP_DAILY, KEEP_WEEKLY = 3, 7, 4
+TIMESTAMP_FORMAT = "%Y%m%d-%H%M%S"
+
+
+class BackupError(Exception):
+    pass
+
+
+def _read_only(path):
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True,
+                           isolation_level=None, timeout=30)
+
+
+def integrity_check(path):
+    """Runs PRAGMA integrity_check on a plain SQLite file. Returns 'ok' or the problems found."""
+    conn = _read_only(path)
+    try:
+        rows = conn.execute("PRAGMA integrity_check").fetchall()
+    finally:
+        conn.close()
+    return "; ".join(r[0] for r in rows[:20])
+
+
+class Snapshot:
+    """A finished backup. verification runs in the background; wait() blocks until the manifest is final."""
+
+    def __init__(self, archive, manifest_path, manifest, thread=None):
+        self.archive = archive
+        self.manifest_path = manifest_path
+        self.manifest = manifest
+        self._thread = thread
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.manifest
+
+    @property
+    def ok(self):
+        return self.manifest.get("integrity") == "ok"
+
+
+def _write_manifest(path, manifest):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def copy_online(db_path, dest_path, pages=PAGES_PER_STEP, sleep=STEP_SLEEP, progress=None):
+    """Copies a live database into dest_path in page steps, as of one consistent point in time."""
+    if not os.path.exists(db_path):
+        raise BackupError(f"{db_path} not found")
+    src = _read_only(db_path)
+    dst = sqlite3.connect(dest_path)
+    try:
+        wal = src.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+        if wal:
+            # Pin a read snapshot: writers carry on, and the copy cannot be invalidated mid-way
+            src.execute("BEGIN")
+            src.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        # Without WAL a long read transaction would block writers; page steps release the
+        # lock between steps instead, and SQLite restarts the copy if the source changes.
+
+        def report(status, remaining, total):
+            if progress:
+                progress(total - remaining, total)
+
+        src.backup(dst, pages=pages, progress=report, sleep=sleep)
+        page_count = dst.execute("PRAGMA page_count").fetchone()[0]
+        page_size = dst.execute("PRAGMA page_size").fetchone()[0]
+        if wal:
+            src.execute("COMMIT")
+    finally:
+        dst.close()
+        src.close()
+    return page_count, page_size
+
+
+def _compress(path, archive):
+    tmp = archive + ".tmp"
+    with open(path, "rb") as src, gzip.open(tmp, "wb", compresslevel=6) as gz:
+        shutil.copyfileobj(src, gz, COPY_BUFFER)
+    os.replace(tmp, archive)
+
+
+def snapshot(db_path=DB_FILE, backup_dir=BACKUP_DIR, pages=PAGES_PER_STEP, sleep=STEP_SLEEP, progress=None):
+    """
+    Backs up db_path into a compressed archive in backup_dir. Returns a Snapshot
+    as soon as the archive is written; integrity_check may still be running.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    taken = datetime.now()
+    stem = f"{os.path.splitext(os.path.basename(db_path))[0]}-{taken.strftime(TIMESTAMP_FORMAT)}"
+    archive = os.path.join(backup_dir, stem + ".db.gz")
+    manifest_path = os.path.join(backup_dir, stem + ".json")
+    if os.path.exists(archive):
+        raise BackupError(f"{archive} already exists")
+
+    fd, copy_path = tempfile.mkstemp(suffix=".db", dir=backup_dir)
+    os.close(fd)
+    started = time.perf_counter()
+    try:
+        page_count, page_size = copy_online(db_path, copy_path, pages, sleep, progress)
+    except Exception:
+        os.remove(copy_path)
+        raise
+    copied_in = time.perf_counter() - started
+
+    manifest = {"source": os.path.abspath(db_path), "taken_at": taken.isoformat(timespec="seconds"),
+                "pages": page_count, "page_size": page_size, "db_bytes": os.path.getsize(copy_path),
+                "copy_seconds": round(copied_in, 3), "integrity": "pending"}
+    compressed = threading.Event()
+
+    def verify():
+        try:
+            integrity = integrity_check(copy_path)
+        except sqlite3.Error as e:
+            integrity = f"error: {e}"
+        compressed.wait()
+        os.remove(copy_path)
+        if os.path.exists(archive):
+            manifest.update(integrity=integrity, verified_at=datetime.now().isoformat(timespec="seconds"))
+            _write_manifest(manifest_path, manifest)
+
+    # integrity_check reads the uncompressed copy while it is being compressed
+    checker = threading.Thread(target=verify, name="backup-integrity-check", daemon=True)
+    checker.start()
+    try:
+        _compress(copy_path, archive)
+        manifest["sha256"] = file_sha256(archive)
+        manifest["archive_bytes"] = os.path.getsize(archive)
+        _write_manifest(manifest_path, manifest)
+    finally:
+        compressed.set()
+    return Snapshot(archive, manifest_path, manifest, checker)
+
+
+def list_snapshots(backup_dir=BACKUP_DIR):
+    """Manifests of every snapshot in backup_dir, newest first (each with 'archive' and 'manifest' paths)."""
+    if not os.path.isdir(backup_dir):
+        return []
+    snapshots = []
+    for name in os.listdir(backup_dir):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(backup_dir, name)
+        with open(path) as f:
+            manifest = json.load(f)
+        manifest["manifest"] = path
+        manifest["archive"] = os.path.join(backup_dir, name[:-len(".json")] + ".db.gz")
+        snapshots.append(manifest)
+    snapshots.sort(key=lambda m: m["taken_at"], reverse=True)
+    return snapshots
+
+
+def select_retained(snapshots, keep_last=KEEP_LAST, keep_daily=KEEP_DAILY, keep_weekly=KEEP_WEEKLY):
+    """Archives to keep under the retention policy; snapshots must be newest first."""
+    keep = {s["archive"] for s in snapshots[:keep_last]}
+    for slots, bucket in ((keep_daily, lambda t: t.date()), (keep_weekly, lambda t: t.isocalendar()[:2])):
+        seen = []
+        for s in snapshots:
+            if s.get("integrity") != "ok":
+                continue
+            key = bucket(datetime.fromisoformat(s["taken_at"]))
+            if key in seen:
+                continue
+            if len(seen) == slots:
+                break
+            seen.append(key)
+            keep.add(s["archive"])
+    return keep
+
+
+def prune(backup_dir=BACKUP_DIR, keep_last=KEEP_LAST, keep_daily=KEEP_DAILY, keep_weekly=KEEP_WEEKLY):
+    """Deletes snapshots outside the retention policy. Returns the archives removed."""
+    snapshots = list_snapshots(backup_dir)
+    keep = select_retained(snapshots, keep_last, keep_daily, keep_weekly)
+    removed = []
+    for s in snapshots:
+        if s["archive"] in keep or s.get("integrity") == "pending":
+            continue
+        for path in (s["archive"], s["manifest"]):
+            if os.path.exists(path):
+                os.remove(path)
+        removed.append(s["archive"])
+    return removed
+
+
+def restore(archive, dest_path, force=False):
+    """Decompresses a snapshot into dest_path (a fresh file unless force). Returns dest_path."""
+    if not os.path.exists(archive):
+        raise BackupError(f"{archive} not found")
+    if os.path.exists(dest_path) and not force:
+        raise BackupError(f"{dest_path} exists; pass force=True (--force) to replace it")
+    folder = os.path.dirname(os.path.abspath(dest_path))
+    fd, tmp = tempfile.mkstemp(suffix=".db", dir=folder)
+    os.close(fd)
+    try:
+        with gzip.open(archive, "rb") as src, open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst, COPY_BUFFER)
+        conn = sqlite3.connect(tmp)
+        try:
+            check = conn.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            conn.close()
+        if check != "ok":
+            raise BackupError(f"{archive} failed quick_check: {check}")
+        # A stale WAL from the old file would be replayed over the restored pages
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(dest_path + suffix):
+                os.remove(dest_path + suffix)
+        os.replace(tmp, dest_path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return dest_path
+
+
+def verify_archive(archive):
+    """Full integrity_check of an archive, decompressed to a temporary file."""
+    fd, tmp = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        with gzip.open(archive, "rb") as src, open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst, COPY_BUFFER)
+        return integrity_check(tmp)
+    finally:
+        os.remove(tmp)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Online backup, retention and restore for the SQLite database.")
+    parser.add_argument("--dir", default=BACKUP_DIR, help="Backup folder (default: %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("backup", help="Take a snapshot, verify it, then prune")
+    b.add_argument("--db", default=DB_FILE)
+    b.add_argument("--pages", type=int, default=PAGES_PER_STEP, help="Pages copied per step")
+    b.add_argument("--no-prune", action="store_true")
+    for p in (b, sub.add_parser("prune", help="Apply the retention policy")):
+        p.add_argument("--keep-last", type=int, default=KEEP_LAST)
+        p.add_argument("--keep-daily", type=int, default=KEEP_DAILY)
+        p.add_argument("--keep-weekly", type=int, default=KEEP_WEEKLY)
+    sub.add_parser("list", help="List snapshots")
+    r = sub.add_parser("restore", help="Restore a snapshot into a new file")
+    r.add_argument("archive")
+    r.add_argument("dest")
+    r.add_argument("--force", action="store_true", help="Replace an existing file")
+    v = sub.add_parser("verify", help="Re-run integrity_check on an archive")
+    v.add_argument("archive")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "backup":
+            def progress(done, total):
+                print(f"\r  {done}/{total} pages", end="", flush=True)
+            snap = snapshot(args.db, args.dir, args.pages, progress=progress)
+            print(f"\nArchive: {snap.archive} ({format_size(snap.manifest['archive_bytes'])})")
+            print("Verifying...")
+            print(f"Integrity: {snap.wait()['integrity']}")
+            if not args.no_prune:
+                removed = prune(args.dir, args.keep_last, args.keep_daily, args.keep_weekly)
+                print(f"Pruned {len(removed)} old snapshot(s).")
+        elif args.command == "prune":
+            for path in prune(args.dir, args.keep_last, args.keep_daily, args.keep_weekly):
+                print(f"Removed {path}")
+        elif args.command == "list":
+            rows = [[os.path.basename(s["archive"]), s["taken_at"], format_size(s["db_bytes"]),
+                     format_size(s.get("archive_bytes", 0)), s["integrity"]] for s in list_snapshots(args.dir)]
+            print(tabulate(rows, headers=["Archive", "Taken", "DB size", "Archive", "Integrity"], tablefmt="grid")
+                  if rows else "No snapshots.")
+        elif args.command == "restore":
+            print(f"Restored to {restore(args.archive, args.dest, args.force)}")
+        elif args.command == "verify":
+            print(f"Integrity: {verify_archive(args.archive)}")
+    except BackupError as e:
+        print(f"Error: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Benchmarks for the hot paths, at several data sizes.
+
+Each scale's database comes from generate_dataset.py (fixed seed). Every
+scenario is timed over a few repetitions, and the SQL statements it issues
+are counted through a cursor event on the engine. Query counts do not depend
+on the machine, so an N+1 regression shows up even on a noisy laptop.
+
+Results are compared against a baseline JSON (bench_baseline.json). A scenario
+regresses when it issues more queries than the baseline, or its median time
+exceeds the baseline by more than --tolerance (default 25%) and 5 ms.
+
+Usage:
+    python benchmark.py                          # tiny + small, compare to baseline
+    python benchmark.py --scales small medium --repeat 5
+    python benchmark.py --save-baseline          # record new baseline
+    python benchmark.py --queries-only           # CI: ignore timings
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+import pandas as pd
+from sqlalchemy import event, func
+from tabulate import tabulate
+
+from models import (
+    get_engine, get_session, Product, ProductLot, PurchaseOrder, PurchaseOrderLine, CustomerOrder, OurCompany, LotReceipt,
+)
+from generate_dataset import generate, SCALES
+import services
+
+BASELINE_FILE = "bench_baseline.json"
+SEED = 42
+DEFAULT_SCALES = ["tiny", "small"]
+MIN_REGRESSION_SECONDS = 0.005
+
+
+class QueryCounter:
+    """Counts statements sent to the database while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+# --- Scenarios ---
+# Each is a function (ctx) -> callable; the setup part is not timed. ctx has
+# 'engine', 'session', 'db_path' and 'tmp'. `mutates` scenarios get a fresh
+# copy of the database for every repetition.
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def scenario_list_orders(ctx):
+    import main
+    return lambda: quiet(main.list_orders, ctx["session"])
+
+
+def scenario_list_customer_orders(ctx):
+    import main
+    return lambda: quiet(main.list_customer_orders, ctx["session"])
+
+
+def scenario_view_product_details(ctx):
+    import main
+    session = ctx["session"]
+    # The product with the most lots is the expensive one to aggregate
+    pid = session.query(ProductLot.product_id).group_by(ProductLot.product_id) \
+        .order_by(func.count(ProductLot.id).desc()).limit(1).scalar()
+
+    def run():
+        with patch("main.prompt", return_value=str(pid)):
+            quiet(main.view_product_details, session)
+    return run
+
+
+def scenario_generate_po_pdf(ctx):
+    from po_pdf_generator import generate_po_pdf
+    session = ctx["session"]
+    po_id = session.query(PurchaseOrderLine.po_id).group_by(PurchaseOrderLine.po_id) \
+        .order_by(func.count(PurchaseOrderLine.id).desc()).limit(1).scalar()
+    out = os.path.join(ctx["tmp"], "pdfs")
+
+    def run():
+        po = session.get(PurchaseOrder, po_id)
+        generate_po_pdf(po, session.query(OurCompany).first(), out)
+    return run
+
+
+def scenario_generate_invoice(ctx):
+    import excel_invoice_generator as gen
+    session = ctx["session"]
+    co_id = session.query(CustomerOrder.id).filter(CustomerOrder.invoice_number.isnot(None)).limit(1).scalar()
+    template = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "other", "invoice_template.xlsx")
+    docs = os.path.join(ctx["tmp"], "docs")
+    os.makedirs(docs, exist_ok=True)
+
+    def run():
+        with patch.object(gen, "TEMPLATE_PATH", template), patch.object(gen, "DOCS_DIR", docs), \
+                patch.object(gen, "PDF_SUPPORT", False):
+            if quiet(gen.generate_invoice, session, co_id) is None:
+                raise RuntimeError("generate_invoice failed")
+    return run
+
+
+def scenario_import_customers(ctx):
+    from import_customers import import_customers
+    n = max(50, ctx["scale"]["customers"] // 10)
+    path = os.path.join(ctx["tmp"], "customers.xlsx")
+    pd.DataFrame({
+        "CustomerName": [f"Imported Cafe {i}" for i in range(n)],
+        "EmailAddress": [f"imported{i}@cafe.example" for i in range(n)],
+        "ContactName": "Buyer", "ShipToPhone": "555-0100", "ShipToAddr1": "1 Main St", "ShipToAddr2": None,
+        "ShipToCity": "Irvine", "ShipToState": "CA", "ShipToZip": "92618", "ShipToCountry": "USA", "EmailName": "Buyer",
+    }).to_excel(path, index=False)
+    return lambda: quiet(import_customers, path, ctx["engine"])
+
+
+def scenario_create_purchase_orders(ctx):
+    session = ctx["session"]
+    product_ids = [pid for (pid,) in session.query(Product.id).limit(20)]
+
+    def run():
+        for i in range(100):
+            lines = [{"product_id": pid, "qty": 5, "cost": 2.0} for pid in product_ids[i % 5:i % 5 + 4]]
+            services.create_po(session, 1 + i % 5, {}, lines)
+    return run
+
+
+def scenario_convert_invoices(ctx):
+    return lambda: services.invoicing.convert_orders(ctx["session"])
+
+
+def scenario_recall_trace(ctx):
+    import traceability
+    session = ctx["session"]
+    # The PO received into the most lots has the widest recall
+    po_id = session.query(LotReceipt.po_id).group_by(LotReceipt.po_id) \
+        .order_by(func.count(LotReceipt.id).desc()).limit(1).scalar()
+    return lambda: traceability.recall(session, po_id=po_id)
+
+
+SCENARIOS = {
+    "list_orders": (scenario_list_orders, False),
+    "list_customer_orders": (scenario_list_customer_orders, False),
+    "view_product_details": (scenario_view_product_details, False),
+    "generate_po_pdf": (scenario_generate_po_pdf, False),
+    "generate_invoice": (scenario_generate_invoice, False),
+    "import_customers": (scenario_import_customers, True),
+    "create_purchase_orders": (scenario_create_purchase_orders, True),
+    "convert_invoices": (scenario_convert_invoices, True),
+    "recall_trace": (scenario_recall_trace, False),
+}
+
+
+# --- Runner ---
+
+def build_database(scale, folder):
+    path = os.path.join(folder, f"bench_{scale}.db")
+    engine = get_engine(f"sqlite:///{path}")
+    generate(engine, seed=SEED, progress=lambda msg: None, **SCALES[scale])
+    engine.dispose()  # checkpoints the WAL so the file can be copied for mutating scenarios
+    return path
+
+
+def run_scenario(name, scale, master_db, tmp, repeat):
+    factory, mutates = SCENARIOS[name]
+    times, queries = [], None
+    for _ in range(repeat):
+        db_path = master_db
+        if mutates:
+            db_path = os.path.join(tmp, f"{name}.db")
+            shutil.copyfile(master_db, db_path)
+        engine = get_engine(f"sqlite:///{db_path}")
+        session = get_session(engine)
+        ctx = {"engine": engine, "session": session, "db_path": db_path, "tmp": tmp, "scale": SCALES[scale]}
+        try:
+            fn = factory(ctx)
+            session.expire_all()  # each repetition starts cold, as in a fresh CLI screen
+            with QueryCounter(engine) as counter:
+                start = time.perf_counter()
+                fn()
+                times.append(time.perf_counter() - start)
+            queries = counter.count
+        finally:
+            session.close()
+            engine.dispose()
+    return {"seconds": round(statistics.median(times), 6), "min_seconds": round(min(times), 6), "queries": queries}
+
+
+def run(scales, scenarios, repeat, progress=print):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in scales:
+            t0 = time.perf_counter()
+            master = build_database(scale, tmp)
+            progress(f"[{scale}] dataset built in {time.perf_counter() - t0:.1f}s")
+            for name in scenarios:
+                results[f"{scale}/{name}"] = run_scenario(name, scale, master, tmp, repeat)
+                r = results[f"{scale}/{name}"]
+                progress(f"[{scale}] {name}: {r['seconds'] * 1000:.1f} ms, {r['queries']} queries")
+    return results
+
+
+def compare(results, baseline, tolerance, queries_only=False):
+    """Returns (rows for display, list of regression messages)."""
+    rows, regressions = [], []
+    for key, r in results.items():
+        base = baseline.get(key)
+        row = [key, f"{r['seconds'] * 1000:.1f}", r["queries"], "", "", ""]
+        if base:
+            row[3] = f"{base['seconds'] * 1000:.1f}"
+            row[4] = base["queries"]
+            status = []
+            if r["queries"] > base["queries"]:
+                status.append(f"queries {base['queries']} -> {r['queries']}")
+            slower = r["seconds"] - base["seconds"]
+            if not queries_only and r["seconds"] > base["seconds"] * (1 + tolerance) and slower > MIN_REGRESSION_SECONDS:
+                status.append(f"time +{slower / base['seconds']:.0%}")
+            if status:
+                regressions.append(f"{key}: {', '.join(status)}")
+            row[5] = "REGRESSED" if status else "ok"
+        else:
+            row[5] = "new"
+        rows.append(row)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ERP hot paths with query counts.")
+    parser.add_argument("--scales", nargs="+", choices=SCALES, default=DEFAULT_SCALES)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--queries-only", action="store_true", help="Only fail on query count increases")
+    args = parser.parse_args()
+
+    results = run(args.scales, args.scenarios, args.repeat)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    rows, regressions = compare(results, baseline, args.tolerance, args.queries_only)
+    print(tabulate(rows, headers=["Scenario", "ms", "Queries", "Base ms", "Base queries", "Status"], tablefmt="grid"))
+
+    if args.save_baseline:
+        merged = dict(baseline, **results)
+        with open(args.baseline, "w") as f:
+            json.dump({"meta": {"recorded": datetime.utcnow().isoformat(timespec="seconds"),
+                                "python": platform.python_version(), "machine": platform.machine(), "seed": SEED},
+                       "results": dict(sorted(merged.items()))}, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if regressions:
+        print("\nRegressions:")
+        for msg in regressions:
+            print(f"  {msg}")
+        sys.exit(1)
+    print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Bulk order entry from CSV/Excel.
+
+Reads a header-plus-lines sheet (one row per order line). The first row of an
+order carries its header fields; following rows may leave the order key and
+header cells blank and are treated as further lines of the same order.
+
+Purchase orders  - key column: po_number,      party column: supplier (name or ID)
+                   line columns: sku, qty, unit, cost, description, packing_structure
+Customer orders  - key column: invoice_number, party column: customer (name or ID)
+                   line columns: sku, qty, unit, selling_price, description
+
+An order key of "auto" takes the next number from the document sequence; auto
+numbers for a batch are reserved as one block when the batch commits.
+
+SKUs are matched against Product.sku or Product.sku_number. All SKUs, parties and
+order numbers are resolved with one IN query each, and valid orders are created
+in batches of --batch-size orders per transaction. Every rejected row is listed
+in a CSV report next to the input file.
+
+Usage:
+    python bulk_order_import.py orders.xlsx --type po
+    python bulk_order_import.py customer_pos.csv --type co --batch-size 200
+"""
+import argparse
+import csv
+import os
+
+import pandas as pd
+from sqlalchemy import or_
+
+from models import get_engine, get_session, Supplier, Customer, Product, PurchaseOrder, CustomerOrder
+import render_profiler
+import services
+from services import ValidationError
+
+ORDER_TYPES = {
+    "po": {
+        "key": "po_number",
+        "party": "supplier",
+        "party_model": Supplier,
+        "party_name": "name",
+        "price": "cost",
+        "header": services.orders.PO_HEADER_FIELDS,
+        "line": {"unit", "cost", "description", "packing_structure"},
+        "build": services.build_po,
+        "order_model": PurchaseOrder,
+        "sequence": services.sequences.PURCHASE_ORDER,
+    },
+    "co": {
+        "key": "invoice_number",
+        "party": "customer",
+        "party_model": Customer,
+        "party_name": "customer_name",
+        "price": "selling_price",
+        "header": services.orders.CO_HEADER_FIELDS,
+        "line": {"unit", "selling_price", "description", "amount"},
+        "build": services.build_co,
+        "order_model": CustomerOrder,
+        "sequence": services.sequences.INVOICE,
+    },
+}
+
+
+def clean_val(val):
+    if pd.isna(val):
+        return None
+    s = str(val).strip()
+    return s if s else None
+
+
+def read_sheet(path):
+    """
+    Loads a CSV or Excel sheet as a list of row dicts with snake_case keys.
+    All values are stripped strings or None.
+    """
+    if path.lower().endswith((".xlsx", ".xls")):
+        df = pd.read_excel(path, dtype=str)
+    else:
+        df = pd.read_csv(path, dtype=str)
+    columns = [str(c).strip().lower().replace(" ", "_") for c in df.columns]
+    return columns, [{col: clean_val(v) for col, v in zip(columns, values)} for values in df.itertuples(index=False)]
+
+
+def resolve_products(session, skus):
+    """Maps every SKU / SKU number in the sheet to its Product with a single IN query."""
+    skus = {s for s in skus if s}
+    if not skus:
+        return {}
+    found = session.query(Product).filter(or_(Product.sku.in_(skus), Product.sku_number.in_(skus))).all()
+    by_sku = {}
+    for p in found:
+        by_sku[p.sku] = p
+        if p.sku_number:
+            by_sku.setdefault(p.sku_number, p)
+    return by_sku
+
+
+def resolve_parties(session, cfg, refs):
+    """Maps supplier/customer references (ID or exact name) to IDs with a single query."""
+    model = cfg["party_model"]
+    name_col = getattr(model, cfg["party_name"])
+    refs = {r for r in refs if r}
+    ids = {int(r) for r in refs if r.isdigit()}
+    names = refs - {str(i) for i in ids}
+    # Load full entities so the service layer's session.get() hits the identity map
+    rows = session.query(model).filter(or_(model.id.in_(ids), name_col.in_(names))).all()
+
+    mapping = {}
+    for row in rows:
+        mapping[str(row.id)] = row.id
+        mapping.setdefault(getattr(row, cfg["party_name"]), row.id)
+    return mapping
+
+
+def existing_order_numbers(session, cfg, numbers):
+    """Returns the subset of order numbers already present in the database (one IN query)."""
+    numbers = {n for n in numbers if n}
+    if not numbers:
+        return set()
+    col = getattr(cfg["order_model"], cfg["key"])
+    return {n for (n,) in session.query(col).filter(col.in_(numbers)).all()}
+
+
+def group_orders(rows, key):
+    """
+    Splits the sheet into orders. Blank key cells continue the previous order;
+    every "auto" key starts a new one. Returns a list of (order_key, [(sheet_row_number, row_dict), ...]).
+    """
+    orders = []
+    current = None
+    for idx, row in enumerate(rows):
+        sheet_row = idx + 2  # +1 for the header row, +1 for 1-based numbering
+        if row.get(key):
+            if current is None or current[0] != row[key] or services.is_auto_number(row[key]):
+                current = (row[key], [])
+                orders.append(current)
+        elif current is None:
+            current = (None, [])
+            orders.append(current)
+        current[1].append((sheet_row, row))
+    return orders
+
+
+def import_orders(session, path, order_type, batch_size=500):
+    """
+    Imports every order in the sheet. Returns a report: a list of dicts with
+    row, order, status ('created' / 'error') and message.
+    """
+    cfg = ORDER_TYPES[order_type]
+    key = cfg["key"]
+    columns, rows = read_sheet(path)
+
+    missing = {key, cfg["party"], "sku", "qty"} - set(columns)
+    if missing:
+        raise ValidationError(f"Missing required column(s): {', '.join(sorted(missing))}")
+
+    orders = group_orders(rows, key)
+
+    # Bulk lookups: one query each, regardless of sheet size
+    products = resolve_products(session, [r["sku"] for r in rows])
+    parties = resolve_parties(session, cfg, [r[cfg["party"]] for r in rows])
+    taken = existing_order_numbers(session, cfg, [k for k, _ in orders if not services.is_auto_number(k)])
+    products_by_id = {p.id: p for p in products.values()}
+
+    report = []
+    seen_keys = set()
+    pending = []
+
+    def assign_numbers():
+        """Reserves one block of sequence numbers per period for the batch's auto orders."""
+        auto = [obj for order_key, _, obj in pending if services.is_auto_number(order_key)]
+        if not auto:
+            return
+        fmt = services.sequences.get_format(session, cfg["sequence"])
+        by_period = {}
+        for obj in auto:
+            by_period.setdefault(services.sequences.period_for(fmt, obj.date), []).append(obj)
+        for objs in by_period.values():
+            numbers = services.sequences.allocate_block(session, cfg["sequence"], len(objs), objs[0].date)
+            for obj, number in zip(objs, numbers):
+                setattr(obj, key, number)
+
+    def flush_batch():
+        if not pending:
+            return
+        try:
+            assign_numbers()
+            session.commit()
+            for _, first_row, obj in pending:
+                report.append({"row": first_row, "order": getattr(obj, key), "status": "created", "message": ""})
+        except Exception as e:
+            session.rollback()
+            for order_key, first_row, _ in pending:
+                report.append({"row": first_row, "order": order_key, "status": "error",
+                               "message": f"Batch rolled back: {e}"})
+        pending.clear()
+
+    for order_key, order_rows in orders:
+        first_row, header_row = order_rows[0]
+        row_errors = []
+
+        auto_number = services.is_auto_number(order_key)
+        if not order_key:
+            row_errors.append((first_row, f"Missing {key}"))
+        elif auto_number:
+            pass
+        elif order_key in taken:
+            row_errors.append((first_row, f"{key} '{order_key}' already exists"))
+        elif order_key in seen_keys:
+            row_errors.append((first_row, f"{key} '{order_key}' appears in more than one block of the sheet"))
+
+        party_ref = header_row.get(cfg["party"])
+        party_id = parties.get(party_ref) if party_ref else None
+        if party_id is None:
+            row_errors.append((first_row, f"Unknown {cfg['party']} '{party_ref}'"))
+
+        header = {k: v for k, v in header_row.items() if k in cfg["header"] and v is not None}
+        header[key] = services.AUTO_NUMBER if auto_number else order_key
+
+        lines = []
+        for sheet_row, row in order_rows:
+            product = products.get(row.get("sku"))
+            if product is None:
+                row_errors.append((sheet_row, f"Unknown SKU '{row.get('sku')}'"))
+                continue
+            line = {k: v for k, v in row.items() if k in cfg["line"] and v is not None}
+            line["product_id"] = product.id
+            line["qty"] = row.get("qty")
+            if cfg["price"] not in line:
+                default_price = product.cost_price if order_type == "po" else product.unit_price
+                try:
+                    line[cfg["price"]] = float(default_price)
+                except (TypeError, ValueError):
+                    line[cfg["price"]] = 0.0  # TBD prices import as 0.0, same as the CLI
+            lines.append(line)
+
+        if not auto_number:
+            seen_keys.add(order_key)
+        if not row_errors:
+            try:
+                obj = cfg["build"](session, party_id, header, lines, products=products_by_id,
+                                   check_unique=False, assign_number=False)
+                pending.append((order_key, first_row, obj))
+            except ValidationError as e:
+                row_errors.extend((first_row, msg) for msg in e.errors)
+
+        for sheet_row, msg in row_errors:
+            report.append({"row": sheet_row, "order": order_key, "status": "error", "message": msg})
+
+        if len(pending) >= batch_size:
+            flush_batch()
+
+    flush_batch()
+    report.sort(key=lambda r: r["row"])
+    return report
+
+
+def write_report(report, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["row", "order", "status", "message"])
+        writer.writeheader()
+        writer.writerows(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import purchase or customer orders from CSV/Excel.")
+    parser.add_argument("path", help="CSV or Excel file with one row per order line")
+    parser.add_argument("--type", choices=sorted(ORDER_TYPES), required=True, help="po = purchase orders, co = customer orders")
+    parser.add_argument("--batch-size", type=int, default=500, help="Orders per transaction")
+    parser.add_argument("--profile-render", nargs="?", const="sample", choices=render_profiler.MODES,
+                        help="Profile the import; output is written next to the report")
+    args = parser.parse_args()
+    if args.profile_render:
+        render_profiler.enable(args.profile_render)
+    report_path = os.path.splitext(args.path)[0] + "_import_report.csv"
+
+    engine = get_engine()
+    session = get_session(engine)
+    try:
+        with render_profiler.profile(f"import_{args.type}") as prof:
+            prof.document = report_path
+            report = import_orders(session, args.path, args.type, args.batch_size)
+    except ValidationError as e:
+        print(f"Import aborted: {e}")
+        return
+    finally:
+        session.close()
+
+    created = len({r["order"] for r in report if r["status"] == "created"})
+    errors = [r for r in report if r["status"] == "error"]
+    write_report(report, report_path)
+
+    print(f"Orders created: {created}")
+    print(f"Rows with errors: {len(errors)}")
+    print(f"Report written to: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Change data capture log.
+
+Every insert, update and delete on the business tables (contacts, products,
+lots, orders and their lines, invoices and documents) is appended to the
+change_log table. The entry is written in the same transaction as the change,
+so a rolled-back edit leaves no trace. Downstream jobs such as accounting
+sync, report caches and the search index can then process only what changed
+instead of diffing whole tables.
+
+ORM changes are collected by mapper after_insert/update/delete events and
+written out by a Session after_flush listener. Code that writes with Core
+statements, like the bulk invoice conversion, calls record() itself.
+archive_orders.py logs the rows it moves out as deletes. generate_dataset.py
+and copy_database.py load whole databases and are not logged.
+
+Each entry holds:
+
+    seq         monotonically increasing; AUTOINCREMENT on SQLite, so numbers
+                are never reused, even after prune()
+    table_name  e.g. 'customer_orders'
+    row_id      primary key of the changed row
+    operation   'insert', 'update' or 'delete'
+    data        JSON: every loaded column for inserts and deletes, the changed
+                columns (plus id) for updates
+
+A consumer keeps its position in change_consumers and reads forward in
+batches. The cursor advances only after the loop body for a batch has
+finished, so delivery is at-least-once:
+
+    for batch in change_log.batches(session, "accounting", batch_size=500):
+        sync(batch)
+
+Usage:
+    python change_log.py tail [--after 0] [--limit 50] [--table products]
+    python change_log.py consumers
+    python change_log.py prune        # drop entries every consumer has read
+"""
+import argparse
+import json
+from collections import namedtuple
+from datetime import date, datetime
+
+from sqlalchemy import event, insert, select, update, delete, func, inspect
+from sqlalchemy.orm import Mapper, Session, object_session
+from tabulate import tabulate
+
+TRACKED_TABLES = (
+    "suppliers", "customers", "products", "product_lots",
+    "purchase_orders", "purchase_order_lines", "customer_orders", "customer_order_lines",
+    "invoices", "invoice_lines", "documents",
+)
+OPERATIONS = ("insert", "update", "delete")
+BATCH_SIZE = 500
+PENDING_KEY = "change_log_pending"
+
+Change = namedtuple("Change", "seq table row_id operation data changed_at")
+
+_log_table = None
+_consumer_table = None
+_table_order = {}
+
+
+def track(log_table, consumer_table):
+    """
+    Called once by models.py with the change_log and change_consumers tables.
+    Mapper events collect every row the unit of work writes (including
+    cascaded and orphan deletes); the session's after_flush writes them out.
+    """
+    global _log_table, _consumer_table, _table_order
+    _log_table, _consumer_table = log_table, consumer_table
+    # Parents before children, so an insert of an order is logged before its lines
+    _table_order = {t.name: i for i, t in enumerate(log_table.metadata.sorted_tables)}
+    if not event.contains(Session, "after_flush", _capture):
+        for operation in OPERATIONS:
+            event.listen(Mapper, f"after_{operation}", _collect(operation))
+        event.listen(Session, "after_flush", _capture)
+        event.listen(Session, "after_rollback", lambda session: session.info.pop(PENDING_KEY, None))
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _entry(operation, table_name, row, now):
+    return {
+        "table_name": table_name,
+        "row_id": row.get("id"),
+        "operation": operation,
+        "data": json.dumps(row, default=_json_value, sort_keys=True),
+        "changed_at": now,
+    }
+
+
+def _row_data(state, operation):
+    """Column values of one flushed object, read from its state without loading anything."""
+    row = {}
+    for attr in state.mapper.column_attrs:
+        if attr.key not in state.dict:
+            continue
+        if operation == "update" and attr.key != "id" and not state.attrs[attr.key].history.has_changes():
+            continue
+        row[attr.columns[0].name] = state.dict[attr.key]
+    return row
+
+
+def _pending(target):
+    session = object_session(target)
+    return session.info.setdefault(PENDING_KEY, []) if session is not None else None
+
+
+def _collect(operation):
+    def listener(mapper, connection, target):
+        table_name = mapper.local_table.name
+        if _log_table is None or table_name not in TRACKED_TABLES:
+            return
+        row = _row_data(inspect(target), operation)
+        if operation == "update" and len(row) < 2:
+            return  # only relationships changed
+        pending = _pending(target)
+        if pending is not None:
+            pending.append((operation, table_name, row))
+    return listener
+
+
+def _capture(session, flush_context):
+    record(session, session.info.pop(PENDING_KEY, []))
+
+
+def record(session, changes):
+    """
+    Appends (operation, table_name, row) changes to the log in one executemany.
+    For code paths that write with Core statements and so bypass the flush;
+    each row is a dict of column values that includes 'id'.
+    """
+    if _log_table is None or not changes:
+        return
+    # Deletes run child-first, everything else parent-first
+    def order(change):
+        operation, table_name, row = change
+        rank = _table_order.get(table_name, 0)
+        return (operation == "delete", -rank if operation == "delete" else rank, row.get("id") or 0)
+    now = datetime.utcnow()
+    rows = [_entry(operation, table_name, row, now) for operation, table_name, row in sorted(changes, key=order)]
+    session.connection().execute(insert(_log_table), rows)
+
+
+def latest_seq(session):
+    return session.execute(select(func.max(_log_table.c.seq))).scalar() or 0
+
+
+def changes_after(session, seq, limit=BATCH_SIZE, tables=None):
+    """Up to `limit` changes with a sequence number above `seq`, oldest first."""
+    query = select(_log_table).where(_log_table.c.seq > seq).order_by(_log_table.c.seq).limit(limit)
+    if tables:
+        query = query.where(_log_table.c.table_name.in_(tables))
+    return [
+        Change(r.seq, r.table_name, r.row_id, r.operation, json.loads(r.data), r.changed_at)
+        for r in session.execute(query)
+    ]
+
+
+def cursor(session, consumer):
+    """Last sequence number the consumer has processed (0 for a new consumer)."""
+    value = session.execute(
+        select(_consumer_table.c.last_seq).where(_consumer_table.c.name == consumer)
+    ).scalar()
+    return value or 0
+
+
+def advance(session, consumer, seq):
+    """Moves the consumer's cursor forward to `seq`. The caller commits."""
+    now = datetime.utcnow()
+    result = session.execute(
+        update(_consumer_table)
+        .where(_consumer_table.c.name == consumer, _consumer_table.c.last_seq < seq)
+        .values(last_seq=seq, updated_at=now)
+    )
+    if result.rowcount == 0 and not session.execute(
+            select(_consumer_table.c.name).where(_consumer_table.c.name == consumer)).first():
+        session.execute(insert(_consumer_table).values(name=consumer, last_seq=seq, updated_at=now))
+
+
+def batches(session, consumer, batch_size=BATCH_SIZE, tables=None):
+    """
+    Yields lists of unseen changes for `consumer`. After the caller has handled
+    a batch and asks for the next one, the cursor is advanced and committed. If
+    the caller raises, the cursor stays put and the batch is delivered again
+    next time.
+    """
+    position = cursor(session, consumer)
+    while True:
+        batch = changes_after(session, position, batch_size, tables)
+        session.commit()  # don't hold a read transaction while the consumer works
+        if not batch:
+            return
+        yield batch
+        position = batch[-1].seq
+        advance(session, consumer, position)
+        session.commit()
+        if len(batch) < batch_size:
+            return
+
+
+def consumers(session):
+    """(name, last_seq, behind, updated_at) for every registered consumer."""
+    latest = latest_seq(session)
+    rows = session.execute(select(_consumer_table).order_by(_consumer_table.c.name)).all()
+    return [(r.name, r.last_seq, latest - r.last_seq, r.updated_at) for r in rows]
+
+
+def prune(session):
+    """
+    Deletes entries every consumer has already processed. With no consumers
+    registered nothing is deleted. Returns the number of entries removed.
+    """
+    low = session.execute(select(func.min(_consumer_table.c.last_seq))).scalar()
+    if not low:
+        return 0
+    result = session.execute(delete(_log_table).where(_log_table.c.seq <= low))
+    session.commit()
+    return result.rowcount
+
+
+def main():
+    from models import get_engine, init_db, get_session
+
+    parser = argparse.ArgumentParser(description="Change data capture log.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    t = sub.add_parser("tail", help="Show logged changes")
+    t.add_argument("--after", type=int, default=None, help="Sequence number to start after (default: last --limit)")
+    t.add_argument("--limit", type=int, default=50)
+    t.add_argument("--table", action="append", choices=TRACKED_TABLES)
+    sub.add_parser("consumers", help="Show consumer cursors and their lag")
+    sub.add_parser("prune", help="Delete entries every consumer has processed")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    init_db(engine)
+    session = get_session(engine)
+
+    if args.command == "tail":
+        after = args.after if args.after is not None else max(latest_seq(session) - args.limit, 0)
+        rows = [(c.seq, c.changed_at.strftime("%Y-%m-%d %H:%M:%S"), c.table, c.row_id, c.operation,
+                 json.dumps(c.data, sort_keys=True)[:80])
+                for c in changes_after(session, after, args.limit, args.table)]
+        print(tabulate(rows, headers=["Seq", "Changed (UTC)", "Table", "Row", "Op", "Data"]))
+    elif args.command == "consumers":
+        print(tabulate(consumers(session), headers=["Consumer", "Last seq", "Behind", "Updated (UTC)"]))
+    elif args.command == "prune":
+        print(f"Removed {prune(session)} change log entries.")
+
+
+if __name__ == "__main__":
+    main()
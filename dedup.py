@@ -0,0 +1,337 @@
+"""
+Near-duplicate detection and merging for customers and suppliers.
+
+import_customers.py only skips exact name / email matches, so variants such as
+"Aahaa Chai" and "Aahaa Chai LLC" both end up in the table. Comparing every
+pair is O(n^2); instead each record is put into blocks by cheap keys, and only
+records that share a block are compared:
+
+    n:<first name token>   normalised name: lower case, punctuation, a leading
+                           "the" and trailing legal suffixes (LLC, Inc,
+                           Pvt, Ltd, ...) removed
+    z:<zip>                first five characters of the postal code
+    d:<email domain>       company domains only (not gmail.com etc.)
+    m:<email>, p:<phone>   exact contact details
+
+Blocks larger than MAX_BLOCK (a very common first word) are skipped. Within a
+block the scores are computed with NumPy in one go. The name similarity is
+the cosine of character-trigram count vectors (one matrix product per block).
+Matching email, phone, zip or company email domain adds a bonus on top. Pairs
+scoring at least the threshold are proposed. The record referenced by more
+orders is kept.
+
+merge() re-points every order (and, for suppliers, product), every lot
+traceability link (see traceability.py) and every attached document from the
+dropped records to the kept one with one UPDATE per table. It bumps version_id so open
+edits of those orders see a conflict. Empty fields of the kept record are
+filled from the dropped ones, and the dropped records are deleted, all in one
+transaction. The re-pointing is a Core UPDATE, so it is written to the change
+log and the audit trail explicitly.
+
+Usage:
+    python dedup.py scan customers [--threshold 0.85]
+    python dedup.py review suppliers            # accept or reject each proposal
+    python dedup.py merge customers 12 57 58    # keep 12, merge 57 and 58 into it
+"""
+import argparse
+import re
+from collections import namedtuple
+
+import numpy as np
+from sqlalchemy import select, update, func
+from tabulate import tabulate
+
+import audit
+import change_log
+from models import (
+    get_engine, init_db, get_session, Customer, Supplier, CustomerOrder, PurchaseOrder, Product, LotReceipt, LotShipment,
+    Document,
+)
+
+ENTITIES = {
+    "customers": {
+        "model": Customer, "name": "customer_name", "email": "email_address", "zip": "ship_to_zip",
+        "phone": "ship_to_phone",
+        "references": [(CustomerOrder, "customer_id"), (LotShipment, "customer_id")],
+        "document_type": "Customer",
+    },
+    "suppliers": {
+        "model": Supplier, "name": "name", "email": "email", "zip": "zip_code",
+        "phone": "phone",
+        "references": [(PurchaseOrder, "supplier_id"), (Product, "supplier_id"), (LotReceipt, "supplier_id")],
+        "document_type": "Supplier",
+    },
+}
+DEFAULT_THRESHOLD = 0.85
+MAX_BLOCK = 200
+# Bonuses added to the name similarity when contact details agree
+BONUS = {"email": 0.2, "phone": 0.15, "zip": 0.05, "domain": 0.05}
+LEGAL_SUFFIXES = {
+    "llc", "inc", "incorporated", "ltd", "limited", "pvt", "private", "co", "corp",
+    "corporation", "company", "gmbh", "plc", "lp", "llp",
+}
+FREE_MAIL = {
+    "gmail.com", "googlemail.com", "yahoo.com", "hotmail.com", "outlook.com", "live.com",
+    "aol.com", "icloud.com", "me.com", "msn.com", "proton.me", "protonmail.com",
+}
+
+Record = namedtuple("Record", "id name email domain zip phone")
+Candidate = namedtuple("Candidate", "keep_id drop_id score keep_name drop_name reasons")
+
+
+class DedupError(Exception):
+    pass
+
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_name(name):
+    words = _NON_WORD.sub(" ", (name or "").lower()).split()
+    if words and words[0] == "the":
+        words = words[1:]
+    while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+def email_domain(email):
+    if not email or "@" not in email:
+        return None
+    domain = email.rsplit("@", 1)[1].strip().lower()
+    return None if domain in FREE_MAIL else domain or None
+
+
+def zip_key(value):
+    value = _NON_WORD.sub("", (value or "").lower())
+    return value[:5] or None
+
+
+def phone_key(value):
+    digits = re.sub(r"\D", "", value or "")
+    return digits[-10:] if len(digits) >= 7 else None
+
+
+def load_records(session, kind):
+    spec = ENTITIES[kind]
+    table = spec["model"].__table__
+    rows = session.execute(select(table.c.id, table.c[spec["name"]], table.c[spec["email"]],
+                                  table.c[spec["zip"]], table.c[spec["phone"]]).order_by(table.c.id))
+    return [
+        Record(id_, normalize_name(name), (email or "").strip().lower() or None, email_domain(email),
+               zip_key(zip_), phone_key(phone))
+        for id_, name, email, zip_, phone in rows
+    ]
+
+
+def blocking_keys(record):
+    keys = set()
+    if record.name:
+        keys.add("n:" + record.name.split()[0])
+    for prefix, value in (("z:", record.zip), ("d:", record.domain), ("m:", record.email), ("p:", record.phone)):
+        if value:
+            keys.add(prefix + value)
+    return keys
+
+
+def build_blocks(records, max_block=MAX_BLOCK):
+    """{key: [record index, ...]} for keys shared by 2..max_block records."""
+    blocks = {}
+    for i, record in enumerate(records):
+        for key in blocking_keys(record):
+            blocks.setdefault(key, []).append(i)
+    return {k: v for k, v in blocks.items() if 1 < len(v) <= max_block}
+
+
+def trigram_matrix(names):
+    """Row-normalised character trigram counts, one row per name."""
+    grams = [[f"  {n} "[i:i + 3] for i in range(len(n) + 1)] for n in names]
+    vocabulary = {}
+    for row in grams:
+        for g in row:
+            vocabulary.setdefault(g, len(vocabulary))
+    matrix = np.zeros((len(names), max(len(vocabulary), 1)), dtype=np.float32)
+    for r, row in enumerate(grams):
+        for g in row:
+            matrix[r, vocabulary[g]] += 1
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def _same(values):
+    """Pairwise equality matrix that treats missing values as different."""
+    arr = np.array(values, dtype=object)
+    present = arr != None  # noqa: E711 - elementwise comparison
+    return (arr[:, None] == arr[None, :]) & present[:, None] & present[None, :]
+
+
+def score_block(records, members):
+    """Score matrix for the records of one block (name similarity plus contact bonuses)."""
+    block = [records[i] for i in members]
+    m = trigram_matrix([r.name for r in block])
+    scores = m @ m.T
+    for field, bonus in BONUS.items():
+        scores = scores + bonus * _same([getattr(r, field) for r in block])
+    return np.minimum(scores, 1.0)
+
+
+def _reasons(a, b):
+    return ", ".join(f for f in BONUS if getattr(a, f) and getattr(a, f) == getattr(b, f))
+
+
+def reference_counts(session, kind):
+    counts = {}
+    for model, column in ENTITIES[kind]["references"]:
+        col = getattr(model, column)
+        for id_, n in session.execute(select(col, func.count()).where(col.isnot(None)).group_by(col)):
+            counts[id_] = counts.get(id_, 0) + n
+    return counts
+
+
+def find_duplicates(session, kind, threshold=DEFAULT_THRESHOLD, max_block=MAX_BLOCK):
+    """Proposed merges, best first. Each pair appears once, whichever blocks it shares."""
+    if kind not in ENTITIES:
+        raise DedupError(f"Unknown kind '{kind}'. Valid options: {', '.join(ENTITIES)}")
+    records = load_records(session, kind)
+    best = {}
+    for members in build_blocks(records, max_block).values():
+        scores = score_block(records, members)
+        rows, cols = np.nonzero(np.triu(scores >= threshold, k=1))
+        for r, c in zip(rows.tolist(), cols.tolist()):
+            pair = (members[r], members[c]) if members[r] < members[c] else (members[c], members[r])
+            best[pair] = max(best.get(pair, 0.0), float(scores[r, c]))
+    if not best:
+        return []
+
+    refs = reference_counts(session, kind)
+    model, name_col = ENTITIES[kind]["model"], ENTITIES[kind]["name"]
+    ids = {records[i].id for pair in best for i in pair}
+    names = dict(session.execute(select(model.id, getattr(model, name_col)).where(model.id.in_(ids))).all())
+    proposals = []
+    for (i, j), score in best.items():
+        a, b = records[i], records[j]
+        # Keep the record more orders point at; on a tie the older one
+        keep, drop = (a, b) if (refs.get(a.id, 0), -a.id) >= (refs.get(b.id, 0), -b.id) else (b, a)
+        proposals.append(Candidate(keep.id, drop.id, round(score, 3), names[keep.id], names[drop.id], _reasons(a, b)))
+    return sorted(proposals, key=lambda c: (-c.score, c.keep_id, c.drop_id))
+
+
+def merge(session, kind, keep_id, drop_ids):
+    """
+    Merges drop_ids into keep_id and commits. Returns {table: rows re-pointed}.
+    Raises DedupError if any of the records does not exist.
+    """
+    if kind not in ENTITIES:
+        raise DedupError(f"Unknown kind '{kind}'. Valid options: {', '.join(ENTITIES)}")
+    spec = ENTITIES[kind]
+    model = spec["model"]
+    drop_ids = sorted(set(drop_ids) - {keep_id})
+    keep = session.get(model, keep_id)
+    drops = session.query(model).filter(model.id.in_(drop_ids)).order_by(model.id).all()
+    if keep is None or len(drops) != len(drop_ids):
+        missing = {keep_id, *drop_ids} - {keep_id if keep else None} - {d.id for d in drops}
+        raise DedupError(f"{kind} not found: {', '.join(str(i) for i in sorted(missing))}")
+
+    # Documents point at their record through (reference_type, reference_id)
+    documents = Document.__table__
+    targets = [(ref_model.__table__, column, None) for ref_model, column in spec["references"]]
+    targets.append((documents, "reference_id", documents.c.reference_type == spec["document_type"]))
+
+    try:
+        moved = {}
+        for table, column, condition in targets:
+            col = table.c[column]
+            where = col.in_(drop_ids) if condition is None else condition & col.in_(drop_ids)
+            old = session.execute(select(table.c.id, col).where(where)).all()
+            moved[table.name] = len(old)
+            if not old:
+                continue
+            values = {column: keep_id}
+            if "version_id" in table.c:
+                values["version_id"] = table.c.version_id + 1
+            session.execute(update(table).where(where).values(**values)
+                            .execution_options(synchronize_session=False))
+            if table.name in change_log.TRACKED_TABLES:
+                change_log.record(session, [("update", table.name, {"id": i, column: keep_id}) for i, _ in old])
+            if table.name in audit.AUDITED_TABLES:
+                entity_type = audit.AUDITED_TABLES[table.name][0]
+                audit.record(session, [(entity_type, i, table.name, i, "update", {column: [was, keep_id]})
+                                       for i, was in old])
+
+        # Fill the survivor's empty fields from the duplicates, after they are gone
+        # (unique columns such as email would clash otherwise)
+        columns = [c.key for c in model.__mapper__.column_attrs if c.key != "id"]
+        fills = {}
+        for d in drops:
+            for key in columns:
+                value = getattr(d, key)
+                if value not in (None, "") and getattr(keep, key) in (None, "") and key not in fills:
+                    fills[key] = value
+        for d in drops:
+            session.delete(d)
+        session.flush()
+        for key, value in fills.items():
+            setattr(keep, key, value)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    # Orders were re-pointed in bulk; drop stale copies from the identity map
+    session.expire_all()
+    return moved
+
+
+def print_candidates(candidates):
+    rows = [(c.score, c.keep_id, c.keep_name, c.drop_id, c.drop_name, c.reasons) for c in candidates]
+    print(tabulate(rows, headers=["Score", "Keep", "Name", "Merge", "Name", "Also matching"]))
+
+
+def review(session, kind, threshold):
+    """Walks through the proposals and merges the accepted ones."""
+    merged_into = {}
+    for c in find_duplicates(session, kind, threshold):
+        keep = merged_into.get(c.keep_id, c.keep_id)
+        if c.drop_id in merged_into or keep == c.drop_id:
+            continue
+        print(f"\n{c.score:.3f}  keep {keep}: {c.keep_name}\n       merge {c.drop_id}: {c.drop_name}"
+              f"{'  (' + c.reasons + ')' if c.reasons else ''}")
+        answer = input("Merge? [y/N/q]: ").strip().lower()
+        if answer == "q":
+            break
+        if answer == "y":
+            moved = merge(session, kind, keep, [c.drop_id])
+            merged_into[c.drop_id] = keep
+            print("Merged; re-pointed " + ", ".join(f"{n} {t}" for t, n in moved.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find and merge duplicate customers or suppliers.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("scan", "List proposed merges"), ("review", "Accept or reject each proposed merge")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("kind", choices=ENTITIES)
+        p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    m = sub.add_parser("merge", help="Merge records into the first one")
+    m.add_argument("kind", choices=ENTITIES)
+    m.add_argument("keep", type=int)
+    m.add_argument("drop", type=int, nargs="+")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    init_db(engine)
+    session = get_session(engine)
+    try:
+        if args.command == "scan":
+            print_candidates(find_duplicates(session, args.kind, args.threshold))
+        elif args.command == "review":
+            review(session, args.kind, args.threshold)
+        elif args.command == "merge":
+            moved = merge(session, args.kind, args.keep, args.drop)
+            print(f"Merged {', '.join(map(str, args.drop))} into {args.keep}; re-pointed "
+                  + ", ".join(f"{n} {t}" for t, n in moved.items()))
+    except DedupError as e:
+        print(f"Error: {e}")
+
+
+if __name__ == "__main__":
+    main()
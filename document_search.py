@@ -0,0 +1,274 @@
+"""
+Full-text search over the document repository.
+
+Text is pulled out of every registered document (PDFs with pypdf, plain text
+files as-is) by a process pool and stored in an SQLite FTS5 table keyed by
+documents.id. Documents are indexed as they are registered; the `index`
+command catches up on anything changed or missed since. Each indexed row remembers the size, mtime and SHA-256 of the
+file it was extracted from. Re-indexing compares them with the file as it is
+now: an unchanged size and mtime skips the file without reading it, a changed
+one is hashed, and only new content is extracted again. Documents regenerated
+or edited in place are therefore picked up once, and their Document.sha256
+and size_bytes are updated to match. A file in the content-addressed store
+never changes legitimately, so one whose content no longer matches its name
+is reported as corrupt and left alone, index row and hash included, until the
+original is uploaded again. Rows for deleted documents are dropped.
+An index built before size and mtime were stored is rebuilt on the next run.
+
+Search is ranked by bm25 with the file name weighted above the body, and
+returns a highlighted snippet per hit.
+
+Usage:
+    python document_search.py index [--workers 4] [--full]
+    python document_search.py search "LOT-2025-014"
+"""
+import argparse
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import text
+from tabulate import tabulate
+
+import document_store
+from models import get_engine, init_db, get_session, Document
+
+FTS_TABLE = "document_text"
+TEXT_EXTENSIONS = {".txt", ".csv", ".md"}
+BATCH_SIZE = 100  # documents written per transaction
+MAX_CHARS = 2_000_000  # cap per document so one huge scan cannot bloat the index
+
+
+def ensure_index(session):
+    """Creates the FTS5 table if needed. Requires SQLite built with FTS5."""
+    if session.get_bind().dialect.name != "sqlite":
+        raise RuntimeError("Full-text document search requires the SQLite backend (FTS5).")
+    _create_index(session)
+    session.commit()
+
+
+def _create_index(session):
+    columns = {row[1] for row in session.execute(text(f"PRAGMA table_info({FTS_TABLE})")).all()}
+    if columns and "mtime" not in columns:
+        session.execute(text(f"DROP TABLE {FTS_TABLE}"))  # older layout: rebuilt below, re-extracted next run
+    session.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "name, body, sha256 UNINDEXED, size UNINDEXED, mtime UNINDEXED, tokenize = 'porter unicode61')"
+    ))
+
+
+def file_state(path):
+    """(size, mtime) of a file, or None if it is missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def extract_text(path):
+    """
+    Runs in a worker process. Returns (sha256, (size, mtime), text, error) for
+    one file; unsupported types are indexed by name only.
+    """
+    try:
+        state = file_state(path)
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".pdf":
+            from pypdf import PdfReader
+            reader = PdfReader(path)
+            body = "\n".join(page.extract_text() or "" for page in reader.pages)
+        elif ext in TEXT_EXTENSIONS:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                body = f.read()
+        else:
+            body = ""
+        return digest.hexdigest(), state, body[:MAX_CHARS], None
+    except Exception as e:
+        return None, None, "", f"{type(e).__name__}: {e}"
+
+
+def _write_row(session, doc, sha, state, body):
+    session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": doc.id})
+    session.execute(
+        text(f"INSERT INTO {FTS_TABLE} (rowid, name, body, sha256, size, mtime) "
+             "VALUES (:id, :name, :body, :sha, :size, :mtime)"),
+        {"id": doc.id, "name": doc.original_name or os.path.basename(doc.file_path), "body": body,
+         "sha": sha, "size": state[0], "mtime": state[1]},
+    )
+
+
+def index_document(session, doc):
+    """
+    Indexes one newly registered document in the caller's transaction (no
+    commit). Returns an error message if its text could not be extracted; the
+    next `index` run retries it. A no-op on backends without FTS5.
+    """
+    if session.get_bind().dialect.name != "sqlite":
+        return None
+    _create_index(session)
+    sha, state, body, error = extract_text(doc.file_path)
+    if error:
+        return error
+    _write_row(session, doc, sha, state, body)
+    return None
+
+
+def documents_to_index(session, full=False):
+    """
+    Documents whose file is not in the index as it is now. A file whose size
+    or mtime changed but whose content did not (e.g. copied back from a backup)
+    only has its indexed size and mtime refreshed.
+    """
+    docs = session.query(Document.id, Document.file_path, Document.original_name, Document.sha256).all()
+    if full:
+        return docs
+    indexed = {rowid: (sha, size, mtime) for rowid, sha, size, mtime in
+               session.execute(text(f"SELECT rowid, sha256, size, mtime FROM {FTS_TABLE}")).all()}
+    stale = []
+    for d in docs:
+        if d.id not in indexed:
+            stale.append(d)
+            continue
+        sha, size, mtime = indexed[d.id]
+        state = file_state(d.file_path)
+        if state is None or state == (size, mtime):
+            continue  # missing files keep their last indexed text
+        if document_store.file_sha256(d.file_path) != sha:
+            stale.append(d)
+        else:
+            session.execute(text(f"UPDATE {FTS_TABLE} SET size = :size, mtime = :mtime WHERE rowid = :id"),
+                            {"size": state[0], "mtime": state[1], "id": d.id})
+    session.commit()
+    return stale
+
+
+def index_documents(session, workers=None, full=False):
+    """
+    Brings the FTS index up to date. Returns a summary dict with the number of
+    documents indexed, removed and failed (with their error messages).
+    """
+    ensure_index(session)
+    removed = session.execute(
+        text(f"DELETE FROM {FTS_TABLE} WHERE rowid NOT IN (SELECT id FROM documents)")
+    ).rowcount
+    session.commit()
+
+    docs = documents_to_index(session, full)
+    summary = {"indexed": 0, "removed": removed, "failed": []}
+    if not docs:
+        return summary
+
+    def write(batch):
+        for doc, (sha, state, body, error) in batch:
+            if error:
+                summary["failed"].append(f"Document {doc.id} ({doc.file_path}): {error}")
+                continue
+            if doc.sha256 != sha and document_store.in_store(doc.file_path, doc.sha256):
+                summary["failed"].append(f"Document {doc.id} ({doc.file_path}): corrupt, "
+                                         "stored file no longer matches its hash")
+                continue
+            _write_row(session, doc, sha, state, body)
+            if doc.sha256 != sha:
+                # Through the ORM so the change log sees the new hash
+                record = session.get(Document, doc.id)
+                record.sha256, record.size_bytes = sha, state[0]
+            summary["indexed"] += 1
+        session.commit()
+
+    paths = [d.file_path for d in docs]
+    if len(docs) == 1 or workers == 1:
+        results = map(extract_text, paths)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(extract_text, paths, chunksize=max(1, len(paths) // ((workers or os.cpu_count() or 1) * 4)))
+    try:
+        batch = []
+        for doc, result in zip(docs, results):
+            batch.append((doc, result))
+            if len(batch) >= BATCH_SIZE:
+                write(batch)
+                batch = []
+        write(batch)
+    finally:
+        if pool:
+            pool.shutdown()
+    return summary
+
+
+def to_match_query(query):
+    """
+    Turns operator input into an FTS5 query: every word must appear, and words
+    are quoted so part numbers like LOT-2025-014 are not parsed as operators.
+    """
+    terms = [t.replace('"', '""') for t in query.split()]
+    return " ".join(f'"{t}"' for t in terms)
+
+
+def search(session, query, limit=20, reference_type=None):
+    """
+    Ranked search. Returns dicts with document_id, reference_type,
+    reference_id, name, file_path and a highlighted snippet.
+    """
+    match = to_match_query(query)
+    if not match:
+        return []
+    ensure_index(session)
+    sql = f"""
+        SELECT d.id, d.reference_type, d.reference_id, {FTS_TABLE}.name, d.file_path,
+               snippet({FTS_TABLE}, 1, '[', ']', '...', 12) AS snippet
+        FROM {FTS_TABLE}
+        JOIN documents d ON d.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH :match
+        {"AND d.reference_type = :ref_type" if reference_type else ""}
+        ORDER BY bm25({FTS_TABLE}, 5.0, 1.0)
+        LIMIT :limit
+    """
+    params = {"match": match, "limit": limit, "ref_type": reference_type}
+    keys = ["document_id", "reference_type", "reference_id", "name", "file_path", "snippet"]
+    return [dict(zip(keys, row)) for row in session.execute(text(sql), params).all()]
+
+
+def print_results(results):
+    rows = [[r["document_id"], f"{r['reference_type']} {r['reference_id']}", r["name"],
+             " ".join(r["snippet"].split())] for r in results]
+    print(tabulate(rows, headers=["Doc", "Attached To", "File", "Match"], tablefmt="grid", maxcolwidths=[None, None, 30, 60]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text index and search for stored documents.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    idx = sub.add_parser("index", help="Extract text from new or changed documents")
+    idx.add_argument("--workers", type=int, default=None, help="Extraction processes (default: CPU count)")
+    idx.add_argument("--full", action="store_true", help="Re-extract every document")
+    s = sub.add_parser("search", help="Ranked search")
+    s.add_argument("query")
+    s.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    init_db(engine)
+    session = get_session(engine)
+    try:
+        if args.command == "index":
+            summary = index_documents(session, args.workers, args.full)
+            print(f"Indexed: {summary['indexed']}  Removed: {summary['removed']}  Failed: {len(summary['failed'])}")
+            for msg in summary["failed"]:
+                print(f"  {msg}")
+        else:
+            results = search(session, args.query, args.limit)
+            if results:
+                print_results(results)
+            else:
+                print("No matches.")
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Document repository: every uploaded or generated file gets a row in `documents`
+with its size, SHA-256, MIME type and timestamps.
+
+Uploaded files are copied into a content-addressed store sharded by hash:
+
+    erp_documents/store/3f/a2/3fa2...e9.pdf
+
+Two levels of 256 directories keep any one directory small, and identical
+uploads share one stored file. Generated PDFs/Excel files stay where their
+generator wrote them and are registered in place.
+
+Lookups go through the (reference_type, reference_id) index, so "all documents
+for this order" is one indexed query rather than a directory scan. Each file is
+also added to the full-text index (document_search) as it is registered.
+"""
+import hashlib
+import mimetypes
+import os
+import shutil
+
+from models import Document
+
+STORE_DIR = os.path.join(".", "erp_documents", "store")
+CHUNK_SIZE = 1024 * 1024
+
+REFERENCE_TYPES = ['PurchaseOrder', 'CustomerOrder', 'Invoice', 'Supplier', 'Customer', 'Product']
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def guess_mime(path):
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def shard_path(sha256, ext, store_dir=STORE_DIR):
+    return os.path.join(store_dir, sha256[:2], sha256[2:4], sha256 + ext.lower())
+
+
+def file_metadata(path):
+    """Size, hash and MIME type of a file, as Document column values."""
+    return {
+        "size_bytes": os.path.getsize(path),
+        "sha256": file_sha256(path),
+        "mime_type": guess_mime(path),
+    }
+
+
+def store_file(path, store_dir=STORE_DIR):
+    """
+    Copies a file into the sharded store (skipped if identical content is
+    already there; a stored copy that no longer matches its hash is replaced).
+    Returns (stored_path, metadata).
+    """
+    meta = file_metadata(path)
+    dest = shard_path(meta["sha256"], os.path.splitext(path)[1], store_dir)
+    if not os.path.exists(dest) or file_sha256(dest) != meta["sha256"]:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = dest + ".part"
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, dest)  # atomic: a crash never leaves a half-written file under the final name
+    return dest, meta
+
+
+def add_document(session, reference_type, reference_id, path, description=None, copy_to_store=True,
+                 store_dir=STORE_DIR):
+    """
+    Registers a file against a record and stages it in the session (no commit).
+    Uploads are copied into the store; generated files pass copy_to_store=False
+    and are registered where they are. A file already registered against the
+    record under the same path (e.g. an invoice rendered again) keeps its row,
+    with size, hash and MIME type refreshed. Either way the document is added
+    to the full-text index.
+    """
+    import document_search  # imports this module
+    if reference_type not in REFERENCE_TYPES:
+        raise ValueError(f"Invalid reference type '{reference_type}'. Valid options: {', '.join(REFERENCE_TYPES)}")
+    if not os.path.isfile(path):
+        raise FileNotFoundError(path)
+
+    if copy_to_store:
+        file_path, meta = store_file(path, store_dir)
+    else:
+        file_path, meta = path, file_metadata(path)
+
+    doc = (
+        session.query(Document)
+        .filter(Document.reference_type == reference_type, Document.reference_id == reference_id,
+                Document.file_path == file_path)
+        .order_by(Document.id)
+        .first()
+    )
+    if doc is not None:
+        for key, value in meta.items():
+            setattr(doc, key, value)
+        if description is not None:
+            doc.description = description
+    else:
+        doc = Document(
+            reference_type=reference_type,
+            reference_id=reference_id,
+            file_path=file_path,
+            original_name=os.path.basename(path),
+            description=description,
+            **meta,
+        )
+        session.add(doc)
+        session.flush()
+    document_search.index_document(session, doc)
+    return doc
+
+
+def register_document(session, reference_type, reference_id, path, description=None, copy_to_store=True,
+                      store_dir=STORE_DIR):
+    """add_document + commit."""
+    doc = add_document(session, reference_type, reference_id, path, description, copy_to_store, store_dir)
+    session.commit()
+    return doc
+
+
+def documents_for(session, reference_type, reference_id):
+    """All documents attached to one record, newest first (single indexed query)."""
+    return (
+        session.query(Document)
+        .filter(Document.reference_type == reference_type, Document.reference_id == reference_id)
+        .order_by(Document.created_at.desc(), Document.id.desc())
+        .all()
+    )
+
+
+def find_by_hash(session, sha256):
+    return session.query(Document).filter(Document.sha256 == sha256).all()
+
+
+def in_store(path, sha256):
+    """True if path is a content-addressed store file, i.e. named after its hash."""
+    return sha256 is not None and os.path.splitext(os.path.basename(path))[0] == sha256
+
+
+def verify(doc):
+    """True if the file still exists and matches its recorded hash."""
+    return os.path.isfile(doc.file_path) and (doc.sha256 is None or file_sha256(doc.file_path) == doc.sha256)
+
+
+def format_size(size_bytes):
+    if size_bytes is None:
+        return ""
+    for unit in ("B", "KB", "MB"):
+        if size_bytes < 1024:
+            return f"{size_bytes:.0f} {unit}" if unit == "B" else f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024
+    return f"{size_bytes:.1f} GB"
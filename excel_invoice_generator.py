@@ -56,6 +56,10 @@ def set_named_range_value(wb, sheet, name, value):
         return False
 
 def generate_invoice(session, customer_order_id):
+    """
+    Fills the Excel invoice template for an order and exports it to PDF when possible.
+    Returns the PDF path (or the .xlsx path if PDF export is unavailable); None on failure.
+    """
     co = session.get(CustomerOrder, customer_order_id)
     if not co:
         print("Order not found.")
@@ -147,8 +151,11 @@ def generate_invoice(session, customer_order_id):
         if PDF_SUPPORT:
             pdf_path = os.path.join(PDFS_DIR, f"{filename}.pdf")
             export_to_pdf(xlsx_path, pdf_path)
+            if os.path.exists(pdf_path):
+                return pdf_path
         else:
             print("PDF export skipped (Missing pywin32 library).")
+        return xlsx_path
         
     except Exception as e:
         print(f"Error generating invoice: {e}")
@@ -0,0 +1,228 @@
+"""
+Lot expiry and shelf-life monitoring.
+
+Every query here runs inside the database. Reports are GROUP BY aggregates and
+alerts are raised with a single INSERT ... SELECT, so a scheduled run over
+hundreds of thousands of lots never loads lots into Python.
+
+product_lots carries a partial covering index, ix_product_lots_expiry, on
+(expiration_date, product_id, warehouse, quantity, cost_price) WHERE
+quantity > 0. Empty lots, which are most of the table over time, are not in
+it. The expiry scans read the index range up to the horizon and never touch
+the table. The `quantity > 0` term is written as a literal (IN_STOCK) because
+SQLite only uses a partial index when the query repeats its WHERE clause.
+
+Severity is relative to the run date:
+
+    expired    expiration_date <= as_of
+    critical   within CRITICAL_DAYS
+    warning    within the --days horizon (WARNING_DAYS by default)
+
+expiry_alerts holds one row per lot and severity. A re-run only adds
+escalations, e.g. warning -> critical. Open alerts for lots that have since
+sold out are closed automatically.
+
+Usage:
+    python expiry_monitor.py report --days 30 [--by product|warehouse|lot] [--warehouse Irvine]
+    python expiry_monitor.py alert [--days 60]       # scheduled run (cron / Task Scheduler)
+    python expiry_monitor.py alerts                  # open alerts
+    python expiry_monitor.py ack 12 13
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, update, func, case, literal, literal_column, exists, and_
+from tabulate import tabulate
+
+from models import get_engine, init_db, get_session, Product, ProductLot, ExpiryAlert
+
+WARNING_DAYS = 60
+CRITICAL_DAYS = 14
+REPORT_DAYS = 30
+GROUPINGS = ("product", "warehouse", "lot")
+MAIN_WAREHOUSE = "(main)"
+
+# Must match the partial index predicate textually (see module docstring)
+IN_STOCK = ProductLot.quantity > literal_column("0")
+
+
+def _expiring(as_of, days, warehouse=None):
+    conditions = [IN_STOCK, ProductLot.expiration_date <= as_of + timedelta(days=days)]
+    if warehouse is not None:
+        conditions.append(func.coalesce(ProductLot.warehouse, MAIN_WAREHOUSE) == warehouse)
+    return and_(*conditions)
+
+
+def severity(as_of, critical_days=CRITICAL_DAYS):
+    return case(
+        (ProductLot.expiration_date <= as_of, literal("expired")),
+        (ProductLot.expiration_date <= as_of + timedelta(days=critical_days), literal("critical")),
+        else_=literal("warning"),
+    )
+
+
+def expiring_by_product(session, days=REPORT_DAYS, as_of=None, warehouse=None):
+    """(product_id, sku, name, lots, quantity, value, first_expiry) for stock expiring within `days`."""
+    as_of = as_of or datetime.utcnow()
+    lots = (
+        select(ProductLot.product_id.label("product_id"),
+               func.count().label("lots"),
+               func.sum(ProductLot.quantity).label("quantity"),
+               func.sum(ProductLot.quantity * func.coalesce(ProductLot.cost_price, 0)).label("value"),
+               func.min(ProductLot.expiration_date).label("first_expiry"))
+        .where(_expiring(as_of, days, warehouse))
+        .group_by(ProductLot.product_id)
+        .subquery()
+    )
+    return session.execute(
+        select(lots.c.product_id, Product.sku, Product.name, lots.c.lots, lots.c.quantity, lots.c.value,
+               lots.c.first_expiry)
+        .join(Product, Product.id == lots.c.product_id)
+        .order_by(lots.c.first_expiry, Product.sku)
+    ).all()
+
+
+def expiring_by_warehouse(session, days=REPORT_DAYS, as_of=None):
+    """(warehouse, products, lots, quantity, value, first_expiry) for stock expiring within `days`."""
+    as_of = as_of or datetime.utcnow()
+    warehouse = func.coalesce(ProductLot.warehouse, MAIN_WAREHOUSE)
+    return session.execute(
+        select(warehouse, func.count(ProductLot.product_id.distinct()), func.count(),
+               func.sum(ProductLot.quantity),
+               func.sum(ProductLot.quantity * func.coalesce(ProductLot.cost_price, 0)),
+               func.min(ProductLot.expiration_date))
+        .where(_expiring(as_of, days))
+        .group_by(warehouse)
+        .order_by(warehouse)
+    ).all()
+
+
+def expiring_lots(session, days=REPORT_DAYS, as_of=None, warehouse=None, limit=500):
+    """Individual lots expiring within `days`, soonest first."""
+    as_of = as_of or datetime.utcnow()
+    return session.execute(
+        select(ProductLot.id, Product.sku, ProductLot.lot_number,
+               func.coalesce(ProductLot.warehouse, MAIN_WAREHOUSE), ProductLot.quantity,
+               ProductLot.expiration_date, severity(as_of))
+        .join(Product, Product.id == ProductLot.product_id)
+        .where(_expiring(as_of, days, warehouse))
+        .order_by(ProductLot.expiration_date, ProductLot.id)
+        .limit(limit)
+    ).all()
+
+
+def raise_alerts(session, days=WARNING_DAYS, as_of=None, critical_days=CRITICAL_DAYS):
+    """
+    Records alerts for in-stock lots expiring within `days` and closes open
+    alerts of lots that are now empty. Commits. Returns (raised, closed).
+    """
+    as_of = as_of or datetime.utcnow()
+    now = datetime.utcnow()
+    level = severity(as_of, critical_days)
+    already = exists().where(ExpiryAlert.lot_id == ProductLot.id, ExpiryAlert.severity == level)
+    source = (
+        select(ProductLot.id, ProductLot.product_id, ProductLot.warehouse, level, ProductLot.expiration_date,
+               ProductLot.quantity, literal(now))
+        .where(_expiring(as_of, days), ~already)
+    )
+    try:
+        raised = session.execute(insert(ExpiryAlert).from_select(
+            ["lot_id", "product_id", "warehouse", "severity", "expiration_date", "quantity", "created_at"], source,
+        )).rowcount
+        closed = session.execute(
+            update(ExpiryAlert)
+            .where(ExpiryAlert.acknowledged_at.is_(None),
+                   ExpiryAlert.lot_id.in_(select(ProductLot.id).where(ProductLot.quantity <= 0)))
+            .values(acknowledged_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return raised, closed
+
+
+def open_alerts(session, limit=500):
+    return session.execute(
+        select(ExpiryAlert.id, ExpiryAlert.severity, Product.sku, ProductLot.lot_number,
+               func.coalesce(ExpiryAlert.warehouse, MAIN_WAREHOUSE), ExpiryAlert.quantity,
+               ExpiryAlert.expiration_date, ExpiryAlert.created_at)
+        .join(Product, Product.id == ExpiryAlert.product_id)
+        .join(ProductLot, ProductLot.id == ExpiryAlert.lot_id)
+        .where(ExpiryAlert.acknowledged_at.is_(None))
+        .order_by(ExpiryAlert.expiration_date, ExpiryAlert.id)
+        .limit(limit)
+    ).all()
+
+
+def acknowledge(session, alert_ids):
+    """Marks alerts as handled. Returns the number of alerts changed."""
+    result = session.execute(
+        update(ExpiryAlert)
+        .where(ExpiryAlert.id.in_(alert_ids), ExpiryAlert.acknowledged_at.is_(None))
+        .values(acknowledged_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount
+
+
+def _date(value):
+    return value.strftime("%Y-%m-%d") if value else ""
+
+
+def print_report(session, days, by="product", as_of=None, warehouse=None):
+    if by == "warehouse":
+        rows = [(w, p, n, q, f"${v or 0:,.2f}", _date(first)) for w, p, n, q, v, first in
+                expiring_by_warehouse(session, days, as_of)]
+        headers = ["Warehouse", "Products", "Lots", "Qty", "Value", "First expiry"]
+    elif by == "lot":
+        rows = [(sku, lot, w, q, _date(exp), sev) for _, sku, lot, w, q, exp, sev in
+                expiring_lots(session, days, as_of, warehouse)]
+        headers = ["SKU", "Lot #", "Warehouse", "Qty", "Expires", "Severity"]
+    else:
+        rows = [(sku, name, n, q, f"${v or 0:,.2f}", _date(first)) for _, sku, name, n, q, v, first in
+                expiring_by_product(session, days, as_of, warehouse)]
+        headers = ["SKU", "Name", "Lots", "Qty", "Value", "First expiry"]
+    if not rows:
+        print(f"No stock expires within {days} days.")
+        return
+    print(f"Stock expiring within {days} days (including expired):")
+    print(tabulate(rows, headers=headers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lot expiry reports and alerts.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    r = sub.add_parser("report", help="Stock expiring within N days")
+    r.add_argument("--days", type=int, default=REPORT_DAYS)
+    r.add_argument("--by", choices=GROUPINGS, default="product")
+    r.add_argument("--warehouse")
+    a = sub.add_parser("alert", help="Record alerts for expiring lots (scheduled run)")
+    a.add_argument("--days", type=int, default=WARNING_DAYS)
+    a.add_argument("--critical-days", type=int, default=CRITICAL_DAYS)
+    sub.add_parser("alerts", help="List open alerts")
+    k = sub.add_parser("ack", help="Acknowledge alerts")
+    k.add_argument("ids", type=int, nargs="+")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    init_db(engine)
+    session = get_session(engine)
+
+    if args.command == "report":
+        print_report(session, args.days, args.by, warehouse=args.warehouse)
+    elif args.command == "alert":
+        raised, closed = raise_alerts(session, args.days, critical_days=args.critical_days)
+        print(f"Raised {raised} alerts, closed {closed} for lots that sold out.")
+    elif args.command == "alerts":
+        rows = [(i, sev, sku, lot, w, q, _date(exp), _date(created)) for i, sev, sku, lot, w, q, exp, created in
+                open_alerts(session)]
+        print(tabulate(rows, headers=["ID", "Severity", "SKU", "Lot #", "Warehouse", "Qty", "Expires", "Raised"]))
+    elif args.command == "ack":
+        print(f"Acknowledged {acknowledge(session, args.ids)} alerts.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Seeded synthetic data for benchmarks.
+
+Populates a fresh database with suppliers, customers, products, lots, purchase
+orders, customer orders and the lot traceability edges between them at a
+chosen scale. The same seed always produces the same rows, so benchmark runs
+are comparable.
+
+Distributions aim to look like the real business rather than uniform noise:
+  - product popularity is Zipf-like (a few teas make up most lines),
+  - a minority of customers place most orders (Pareto),
+  - lines per order are geometric (most orders have 1-5 lines),
+  - quantities and prices are log-normal, order dates lean towards Q4,
+  - about 2% of products have TBD prices, as in the real catalogue.
+
+Rows are written with Core executemany inserts in chunks, with ids assigned
+up front, so 1M order lines load in well under a minute on SQLite.
+
+Usage:
+    python generate_dataset.py bench.db --scale large
+    python generate_dataset.py bench.db --pos 5000 --cos 20000 --seed 7
+"""
+import argparse
+import math
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from models import (
+    get_engine, init_db, Supplier, Customer, Product, ProductLot, PurchaseOrder, PurchaseOrderLine,
+    CustomerOrder, CustomerOrderLine, OurCompany, DocumentSequenceCounter, LotReceipt, LotShipment, LotSource,
+)
+import addresses
+from services import sequences
+from db_config import bulk_insert
+
+SCALES = {
+    #          suppliers customers products lots/product  POs      COs    mean lines/order
+    "tiny":   dict(suppliers=5, customers=20, products=50, lots_per_product=2, pos=50, cos=200, lines_per_order=3),
+    "small":  dict(suppliers=50, customers=500, products=1000, lots_per_product=3, pos=2000, cos=10000, lines_per_order=4),
+    "medium": dict(suppliers=200, customers=5000, products=5000, lots_per_product=4, pos=20000, cos=80000, lines_per_order=4),
+    # ~1M order lines
+    "large":  dict(suppliers=500, customers=20000, products=20000, lots_per_product=5, pos=50000, cos=200000, lines_per_order=4),
+}
+
+# Fixed calendar so a seed gives the same rows whenever it is run
+FIRST_YEAR, LAST_YEAR = 2023, 2025
+
+TEA_ORIGINS = ["Assam", "Darjeeling", "Nilgiri", "Ceylon", "Kenya", "Yunnan", "Fujian", "Uji", "Kangra", "Dooars"]
+TEA_STYLES = ["Black", "Green", "White", "Oolong", "Chai Blend", "Earl Grey", "Breakfast", "Masala", "Herbal", "Matcha"]
+GRADES = ["TGFOP1", "FTGFOP1", "OP", "BOP", "FOP", "GFOP", "SFTGFOP1", "CTC BP1", "Fannings", "Dust"]
+CATEGORIES = ["Black Tea", "Green Tea", "White Tea", "Oolong", "Blends", "Herbal", "Accessories"]
+CITIES = [("Irvine", "CA", "USA"), ("Portland", "OR", "USA"), ("Austin", "TX", "USA"), ("Seattle", "WA", "USA"),
+          ("Vancouver", "BC", "Canada"), ("Toronto", "ON", "Canada"), ("Kolkata", "WB", "India"),
+          ("Guwahati", "AS", "India"), ("London", "", "UK"), ("Berlin", "", "Germany")]
+UNITS = ["kg", "kg", "kg", "lb", "ea", "box"]
+PACKING = ["20kg Paper Sacks", "25kg Paper Sacks", "1kg Foil Bags", "Wooden Chest", "Carton of 12", None]
+SHIP_VIA = ["DHL", "FedEx", "Ocean Freight", "UPS", "Air Cargo"]
+INCOTERMS = ["FOB", "CIF", "EXW", "DAP", "DDP"]
+PO_STATUS_WEIGHTS = {"Draft": 8, "Sent": 12, "Accepted": 12, "Received": 50, "Closed": 13, "Cancelled": 5}
+CO_STATUS_WEIGHTS = {"Pending": 20, "Invoiced": 75, "Cancelled": 5}
+
+
+class Generator:
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.start = datetime(FIRST_YEAR, 1, 1)
+        self.days = (datetime(LAST_YEAR, 12, 31) - self.start).days
+
+    def zipf_weights(self, n, s=1.1):
+        weights = [1.0 / (rank ** s) for rank in range(1, n + 1)]
+        self.rng.shuffle(weights)  # popularity is not tied to id order
+        total, cum = 0.0, []
+        for w in weights:
+            total += w
+            cum.append(total)
+        return cum
+
+    def pick(self, ids, cum_weights, k):
+        return self.rng.choices(ids, cum_weights=cum_weights, k=k)
+
+    def order_date(self):
+        # Lean towards Q4: re-draw dates in Jan-Sep 30% of the time
+        while True:
+            d = self.start + timedelta(days=self.rng.randrange(self.days), minutes=self.rng.randrange(600, 1080))
+            if d.month >= 10 or self.rng.random() > 0.3:
+                return d
+
+    def line_count(self, mean):
+        # Geometric with the requested mean, capped so one order cannot dominate
+        p = 1.0 / mean
+        return min(1 + int(math.log(1 - self.rng.random()) / math.log(1 - p)) if p < 1 else 1, 40)
+
+    def qty(self):
+        return max(1, int(self.rng.lognormvariate(2.5, 1.0)))
+
+    def price(self, median):
+        return round(self.rng.lognormvariate(math.log(median), 0.4), 2)
+
+    def weighted(self, weights):
+        return self.rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def generate(engine, seed=42, suppliers=50, customers=500, products=1000, lots_per_product=3, pos=2000, cos=10000,
+             lines_per_order=4, progress=print):
+    """Fills an empty database. Returns {table: row count}."""
+    init_db(engine)
+    g = Generator(seed)
+    counts = {}
+
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            # Bulk load only: durability does not matter for a throwaway fixture
+            conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        t0 = time.perf_counter()
+        company = {"company_name": "Bench Tea Imports", "address1": "10 Hughes, A204",
+                   "city": "Irvine", "state": "CA", "zip_code": "92618", "country": "USA"}
+        conn.execute(insert(OurCompany), [{**company, **addresses.formatted_values(OurCompany, company)}])
+
+        supplier_rows = []
+        for i in range(1, suppliers + 1):
+            city, state, country = g.rng.choice(CITIES[6:] + CITIES[:2])
+            row = {"id": i, "name": f"{g.rng.choice(TEA_ORIGINS)} Estate {i} Pvt. Ltd.",
+                   "email": f"sales{i}@estate.example", "city": city, "state": state, "country": country}
+            supplier_rows.append({**row, **addresses.formatted_values(Supplier, row)})
+        bulk_insert(conn, Supplier, supplier_rows)
+
+        customer_rows = []
+        for i in range(1, customers + 1):
+            city, state, country = g.rng.choice(CITIES)
+            addr = f"{g.rng.randint(1, 9999)} {g.rng.choice(['Main', 'Oak', 'Moray', 'Harbor', 'Hill'])} St"
+            row = {
+                "id": i, "customer_name": f"{g.rng.choice(['Chai', 'Leaf', 'Kettle', 'Cup', 'Brew'])} House {i}",
+                "email_address": f"buyer{i}@cafe.example",
+                "ship_to_addr1": addr, "ship_to_city": city, "ship_to_state": state, "ship_to_country": country,
+                "bill_to_addr1": addr, "bill_to_city": city, "bill_to_state": state, "bill_to_country": country,
+            }
+            customer_rows.append({**row, **addresses.formatted_values(Customer, row)})
+        bulk_insert(conn, Customer, customer_rows)
+
+        product_rows, costs = [], {}
+        for i in range(1, products + 1):
+            origin, style, grade = g.rng.choice(TEA_ORIGINS), g.rng.choice(TEA_STYLES), g.rng.choice(GRADES)
+            cost = g.price(6.0)
+            costs[i] = cost
+            tbd = g.rng.random() < 0.02
+            product_rows.append({
+                "id": i, "sku": f"{origin[:3].upper()}-{i:06d}", "sku_number": f"SKU-{i:07d}",
+                "name": f"{origin} {style} {grade}", "description": f"{origin} {style} tea, grade {grade}",
+                "category": g.rng.choice(CATEGORIES),
+                "cost_price": "TBD" if tbd else f"{cost:.2f}",
+                "unit_price": "TBD" if tbd else f"{cost * g.rng.uniform(1.6, 2.4):.2f}",
+                "reorder_level": g.rng.choice([0, 10, 25, 50, 100]),
+                "supplier_id": g.rng.randint(1, suppliers),
+            })
+        bulk_insert(conn, Product, product_rows)
+
+        lot_rows = []
+        for pid in range(1, products + 1):
+            for n in range(g.rng.randint(0, lots_per_product * 2)):
+                produced = g.order_date()
+                lot_rows.append({
+                    "id": len(lot_rows) + 1, "product_id": pid,
+                    "lot_number": f"LOT-{produced:%y%m}-{pid:06d}-{n + 1:02d}",
+                    "production_date": produced, "date_received": produced + timedelta(days=g.rng.randint(10, 60)),
+                    "expiration_date": produced + timedelta(days=g.rng.choice([365, 540, 730])),
+                    "quantity": g.qty() * 10, "cost_price": costs[pid],
+                })
+        bulk_insert(conn, ProductLot, lot_rows)
+        counts.update(suppliers=suppliers, customers=customers, products=products, product_lots=len(lot_rows))
+        progress(f"Reference data: {time.perf_counter() - t0:.1f}s")
+
+        product_ids = list(range(1, products + 1))
+        product_weights = g.zipf_weights(products)
+        customer_weights = g.zipf_weights(customers, s=0.8)
+        next_number = {}
+
+        def number(prefix, when):
+            key = (prefix, when.year)
+            next_number[key] = next_number.get(key, 0) + 1
+            return f"{prefix}-{when.year}-{next_number[key]:04}"
+
+        t0 = time.perf_counter()
+        po_rows, po_line_rows = [], []
+        dates = sorted(g.order_date() for _ in range(pos))
+        for po_id, date in enumerate(dates, 1):
+            status = g.weighted(PO_STATUS_WEIGHTS)
+            po_rows.append({
+                "id": po_id, "supplier_id": g.rng.randint(1, suppliers), "date": date, "status": status,
+                "po_number": number("PO", date), "currency": "USD", "payment_terms": g.rng.choice(["Net 30", "Net 45", "Advance"]),
+                "shipping_method": g.rng.choice(SHIP_VIA), "incoterm": g.rng.choice(INCOTERMS),
+                "shipping_cost": round(g.rng.uniform(0, 400), 2), "discount_amount": 0.0, "tax_amount": 0.0,
+            })
+            for pid in g.pick(product_ids, product_weights, g.line_count(lines_per_order)):
+                qty = g.qty()
+                po_line_rows.append({
+                    "id": len(po_line_rows) + 1, "po_id": po_id, "product_id": pid, "qty": qty, "unit": g.rng.choice(UNITS),
+                    "cost": costs[pid], "packing_structure": g.rng.choice(PACKING),
+                    "quantity_received": qty if status in ("Received", "Closed") else 0,
+                })
+        bulk_insert(conn, PurchaseOrder, po_rows)
+        bulk_insert(conn, PurchaseOrderLine, po_line_rows)
+        counts.update(purchase_orders=len(po_rows), purchase_order_lines=len(po_line_rows))
+        progress(f"Purchase orders: {len(po_rows)} / {len(po_line_rows)} lines in {time.perf_counter() - t0:.1f}s")
+
+        t0 = time.perf_counter()
+        customer_ids = list(range(1, customers + 1))
+        co_rows, co_line_rows = [], []
+        dates = sorted(g.order_date() for _ in range(cos))
+        buyers = g.pick(customer_ids, customer_weights, cos)
+        for co_id, (date, cid) in enumerate(zip(dates, buyers), 1):
+            status = g.weighted(CO_STATUS_WEIGHTS)
+            co_rows.append({
+                "id": co_id, "customer_id": cid, "date": date, "status": status,
+                "invoice_number": number("INV", date) if status == "Invoiced" else None,
+                "po_number": f"CUST-{g.rng.randint(1000, 99999)}" if g.rng.random() < 0.4 else None,
+                "shipping": round(g.rng.choice([0, 0, 15, 25, 40]), 2), "discount": 0.0, "credit": 0.0,
+                "amount_paid": 0.0, "tracking_terms": g.rng.choice(SHIP_VIA),
+            })
+            for pid in g.pick(product_ids, product_weights, g.line_count(lines_per_order)):
+                qty = max(1, g.qty() // 4)
+                price = round(costs[pid] * 2, 2)
+                co_line_rows.append({"id": len(co_line_rows) + 1, "co_id": co_id, "product_id": pid, "qty": qty,
+                                     "selling_price": price, "unit": "kg", "amount": round(qty * price, 2)})
+        bulk_insert(conn, CustomerOrder, co_rows)
+        bulk_insert(conn, CustomerOrderLine, co_line_rows)
+        counts.update(customer_orders=len(co_rows), customer_order_lines=len(co_line_rows))
+        progress(f"Customer orders: {len(co_rows)} / {len(co_line_rows)} lines in {time.perf_counter() - t0:.1f}s")
+
+        # Lot traceability: about 1 lot in 10 is a repack of an older lot of the same product, the
+        # rest were received on a received PO line for their product; invoiced lines ship from a lot
+        t0 = time.perf_counter()
+        received_lines, lots_by_product = {}, {}
+        for line in po_line_rows:
+            if line["quantity_received"]:
+                received_lines.setdefault(line["product_id"], []).append(line)
+        receipt_rows, source_rows, shipment_rows = [], [], []
+        for lot in lot_rows:
+            earlier = lots_by_product.setdefault(lot["product_id"], [])
+            if earlier and g.rng.random() < 0.1:
+                source_rows.append({"parent_lot_id": g.rng.choice(earlier), "child_lot_id": lot["id"],
+                                    "quantity": lot["quantity"], "created_at": lot["date_received"]})
+            elif lot["product_id"] in received_lines:
+                line = g.rng.choice(received_lines[lot["product_id"]])
+                receipt_rows.append({"lot_id": lot["id"], "po_line_id": line["id"], "po_id": line["po_id"],
+                                     "supplier_id": po_rows[line["po_id"] - 1]["supplier_id"],
+                                     "quantity": lot["quantity"], "received_at": lot["date_received"]})
+            earlier.append(lot["id"])
+        for line in co_line_rows:
+            order = co_rows[line["co_id"] - 1]
+            if order["status"] == "Invoiced" and line["product_id"] in lots_by_product:
+                shipment_rows.append({"lot_id": g.rng.choice(lots_by_product[line["product_id"]]),
+                                      "co_line_id": line["id"], "co_id": order["id"], "customer_id": order["customer_id"],
+                                      "quantity": line["qty"], "shipped_at": order["date"]})
+        bulk_insert(conn, LotReceipt, receipt_rows)
+        bulk_insert(conn, LotSource, source_rows)
+        bulk_insert(conn, LotShipment, shipment_rows)
+        counts.update(lot_receipts=len(receipt_rows), lot_sources=len(source_rows), lot_shipments=len(shipment_rows))
+        progress(f"Lot traceability: {len(receipt_rows) + len(source_rows) + len(shipment_rows)} edges in "
+                 f"{time.perf_counter() - t0:.1f}s")
+
+        # Continue the document sequences after the generated numbers
+        counter_rows = [{"sequence_name": sequences.PURCHASE_ORDER if prefix == "PO" else sequences.INVOICE,
+                         "period": str(year), "next_value": n + 1} for (prefix, year), n in next_number.items()]
+        if counter_rows:
+            bulk_insert(conn, DocumentSequenceCounter, counter_rows)
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a seeded synthetic ERP database for benchmarks.")
+    parser.add_argument("db", help="SQLite file to create (or a full SQLAlchemy URL)")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--force", action="store_true", help="Overwrite an existing SQLite file")
+    for key in SCALES["small"]:
+        parser.add_argument(f"--{key.replace('_', '-')}", type=int, dest=key, help=f"Override the scale's {key}")
+    args = parser.parse_args()
+
+    config = dict(SCALES[args.scale])
+    config.update({k: v for k, v in vars(args).items() if k in config and v is not None})
+
+    if "://" in args.db:
+        url = args.db
+    else:
+        if os.path.abspath(args.db) == os.path.abspath("app.db"):
+            print("Refusing to write synthetic data into app.db.")
+            return
+        if os.path.exists(args.db):
+            if not args.force:
+                print(f"{args.db} already exists. Use --force to overwrite.")
+                return
+            os.remove(args.db)
+        url = f"sqlite:///{args.db}"
+
+    started = time.perf_counter()
+    counts = generate(get_engine(url), seed=args.seed, **config)
+    for table, n in counts.items():
+        print(f"{table:>22}: {n:,}")
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,10 @@ import math
 from models import get_engine, get_session, Customer
 from sqlalchemy.exc import IntegrityError
 
-def import_customers():
-    # File path
-    file_path = r"C:\Users\jegra\MyPython\ERP_3\my_app\archive\existing_customer_details_11292025.xlsx"
-    
+CUSTOMER_FILE = r"C:\Users\jegra\MyPython\ERP_3\my_app\archive\existing_customer_details_11292025.xlsx"
+
+def import_customers(file_path=CUSTOMER_FILE, engine=None):
+    """Imports customers from the Excel export. Returns (added, skipped)."""
     print(f"Reading file: {file_path}")
     
     try:
@@ -14,10 +14,10 @@ def import_customers():
         df = pd.read_excel(file_path)
     except Exception as e:
         print(f"Failed to read file: {e}")
-        return
+        return 0, 0
 
     # Database setup
-    engine = get_engine()
+    engine = engine or get_engine()
     session = get_session(engine)
     
     added_count = 0
@@ -93,6 +93,7 @@ def import_customers():
         print(f"An unexpected error occurred: {e}")
     finally:
         session.close()
+    return added_count, skipped_count
 
 if __name__ == "__main__":
     import_customers()
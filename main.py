@@ -2,24 +2,32 @@ import sys
 import os
 import shutil
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import select
 from tabulate import tabulate
 import pandas as pd
-from prompt_toolkit import prompt
+from prompt_toolkit import prompt as toolkit_prompt
 from prompt_toolkit.completion import WordCompleter
 import re
 
 from models import (
     get_engine, init_db, get_session,
     Supplier, Customer, Product, ProductLot,
-    PurchaseOrder, PurchaseOrderLine,
-    CustomerOrder, CustomerOrderLine,
+    PurchaseOrder,
+    CustomerOrder,
     Invoice, InvoiceLine, Document,
     OurCompany
 )
-from pdf_generator import generate_invoice_pdf
-from po_pdf_generator import generate_po_pdf
+import services
+from services import ValidationError, ConcurrencyConflict
+import addresses
+import render_queue
+import document_store
+import document_search
+import sql_profiler
+import render_profiler
+import telemetry
+import expiry_monitor
 
 # --- Setup & Helpers ---
 
@@ -30,13 +38,50 @@ def ensure_directories():
     os.makedirs(DOCS_DIR, exist_ok=True)
     os.makedirs(PDFS_DIR, exist_ok=True)
 
+def open_screen(action, session: Session):
+    """Runs a menu action; its latency goes to telemetry and, under --profile, its SQL is counted as one screen."""
+    with telemetry.screen(action.__name__), sql_profiler.operation(action.__name__):
+        return action(session)
+
+def open_menu(menu, session: Session):
+    with telemetry.screen(menu.__name__, kind="menu"):
+        return menu(session)
+
+def prompt(*args, **kwargs):
+    """prompt_toolkit prompt; the wait is reported to telemetry as input time."""
+    with telemetry.waiting():
+        return toolkit_prompt(*args, **kwargs)
+
 def print_table(data, headers):
     print(tabulate(data, headers=headers, tablefmt="grid"))
 
+def print_validation_errors(e: ValidationError):
+    print("Could not save:")
+    for err in e.errors:
+        print(f"  - {err}")
+
+def resolve_conflict(e: ConcurrencyConflict, changes: dict):
+    """
+    Shows fields another user changed while we were editing and asks which
+    value to keep. Returns the changes to retry with, or None to abandon the edit.
+    """
+    print(f"\n!!! {e}")
+    if not e.conflicts:
+        return None
+    print_table([[k, mine, theirs] for k, (mine, theirs) in e.conflicts.items()], ["Field", "Yours", "Theirs"])
+    for field in e.conflicts:
+        choice = safe_input(f"{field}: keep [Y]ours, [T]heirs, or [C]ancel edit? [T]: ").strip().lower()
+        if choice == 'c':
+            return None
+        if choice != 'y':
+            changes.pop(field, None)
+    return changes
+
 def safe_input(prompt_text):
     """Universal input wrapper that checks for exit codes."""
     try:
-        val = input(prompt_text)
+        with telemetry.waiting():
+            val = input(prompt_text)
     except EOFError:
         return ""
         
@@ -180,96 +225,11 @@ def pick_customer(session: Session):
     return None
 
 def get_formatted_address(source_obj):
-    """Formats address from OurCompany or Customer object."""
-    if isinstance(source_obj, OurCompany):
-        lines = [source_obj.company_name, source_obj.address1, source_obj.address2, 
-                 f"{source_obj.city or ''} {source_obj.state or ''} {source_obj.zip_code or ''}",
-                 source_obj.country]
-        return "\n".join(filter(None, lines))
-    elif isinstance(source_obj, Customer):
-        lines = [source_obj.customer_name, source_obj.ship_to_addr1, source_obj.ship_to_addr2,
-                 f"{source_obj.ship_to_city or ''} {source_obj.ship_to_state or ''} {source_obj.ship_to_zip or ''}",
-                 source_obj.ship_to_country]
-        return "\n".join(filter(None, lines))
-    return ""
-
-def select_address_source(session: Session, field_name="Address"):
-    """
-    Prompts user to select address source.
-    Returns: (is_manual_override, value_string)
-    If manual, returns (True, None) -> Let caller prompt for text.
-    If selection made, returns (False, formatted_address_string).
-    """
-    print(f"Select source for {field_name}:")
-    print(" [M]anual Entry (Type it yourself)")
-    print(" [O]ur Company Details")
-    print(" [C]ustomer Details")
-    print(" [S]kip / Keep Current")
-    
-    choice = safe_input("Choice [M]: ").strip().upper()
-    
-    if choice == 'O':
-        comp = session.query(OurCompany).first()
-        if comp:
-            return False, get_formatted_address(comp)
-        else:
-            print("Our Company details not found.")
-            return True, None
-    elif choice == 'C':
-        cust = pick_customer(session)
-        if cust:
-            return False, get_formatted_address(cust)
-        else:
-            return True, None
-    elif choice == 'S':
-        return False, None # Signal to keep/skip
-    else:
-        return True, None # Manual
-
-def pick_customer(session: Session):
-    """Helper to interactively select a customer and return the object."""
-    customers = session.query(Customer).all()
-    if not customers:
-        print("No customers found.")
-        return None
-        
-    customer_map = {f"{c.customer_name} | ID: {c.id}": c.id for c in customers}
-    choices = list(customer_map.keys())
-    completer = WordCompleter(choices, ignore_case=True, match_middle=True)
-    
-    try:
-        user_input = prompt("Select Customer: ", completer=completer)
-    except KeyboardInterrupt:
-        return None
-        
-    if not user_input: return None
-    
-    cust_id = None
-    if user_input in customer_map:
-        cust_id = customer_map[user_input]
-    elif user_input.isdigit():
-        cust_id = int(user_input)
-    else:
-        match = re.search(r"\|\s*ID:\s*(\d+)\s*$", user_input)
-        if match:
-            cust_id = int(match.group(1))
-            
-    if cust_id:
-        return session.get(Customer, cust_id)
-    return None
-
-def get_formatted_address(source_obj):
-    """Formats address from OurCompany or Customer object."""
+    """Name and address block of OurCompany or a Customer (ship-to), from the precomputed columns."""
     if isinstance(source_obj, OurCompany):
-        lines = [source_obj.company_name, source_obj.address1, source_obj.address2, 
-                 f"{source_obj.city or ''} {source_obj.state or ''} {source_obj.zip_code or ''}",
-                 source_obj.country]
-        return "\n".join(filter(None, lines))
+        return addresses.with_name(source_obj.company_name, addresses.formatted(source_obj, "address_formatted"))
     elif isinstance(source_obj, Customer):
-        lines = [source_obj.customer_name, source_obj.ship_to_addr1, source_obj.ship_to_addr2,
-                 f"{source_obj.ship_to_city or ''} {source_obj.ship_to_state or ''} {source_obj.ship_to_zip or ''}",
-                 source_obj.ship_to_country]
-        return "\n".join(filter(None, lines))
+        return addresses.with_name(source_obj.customer_name, addresses.formatted(source_obj, "ship_to_formatted"))
     return ""
 
 def select_address_source(session: Session, field_name="Address"):
@@ -429,8 +389,9 @@ def view_product_details(session: Session):
     
     if active_lots:
         print("\nActive Lots:")
-        lot_data = [[l.lot_number, l.quantity, l.expiration_date, l.date_received, l.cost_price] for l in active_lots]
-        print_table(lot_data, ["Lot #", "Qty", "Expires", "Received", "Cost"])
+        lot_data = [[l.lot_number, l.warehouse or expiry_monitor.MAIN_WAREHOUSE, l.quantity, l.expiration_date,
+                     l.date_received, l.cost_price] for l in active_lots]
+        print_table(lot_data, ["Lot #", "Warehouse", "Qty", "Expires", "Received", "Cost"])
     else:
         print("\nNo active inventory lots.")
 
@@ -585,28 +546,20 @@ def add_product(session: Session):
     price = "0.0"
     while True:
         p_in = safe_input("Unit Price [0.0] (or TBD): ")
-        if not p_in:
-            break # Use default 0.0
-        
         # Check if valid float or "TBD"
         try:
-            float(p_in)
-            price = p_in
+            price = services.parse_price(p_in)
             break
         except ValueError:
-            if p_in.strip().upper() == "TBD":
-                price = "TBD"
-                break
             print("Invalid price. Please enter a number or 'TBD'.")
             # Loop continues
     
-    product = Product(sku=sku, name=name, description=desc, unit_price=price)
-    session.add(product)
     try:
-        session.commit()
+        services.add_product(session, {"sku": sku, "name": name, "description": desc, "unit_price": price})
         print("Product added successfully.")
+    except ValidationError as e:
+        print_validation_errors(e)
     except Exception as e:
-        session.rollback()
         print(f"Error adding product: {e}")
 
 def list_products(session: Session):
@@ -614,6 +567,13 @@ def list_products(session: Session):
     data = [[p.id, p.sku, p.name, p.unit_price] for p in products]
     print_table(data, ["ID", "SKU", "Name", "Price"])
 
+def list_expiring_lots(session: Session):
+    print("\n--- Expiring Stock ---")
+    days = safe_input(f"Within how many days? [{expiry_monitor.REPORT_DAYS}]: ").strip()
+    days = int(days) if days.isdigit() else expiry_monitor.REPORT_DAYS
+    by = safe_input("Group by product, warehouse or lot? [product]: ").strip().lower()
+    expiry_monitor.print_report(session, days, by if by in expiry_monitor.GROUPINGS else "product")
+
 # --- Order Management ---
 
 def create_purchase_order(session: Session):
@@ -648,15 +608,16 @@ def create_purchase_order(session: Session):
         return
 
     # 2. Header Information
+    next_po = services.sequences.peek_next(session, services.sequences.PURCHASE_ORDER)
     while True:
-        po_number = safe_input("PO Number (e.g. PO-24-001): ")
+        po_number = safe_input(f"PO Number [Enter = next, {next_po}]: ")
         if not po_number:
-            print("PO Number is required.")
-            continue
+            # Allocated atomically when the PO is saved
+            po_number = services.AUTO_NUMBER
+            break
             
         # Check uniqueness
-        existing_po = session.query(PurchaseOrder).filter_by(po_number=po_number).first()
-        if existing_po:
+        if services.po_number_exists(session, po_number):
             print(f"Error: PO Number '{po_number}' already exists. Please choose another.")
         else:
             break
@@ -776,8 +737,7 @@ def create_purchase_order(session: Session):
             "unit": unit,
             "cost": cost,
             "description": desc,
-            "packing_structure": pack_line,
-            "total": qty * cost
+            "packing_structure": pack_line
         })
         
     if not lines:
@@ -785,7 +745,7 @@ def create_purchase_order(session: Session):
         return
 
     # 4. Summary & Save
-    total_goods = sum(l['total'] for l in lines)
+    total_goods = sum(l['qty'] * l['cost'] for l in lines)
     print(f"\nTotal Goods: ${total_goods:.2f}")
     
     try:
@@ -803,43 +763,32 @@ def create_purchase_order(session: Session):
         print("Cancelled.")
         return
         
-    # Create Objects
-    po = PurchaseOrder(
-        supplier_id=supplier_id,
-        po_number=po_number,
-        date=po_date,
-        expected_date=expected_date,
-        payment_terms=payment_terms,
-        currency=currency,
-        ship_to_address=ship_to,
-        shipping_method=method,
-        incoterm=incoterm,
-        port_of_destination=port,
-        # packing_structure=packing, # Removed
-        consignee=consignee,
-        notify_party=notify,
-        tc_party=tc_party,
-        notes=notes,
-        shipping_cost=ship_cost,
-        discount_amount=discount,
-        tax_amount=tax,
-        status='Draft'
-    )
+    header = {
+        "po_number": po_number,
+        "date": po_date,
+        "expected_date": expected_date,
+        "payment_terms": payment_terms,
+        "currency": currency,
+        "ship_to_address": ship_to,
+        "shipping_method": method,
+        "incoterm": incoterm,
+        "port_of_destination": port,
+        "consignee": consignee,
+        "notify_party": notify,
+        "tc_party": tc_party,
+        "notes": notes,
+        "shipping_cost": ship_cost,
+        "discount_amount": discount,
+        "tax_amount": tax,
+        "status": 'Draft'
+    }
     
-    for l in lines:
-        po_line = PurchaseOrderLine(
-            product_id=l['product_id'],
-            qty=l['qty'],
-            unit=l['unit'],
-            cost=l['cost'],
-            description=l['description'],
-            packing_structure=l['packing_structure'] # Added
-        )
-        po.lines.append(po_line)
-        
-    session.add(po)
-    session.commit()
-    print(f"Purchase Order {po_number} created successfully (ID: {po.id}).")
+    try:
+        po = services.create_po(session, supplier_id, header, lines)
+    except ValidationError as e:
+        print_validation_errors(e)
+        return
+    print(f"Purchase Order {po.po_number} created successfully (ID: {po.id}).")
 
 def list_orders(session: Session):
     print("\n--- List Purchase Orders ---")
@@ -923,89 +872,98 @@ def view_order_details(session: Session):
     grand_total = subtotal + po.shipping_cost + po.tax_amount - po.discount_amount
     print(f"TOTAL:      ${grand_total:.2f}")
     
+    print_documents(session, 'PurchaseOrder', po.id)
     print("\n")
-    action = safe_input("Press [Enter] to go back, 'p' for PDF, 'e' to Edit: ")
+    action = safe_input("Press [Enter] to go back, 'p' for PDF, 'e' to Edit, 'u' to Upload Document: ")
+    if action.lower() == 'u':
+        upload_document(session, 'PurchaseOrder', po.id)
     if action.lower() == 'p':
-        # Need company info
-        our_company = session.query(OurCompany).first()
-        filepath = generate_po_pdf(po, our_company)
-        print(f"PDF Generated: {filepath}")
-        safe_input("Press Enter to continue...")
+        job = render_queue.enqueue(session, 'po_pdf', po.id)
+        print(f"PDF queued (job {job.id}). You will be notified when it is ready.")
     elif action.lower() == 'e':
         edit_purchase_order(session, po)
 
 def edit_purchase_order(session: Session, po: PurchaseOrder):
     print(f"\n--- Edit PO {po.po_number} ---")
     print("Press [Enter] to keep current value.")
+    changes = {}
     
     # 1. Status
     print(f"Current Status: {po.status}")
     new_status = safe_input("New Status (Draft/Sent/Accepted/Received/Cancelled/Closed): ")
-    if new_status and new_status in ['Draft', 'Sent', 'Accepted', 'Received', 'Cancelled', 'Closed']:
-        po.status = new_status
+    if new_status and new_status in services.PO_STATUSES:
+        changes['status'] = new_status
         
     # 2. Date
     d_str = safe_input(f"Date [{po.date.strftime('%Y-%m-%d')}]: ")
     if d_str:
         try:
-             po.date = datetime.strptime(d_str, "%Y-%m-%d")
+             changes['date'] = datetime.strptime(d_str, "%Y-%m-%d")
         except ValueError: print("Invalid date, keeping original.")
         
     # 3. Logistics
-    po.payment_terms = safe_input(f"Terms [{po.payment_terms}]: ") or po.payment_terms
-    po.shipping_method = safe_input(f"Ship Via [{po.shipping_method}]: ") or po.shipping_method
+    changes['payment_terms'] = safe_input(f"Terms [{po.payment_terms}]: ") or po.payment_terms
+    changes['shipping_method'] = safe_input(f"Ship Via [{po.shipping_method}]: ") or po.shipping_method
     
     # Ship To Edit
     print(f"Current Ship To: {po.ship_to_address or 'Default'}")
     is_manual, val = select_address_source(session, "Ship To")
     if not is_manual and val is not None:
-        po.ship_to_address = val
+        changes['ship_to_address'] = val
     elif is_manual:
         new_val = safe_input("New Ship To (Enter to keep): ")
-        if new_val: po.ship_to_address = new_val
+        if new_val: changes['ship_to_address'] = new_val
 
-    po.incoterm = safe_input(f"Incoterm [{po.incoterm}]: ") or po.incoterm
-    po.port_of_destination = safe_input(f"Port [{po.port_of_destination}]: ") or po.port_of_destination
+    changes['incoterm'] = safe_input(f"Incoterm [{po.incoterm}]: ") or po.incoterm
+    changes['port_of_destination'] = safe_input(f"Port [{po.port_of_destination}]: ") or po.port_of_destination
     
     # 4. Parties
     # Consignee
     print(f"Current Consignee: {po.consignee}")
     is_manual, val = select_address_source(session, "Consignee")
     if not is_manual and val is not None:
-        po.consignee = val
+        changes['consignee'] = val
     elif is_manual:
         new_val = safe_input("New Consignee (Enter to keep): ")
-        if new_val: po.consignee = new_val
+        if new_val: changes['consignee'] = new_val
 
     # Notify
     print(f"Current Notify: {po.notify_party}")
     is_manual, val = select_address_source(session, "Notify Party")
     if not is_manual and val is not None:
-        po.notify_party = val
+        changes['notify_party'] = val
     elif is_manual:
         new_val = safe_input("New Notify (Enter to keep): ")
-        if new_val: po.notify_party = new_val
+        if new_val: changes['notify_party'] = new_val
         
-    po.tc_party = safe_input(f"TC Party [{po.tc_party}]: ") or po.tc_party
+    changes['tc_party'] = safe_input(f"TC Party [{po.tc_party}]: ") or po.tc_party
     
-    # 5. Financials
+    # 5. Financials (validated by the service layer)
     s_cost = safe_input(f"Shipping Cost [{po.shipping_cost}]: ")
-    if s_cost: po.shipping_cost = float(s_cost)
+    if s_cost: changes['shipping_cost'] = s_cost
     
     disc = safe_input(f"Discount [{po.discount_amount}]: ")
-    if disc: po.discount_amount = float(disc)
+    if disc: changes['discount_amount'] = disc
     
     tax = safe_input(f"Tax [{po.tax_amount}]: ")
-    if tax: po.tax_amount = float(tax)
+    if tax: changes['tax_amount'] = tax
     
-    po.notes = safe_input(f"Notes [{po.notes}]: ") or po.notes
+    changes['notes'] = safe_input(f"Notes [{po.notes}]: ") or po.notes
     
-    try:
-        session.commit()
-        print("PO Updated Successfully.")
-    except Exception as e:
-        session.rollback()
-        print(f"Error updating PO: {e}")
+    while changes is not None:
+        try:
+            services.update_po(session, po, changes)
+            print("PO Updated Successfully.")
+            break
+        except ConcurrencyConflict as e:
+            changes = resolve_conflict(e, changes)
+            if changes is None: print("Edit cancelled; PO reloaded with the other user's changes.")
+        except ValidationError as e:
+            print_validation_errors(e)
+            break
+        except Exception as e:
+            print(f"Error updating PO: {e}")
+            break
 
 def create_customer_order(session: Session):
      # Placeholder to match existing menu call not to break it? 
@@ -1051,11 +1009,10 @@ def create_customer_order(session: Session):
     print(f"Customer: {customer.customer_name}")
     
     while True:
-        inv_num = safe_input("Invoice Number (Optional, Unique): ")
-        if inv_num:
+        inv_num = safe_input("Invoice Number (Optional, Unique, 'auto' = next in sequence): ")
+        if inv_num and not services.is_auto_number(inv_num):
             # Check uniqueness
-            exists = session.query(CustomerOrder).filter_by(invoice_number=inv_num).first()
-            if exists:
+            if services.invoice_number_exists(session, inv_num):
                 print(f"Error: Invoice Number '{inv_num}' already exists.")
                 continue
         break
@@ -1074,8 +1031,8 @@ def create_customer_order(session: Session):
     notes = safe_input("Notes: ")
     
     # Addresses - Default to Customer's, allow override
-    cust_bill = f"{customer.bill_to_addr1}\n{customer.bill_to_addr2 or ''}\n{customer.bill_to_city}, {customer.bill_to_state} {customer.bill_to_zip}\n{customer.bill_to_country}"
-    cust_ship = f"{customer.ship_to_addr1}\n{customer.ship_to_addr2 or ''}\n{customer.ship_to_city}, {customer.ship_to_state} {customer.ship_to_zip}\n{customer.ship_to_country}"
+    cust_bill = addresses.formatted(customer, "bill_to_formatted")
+    cust_ship = addresses.formatted(customer, "ship_to_formatted")
     
     print("\n--- Bill To Address ---")
     print(f"Customer Default:\n{cust_bill}")
@@ -1176,40 +1133,27 @@ def create_customer_order(session: Session):
         print("Invalid number.")
         return
 
-    # Create Object
-    co = CustomerOrder(
-        customer_id=customer.id,
-        invoice_number=inv_num,
-        po_number=po_num,
-        date=co_date,
-        tracking_terms=tracking,
-        notes=notes,
-        bill_to_address=bill_to,
-        ship_to_address=ship_to,
-        shipping=shipping,
-        discount=discount,
-        amount_paid=paid,
-        credit=credit,
-        status='Pending'
-    )
-    
-    for l in co_lines:
-        line = CustomerOrderLine(
-            product_id=l['product_id'],
-            qty=l['qty'],
-            unit=l['unit'],
-            selling_price=l['selling_price'],
-            description=l['description'],
-            amount=l['amount']
-        )
-        co.lines.append(line)
+    header = {
+        "invoice_number": inv_num,
+        "po_number": po_num,
+        "date": co_date,
+        "tracking_terms": tracking,
+        "notes": notes,
+        "bill_to_address": bill_to,
+        "ship_to_address": ship_to,
+        "shipping": shipping,
+        "discount": discount,
+        "amount_paid": paid,
+        "credit": credit,
+        "status": 'Pending'
+    }
         
     try:
-        session.add(co)
-        session.commit()
-        print(f"Customer Order created successfully (ID: {co.id}).")
+        co = services.create_co(session, customer.id, header, co_lines)
+        print(f"Customer Order created successfully (ID: {co.id}, Invoice #: {co.invoice_number or 'N/A'}).")
+    except ValidationError as e:
+        print_validation_errors(e)
     except Exception as e:
-        session.rollback()
         print(f"Error saving order: {e}")
 
 def list_customer_orders(session: Session):
@@ -1302,48 +1246,50 @@ def view_customer_order(session: Session):
     if co.amount_paid: print(f"Paid:       -${co.amount_paid:.2f}")
     print(f"Balance Due: ${(total - co.amount_paid):.2f}")
     
+    print_documents(session, 'CustomerOrder', co.id)
     print("\n")
-    action = safe_input("Press [Enter] to go back, 'e' to Edit, 'i' to Generate Invoice: ")
+    action = safe_input("Press [Enter] to go back, 'e' to Edit, 'i' to Generate Invoice, 'u' to Upload Document: ")
+    if action.lower() == 'u':
+        upload_document(session, 'CustomerOrder', co.id)
     if action.lower() == 'e':
         edit_customer_order(session, co)
     elif action.lower() == 'i':
-        # Lazy import to avoid circular dependency issues if any
-        from excel_invoice_generator import generate_invoice
-        generate_invoice(session, co.id)
-        safe_input("Press Enter to continue...")
+        job = render_queue.enqueue(session, 'invoice_excel', co.id)
+        print(f"Invoice queued (job {job.id}). You will be notified when it is ready.")
 
 def edit_customer_order(session: Session, co: CustomerOrder):
     print(f"\n--- Edit Customer Order {co.id} ---")
     print("Press [Enter] to keep current value.")
+    changes = {}
     
     inv_num = safe_input(f"Invoice Number [{co.invoice_number}]: ")
-    if inv_num: co.invoice_number = inv_num
+    if inv_num: changes['invoice_number'] = inv_num
     
     po_num = safe_input(f"PO Number [{co.po_number}]: ")
-    if po_num: co.po_number = po_num
+    if po_num: changes['po_number'] = po_num
     
     d_str = safe_input(f"Date [{co.date.strftime('%Y-%m-%d')}]: ")
     if d_str:
         try:
-            co.date = datetime.strptime(d_str, "%Y-%m-%d")
+            changes['date'] = datetime.strptime(d_str, "%Y-%m-%d")
         except: pass
         
-    co.tracking_terms = safe_input(f"Tracking [{co.tracking_terms}]: ") or co.tracking_terms
+    changes['tracking_terms'] = safe_input(f"Tracking [{co.tracking_terms}]: ") or co.tracking_terms
     
-    # Financials
+    # Financials (validated by the service layer)
     ship = safe_input(f"Shipping [{co.shipping}]: ")
-    if ship: co.shipping = float(ship)
+    if ship: changes['shipping'] = ship
     
     disc = safe_input(f"Discount [{co.discount}]: ")
-    if disc: co.discount = float(disc)
+    if disc: changes['discount'] = disc
     
     paid = safe_input(f"Paid [{co.amount_paid}]: ")
-    if paid: co.amount_paid = float(paid)
+    if paid: changes['amount_paid'] = paid
     
     cred = safe_input(f"Credit [{co.credit}]: ")
-    if cred: co.credit = float(cred)
+    if cred: changes['credit'] = cred
     
-    co.notes = safe_input(f"Notes [{co.notes}]: ") or co.notes
+    changes['notes'] = safe_input(f"Notes [{co.notes}]: ") or co.notes
     
     # Address Editing? Maybe too complex for single field.
     change_addr = safe_input("Edit Addresses? (y/n) [n]: ")
@@ -1356,7 +1302,7 @@ def edit_customer_order(session: Session, co: CustomerOrder):
             l = safe_input("")
             if not l: break
             lines.append(l)
-        if lines: co.bill_to_address = "\n".join(lines)
+        if lines: changes['bill_to_address'] = "\n".join(lines)
         
         print("--- Ship To ---")
         print(f"Current:\n{co.ship_to_address}\n")
@@ -1366,15 +1312,225 @@ def edit_customer_order(session: Session, co: CustomerOrder):
              l = safe_input("")
              if not l: break
              lines.append(l)
-        if lines: co.ship_to_address = "\n".join(lines)
+        if lines: changes['ship_to_address'] = "\n".join(lines)
+
+    while changes is not None:
+        try:
+            services.update_co(session, co, changes)
+            print("Order Updated.")
+            break
+        except ConcurrencyConflict as e:
+            changes = resolve_conflict(e, changes)
+            if changes is None: print("Edit cancelled; order reloaded with the other user's changes.")
+        except ValidationError as e:
+            print_validation_errors(e)
+            break
+        except Exception as e:
+            print(f"Error: {e}")
+            break
 
+def bulk_import_orders(session: Session):
+    print("\n--- Bulk Import Orders (CSV/Excel) ---")
+    from bulk_order_import import import_orders, write_report
+    
+    path = safe_input("File path: ").strip().strip('"')
+    if not path: return
+    if not os.path.exists(path):
+        print("File not found.")
+        return
+    
+    order_type = safe_input("Order type - [P]urchase or [C]ustomer [P]: ").strip().lower()
+    order_type = "co" if order_type == 'c' else "po"
+    
+    report_path = os.path.splitext(path)[0] + "_import_report.csv"
     try:
-        session.commit()
-        print("Order Updated.")
-    except Exception as e:
-        session.rollback()
-        print(f"Error: {e}")
+        with render_profiler.profile(f"import_{order_type}") as prof:
+            prof.document = report_path
+            report = import_orders(session, path, order_type)
+    except ValidationError as e:
+        print_validation_errors(e)
+        return
+    
+    created = len({r['order'] for r in report if r['status'] == 'created'})
+    errors = [r for r in report if r['status'] == 'error']
+    print(f"Orders created: {created}")
+    if errors:
+        print_table([[r['row'], r['order'], r['message']] for r in errors[:50]], ["Row", "Order", "Error"])
+        if len(errors) > 50:
+            print(f"... {len(errors) - 50} more errors.")
+    write_report(report, report_path)
+    print(f"Full report: {report_path}")
+
+def convert_co_to_invoice(session: Session):
+    print("\n--- Convert CO to Invoice ---")
+    pending = (session.query(CustomerOrder)
+               .options(selectinload(CustomerOrder.lines), selectinload(CustomerOrder.customer))
+               .filter(CustomerOrder.status == 'Pending')
+               .order_by(CustomerOrder.id).all())
+    if not pending:
+        print("No pending customer orders.")
+        return
+    
+    data = [[co.id, co.date.strftime("%Y-%m-%d"), co.customer.customer_name, co.invoice_number or "(auto)",
+             f"${services.invoicing.order_total(co):.2f}"] for co in pending]
+    print_table(data, ["ID", "Date", "Customer", "Inv #", "Total"])
+    
+    choice = safe_input("CO ID to convert, or 'all' for every pending order: ").strip().lower()
+    if not choice: return
+    if choice == 'all':
+        co_ids = [co.id for co in pending]
+    elif choice.isdigit():
+        co_ids = [int(choice)]
+    else:
+        print("Invalid selection.")
+        return
+    
+    inv_type = safe_input("Invoice type - [C]ommercial or [P]roforma [C]: ").strip().lower()
+    inv_type = 'Proforma' if inv_type == 'p' else 'Commercial'
+    
+    with render_profiler.profile("convert_invoices"):
+        invoice_ids, errors = services.invoicing.convert_orders(session, co_ids, inv_type)
+    print(f"Invoices created: {len(invoice_ids)}")
+    if errors:
+        print_validation_errors(ValidationError(errors))
+    
+    if invoice_ids and safe_input("Queue PDFs now? (y/n) [y]: ").strip().lower() != 'n':
+        render_queue.enqueue_many(session, 'invoice_pdf', invoice_ids)
+        print(f"{len(invoice_ids)} PDF(s) queued. You will be notified as they finish.")
+
+def generate_pdf_wrapper(session: Session):
+    print("\n--- Generate PDF for Invoice ---")
+    invoices = (session.query(Invoice)
+                .options(selectinload(Invoice.order).selectinload(CustomerOrder.customer))
+                .order_by(Invoice.id).all())
+    if not invoices:
+        print("No invoices found. Convert a customer order first.")
+        return
+    
+    data = [[inv.id, inv.date.strftime("%Y-%m-%d"), inv.type,
+             inv.order.invoice_number if inv.order else "N/A",
+             inv.order.customer.customer_name if inv.order else ""] for inv in invoices]
+    print_table(data, ["ID", "Date", "Type", "Inv #", "Customer"])
+    
+    choice = safe_input("Invoice ID: ").strip()
+    if not choice.isdigit(): return
+    if not session.get(Invoice, int(choice)):
+        print("Invoice not found.")
+        return
+    job = render_queue.enqueue(session, 'invoice_pdf', int(choice))
+    print(f"PDF queued (job {job.id}). You will be notified when it is ready.")
 
+def show_render_notifications(session: Session):
+    for job in render_queue.pop_notifications(session):
+        if job.status == 'Done':
+            print(f"[Render job {job.id}] {job.kind} #{job.target_id} ready: {job.result_path}")
+        else:
+            print(f"[Render job {job.id}] {job.kind} #{job.target_id} FAILED after {job.attempts} attempt(s): "
+                  f"{(job.message or '').splitlines()[0] if job.message else ''}")
+
+def render_jobs_menu(session: Session):
+    print("\n--- Render Jobs ---")
+    jobs = render_queue.recent_jobs(session)
+    if not jobs:
+        print("No render jobs.")
+        return
+    render_queue.print_jobs(jobs)
+    choice = safe_input("Job ID to retry (failed jobs only), or Enter to go back: ").strip()
+    if choice.isdigit():
+        print("Re-queued." if render_queue.retry(session, int(choice)) else "Job not found or not failed.")
+
+def import_supplier_pdfs(session: Session):
+    print("\n--- Draft POs from Supplier PDFs ---")
+    from supplier_pdf_import import import_pdfs
+    
+    path = safe_input("PDF file or folder: ").strip().strip('"')
+    if not path: return
+    if os.path.isdir(path):
+        paths = sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(".pdf"))
+    elif os.path.isfile(path):
+        paths = [path]
+    else:
+        print("File not found.")
+        return
+    if not paths:
+        print("No PDF files found.")
+        return
+    
+    supplier_id = None
+    name = safe_input("Supplier (Enter = detect from PDF): ").strip()
+    if name:
+        s = session.query(Supplier).filter(Supplier.name.ilike(f"%{name}%")).first()
+        if not s:
+            print("Supplier not found.")
+            return
+        supplier_id = s.id
+    
+    with render_profiler.profile("supplier_pdf_import"):
+        report = import_pdfs(session, paths, supplier_id)
+    print_table([[os.path.basename(r['file']), r['po_number'], r['status'], r['message']] for r in report],
+                ["File", "PO #", "Status", "Message"])
+    created = sum(1 for r in report if r['status'] == 'created')
+    print(f"Draft POs created: {created}. Review them under 'View Purchase Order Details'.")
+
+# --- Documents ---
+
+DOCUMENT_REFERENCE_MODELS = {
+    'PurchaseOrder': PurchaseOrder,
+    'CustomerOrder': CustomerOrder,
+    'Invoice': Invoice,
+    'Supplier': Supplier,
+    'Customer': Customer,
+    'Product': Product,
+}
+
+def print_documents(session: Session, reference_type, reference_id):
+    docs = document_store.documents_for(session, reference_type, reference_id)
+    if not docs:
+        return
+    print("\nDocuments:")
+    data = [[d.id, d.created_at.strftime("%Y-%m-%d %H:%M") if d.created_at else "", d.original_name or os.path.basename(d.file_path),
+             d.mime_type or "", document_store.format_size(d.size_bytes), d.description or ""] for d in docs]
+    print_table(data, ["ID", "Added", "File", "Type", "Size", "Description"])
+
+def upload_document(session: Session, reference_type=None, reference_id=None):
+    print("\n--- Upload Document ---")
+    if reference_type is None:
+        types = document_store.REFERENCE_TYPES
+        for i, t in enumerate(types, 1):
+            print(f"{i}. {t}")
+        choice = safe_input("Attach to: ").strip()
+        if not choice.isdigit() or not 1 <= int(choice) <= len(types):
+            print("Invalid selection.")
+            return
+        reference_type = types[int(choice) - 1]
+        
+        ref = safe_input(f"{reference_type} ID: ").strip()
+        if not ref.isdigit() or not session.get(DOCUMENT_REFERENCE_MODELS[reference_type], int(ref)):
+            print(f"{reference_type} not found.")
+            return
+        reference_id = int(ref)
+    
+    path = safe_input("File path: ").strip().strip('"')
+    if not path: return
+    if not os.path.isfile(path):
+        print("File not found.")
+        return
+    description = safe_input("Description (Optional): ").strip() or None
+    
+    doc = document_store.register_document(session, reference_type, reference_id, path, description)
+    print(f"Document saved (ID: {doc.id}, {document_store.format_size(doc.size_bytes)}, {doc.mime_type}).")
+    print_documents(session, reference_type, reference_id)
+
+def search_documents(session: Session):
+    print("\n--- Search Documents ---")
+    query = safe_input("Search for (e.g. lot number, PO #, product): ").strip()
+    if not query: return
+    
+    results = document_search.search(session, query)
+    if not results:
+        print("No matches.")
+        return
+    document_search.print_results(results)
 
 # --- Menus ---
 
@@ -1383,7 +1539,7 @@ def main_menu():
     print("1. Manage Data (Products, Customers, Suppliers)")
     print("2. Order Management (PO, CO)")
     print("3. Invoicing (Convert, Print PDF)")
-    print("4. Documents (Upload)")
+    print("4. Documents (Upload, Search)")
     print("5. Exit")
     return safe_input("Select Option: ")
 
@@ -1398,11 +1554,11 @@ def data_menu(session: Session):
         
         choice = safe_input("Select: ")
         if choice == '1':
-            if product_menu(session) == "main": return "main"
+            if open_menu(product_menu, session) == "main": return "main"
         elif choice == '2':
-            if customer_menu(session) == "main": return "main"
+            if open_menu(customer_menu, session) == "main": return "main"
         elif choice == '3':
-            if supplier_menu(session) == "main": return "main"
+            if open_menu(supplier_menu, session) == "main": return "main"
         elif choice == '9': return "main"
         elif choice == '0': break
 
@@ -1412,13 +1568,15 @@ def product_menu(session: Session):
         print("1. Add Product")
         print("2. List Products")
         print("3. View Product Details")
+        print("4. Expiring Stock")
         print("9. Main Menu")
         print("0. Back")
         
         choice = safe_input("Select: ")
-        if choice == '1': add_product(session)
-        elif choice == '2': list_products(session)
-        elif choice == '3': view_product_details(session)
+        if choice == '1': open_screen(add_product, session)
+        elif choice == '2': open_screen(list_products, session)
+        elif choice == '3': open_screen(view_product_details, session)
+        elif choice == '4': open_screen(list_expiring_lots, session)
         elif choice == '9': return "main"
         elif choice == '0': break
 
@@ -1432,9 +1590,9 @@ def customer_menu(session: Session):
         print("0. Back")
         
         choice = safe_input("Select: ")
-        if choice == '1': add_customer(session)
-        elif choice == '2': list_customers(session)
-        elif choice == '3': view_customer_details(session)
+        if choice == '1': open_screen(add_customer, session)
+        elif choice == '2': open_screen(list_customers, session)
+        elif choice == '3': open_screen(view_customer_details, session)
         elif choice == '9': return "main"
         elif choice == '0': break
 
@@ -1448,9 +1606,9 @@ def supplier_menu(session: Session):
         print("0. Back")
         
         choice = safe_input("Select: ")
-        if choice == '1': add_supplier(session)
-        elif choice == '2': list_suppliers(session)
-        elif choice == '3': view_supplier_details(session)
+        if choice == '1': open_screen(add_supplier, session)
+        elif choice == '2': open_screen(list_suppliers, session)
+        elif choice == '3': open_screen(view_supplier_details, session)
         elif choice == '9': return "main"
         elif choice == '0': break
 
@@ -1463,16 +1621,34 @@ def order_menu(session: Session):
         print("4. List Customer Orders")
         print("5. View Purchase Order Details")
         print("6. View Customer Order Details")
+        print("7. Bulk Import Orders (CSV/Excel)")
+        print("8. Draft POs from Supplier PDFs")
         print("9. Main Menu")
         print("0. Back")
         
         choice = safe_input("Select: ")
-        if choice == '1': create_purchase_order(session)
-        elif choice == '2': create_customer_order(session)
-        elif choice == '3': list_orders(session)
-        elif choice == '4': list_customer_orders(session)
-        elif choice == '5': view_order_details(session)
-        elif choice == '6': view_customer_order(session)
+        if choice == '1': open_screen(create_purchase_order, session)
+        elif choice == '2': open_screen(create_customer_order, session)
+        elif choice == '3': open_screen(list_orders, session)
+        elif choice == '4': open_screen(list_customer_orders, session)
+        elif choice == '5': open_screen(view_order_details, session)
+        elif choice == '6': open_screen(view_customer_order, session)
+        elif choice == '7': open_screen(bulk_import_orders, session)
+        elif choice == '8': open_screen(import_supplier_pdfs, session)
+        elif choice == '9': return "main"
+        elif choice == '0': break
+
+def documents_menu(session: Session):
+    while True:
+        print("\n--- Documents ---")
+        print("1. Upload Document")
+        print("2. Search Documents")
+        print("9. Main Menu")
+        print("0. Back")
+        
+        choice = safe_input("Select: ")
+        if choice == '1': open_screen(upload_document, session)
+        elif choice == '2': open_screen(search_documents, session)
         elif choice == '9': return "main"
         elif choice == '0': break
 
@@ -1481,12 +1657,14 @@ def invoice_menu(session: Session):
         print("\n--- Invoicing ---")
         print("1. Convert CO to Invoice")
         print("2. Generate PDF for Invoice")
+        print("3. Render Jobs (status / retry)")
         print("9. Main Menu")
         print("0. Back")
         
         choice = safe_input("Select: ")
-        if choice == '1': convert_co_to_invoice(session)
-        elif choice == '2': generate_pdf_wrapper(session)
+        if choice == '1': open_screen(convert_co_to_invoice, session)
+        elif choice == '2': open_screen(generate_pdf_wrapper, session)
+        elif choice == '3': open_screen(render_jobs_menu, session)
         elif choice == '9': return "main"
         elif choice == '0': break
 
@@ -1503,21 +1681,35 @@ def run():
         print("Please check your database configuration in models.py")
         return
 
+    if telemetry.enable():
+        telemetry.instrument(engine)
+
+    # PDF/Excel rendering runs in background processes so the menus never wait on it
+    workers = render_queue.WorkerPool(engine.url.render_as_string(hide_password=False)).start()
+
     while True:
+        show_render_notifications(session)
         choice = main_menu()
         if choice == '1':
-            data_menu(session)
+            open_menu(data_menu, session)
         elif choice == '2':
-            order_menu(session)
+            open_menu(order_menu, session)
         elif choice == '3':
-            invoice_menu(session)
+            open_menu(invoice_menu, session)
         elif choice == '4':
-            upload_document(session)
+            open_menu(documents_menu, session)
         elif choice == '5':
             print("Exiting...")
+            workers.stop()
             break
         else:
             print("Invalid option.")
 
 if __name__ == "__main__":
+    if "--profile" in sys.argv[1:]:
+        sql_profiler.enable(summary=True)
+    for arg in sys.argv[1:]:
+        # --profile-render[=cprofile]; exported via the environment so render workers inherit it
+        if arg.startswith("--profile-render"):
+            render_profiler.enable(arg.partition("=")[2] or "sample")
     run()
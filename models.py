@@ -1,8 +1,14 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, DateTime, Enum, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Enum, Boolean, Text, UniqueConstraint, Index
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 from datetime import datetime
 import os
 
+import addresses
+import audit
+import change_log
+import db_config
+import sql_profiler
+
 Base = declarative_base()
 
 # --- Contact Models ---
@@ -29,6 +35,9 @@ class Supplier(Base):
     bill_to_zip = Column(String(20), nullable=True)
     bill_to_country = Column(String(100), nullable=True)
     # contact_info removed as requested
+    # Precomputed address blocks (see addresses.py)
+    address_formatted = Column(Text, nullable=True)
+    bill_to_formatted = Column(Text, nullable=True)
     
     def __repr__(self):
         return f"<Supplier(id={self.id}, name='{self.name}')>"
@@ -49,6 +58,7 @@ class OurCompany(Base):
     IRS_Emp_ID = Column(String(50), nullable=True)
     CA_Sec_ID = Column(String(50), nullable=True)
     BOE_sales_lic_num = Column(String(50), nullable=True)
+    address_formatted = Column(Text, nullable=True) # see addresses.py
 
     def __repr__(self):
         return f"<OurCompany(name='{self.company_name}')>"
@@ -76,10 +86,28 @@ class Customer(Base):
     bill_to_country = Column(String, nullable=True)
     billing_email = Column(String, nullable=True)
     billing_email_name = Column(String, nullable=True)
+    # Precomputed address blocks (see addresses.py)
+    ship_to_formatted = Column(Text, nullable=True)
+    bill_to_formatted = Column(Text, nullable=True)
 
     def __repr__(self):
         return f"<Customer(id={self.id}, name='{self.customer_name}')>"
 
+addresses.keep_formatted(
+    Supplier,
+    address_formatted=('address1', 'address2', 'city', 'state', 'zip_code', 'country'),
+    bill_to_formatted=('bill_to_addr1', 'bill_to_addr2', 'bill_to_city', 'bill_to_state', 'bill_to_zip', 'bill_to_country'),
+)
+addresses.keep_formatted(
+    OurCompany,
+    address_formatted=('address1', 'address2', 'city', 'state', 'zip_code', 'country'),
+)
+addresses.keep_formatted(
+    Customer,
+    ship_to_formatted=('ship_to_addr1', 'ship_to_addr2', 'ship_to_city', 'ship_to_state', 'ship_to_zip', 'ship_to_country'),
+    bill_to_formatted=('bill_to_addr1', 'bill_to_addr2', 'bill_to_city', 'bill_to_state', 'bill_to_zip', 'bill_to_country'),
+)
+
 # --- Product Model ---
 class Product(Base):
     __tablename__ = 'products'
@@ -95,9 +123,14 @@ class Product(Base):
     is_active = Column(Boolean, default=True)
     supplier_id = Column(Integer, ForeignKey('suppliers.id'), nullable=True)
 
+    # Optimistic concurrency: UPDATEs check and bump this, so stale edits raise StaleDataError
+    version_id = Column(Integer, nullable=False, default=1)
+
     supplier = relationship("Supplier")
     lots = relationship("ProductLot", back_populates="product", cascade="all, delete-orphan")
 
+    __mapper_args__ = {"version_id_col": version_id}
+
     def __repr__(self):
         return f"<Product(sku='{self.sku}', name='{self.name}')>"
 
@@ -112,12 +145,39 @@ class ProductLot(Base):
     quantity = Column(Integer, default=0)
     cost_price = Column(Float, default=0.0)
     created_at = Column(DateTime, default=datetime.utcnow)
+    warehouse = Column(String(50), nullable=True) # e.g. 'Irvine', 'Bonded-LA'; NULL = main store
+    version_id = Column(Integer, nullable=False, default=1)
 
     product = relationship("Product", back_populates="lots")
 
+    __mapper_args__ = {"version_id_col": version_id}
+    # Partial covering index for expiry scans (see expiry_monitor.py): only lots with stock
+    __table_args__ = (
+        Index('ix_product_lots_expiry', 'expiration_date', 'product_id', 'warehouse', 'quantity', 'cost_price',
+              sqlite_where=quantity > 0, postgresql_where=quantity > 0),
+    )
+
     def __repr__(self):
         return f"<ProductLot(lot='{self.lot_number}', qty={self.quantity})>"
 
+class ExpiryAlert(Base):
+    __tablename__ = 'expiry_alerts'
+    id = Column(Integer, primary_key=True)
+    lot_id = Column(Integer, ForeignKey('product_lots.id', ondelete='CASCADE'), nullable=False)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    warehouse = Column(String(50), nullable=True)
+    severity = Column(Enum('expired', 'critical', 'warning', name='expiry_severity'), nullable=False)
+    expiration_date = Column(DateTime, nullable=False)
+    quantity = Column(Integer, nullable=False) # stock when the alert was raised
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    acknowledged_at = Column(DateTime, nullable=True)
+
+    # One alert per lot and severity, so scheduled runs only add escalations
+    __table_args__ = (
+        UniqueConstraint('lot_id', 'severity', name='uq_expiry_alert_lot_severity'),
+        Index('ix_expiry_alerts_open', 'acknowledged_at', 'severity'),
+    )
+
 # --- Order Models ---
 class PurchaseOrder(Base):
     __tablename__ = 'purchase_orders'
@@ -156,10 +216,13 @@ class PurchaseOrder(Base):
     tc_party = Column(Text, nullable=True) # Transaction/Transfer Party?
     
     notes = Column(Text, nullable=True)
+    version_id = Column(Integer, nullable=False, default=1)
 
     supplier = relationship("Supplier")
     lines = relationship("PurchaseOrderLine", back_populates="order", cascade="all, delete-orphan")
 
+    __mapper_args__ = {"version_id_col": version_id}
+
 class PurchaseOrderLine(Base):
     __tablename__ = 'purchase_order_lines'
     id = Column(Integer, primary_key=True)
@@ -205,10 +268,13 @@ class CustomerOrder(Base):
     ship_to_address = Column(Text, nullable=True)
     
     notes = Column(Text, nullable=True)
+    version_id = Column(Integer, nullable=False, default=1)
     
     customer = relationship("Customer")
     lines = relationship("CustomerOrderLine", back_populates="order", cascade="all, delete-orphan")
 
+    __mapper_args__ = {"version_id_col": version_id}
+
 class CustomerOrderLine(Base):
     __tablename__ = 'customer_order_lines'
     id = Column(Integer, primary_key=True)
@@ -225,6 +291,49 @@ class CustomerOrderLine(Base):
     order = relationship("CustomerOrder", back_populates="lines")
     product = relationship("Product")
 
+# --- Lot Traceability (see traceability.py) ---
+# Edges of the lot graph. Order header, supplier and customer ids are copied
+# onto the edge so a trace still names them after the lines are archived.
+class LotReceipt(Base):
+    __tablename__ = 'lot_receipts'
+    id = Column(Integer, primary_key=True)
+    lot_id = Column(Integer, ForeignKey('product_lots.id'), nullable=False)
+    po_line_id = Column(Integer, ForeignKey('purchase_order_lines.id'), nullable=False)
+    po_id = Column(Integer, ForeignKey('purchase_orders.id'), nullable=False)
+    supplier_id = Column(Integer, ForeignKey('suppliers.id'), nullable=True)
+    quantity = Column(Integer, nullable=False)
+    received_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_lot_receipts_po', 'po_id', 'po_line_id', 'lot_id'),
+        Index('ix_lot_receipts_lot', 'lot_id', 'po_line_id'),
+    )
+
+class LotShipment(Base):
+    __tablename__ = 'lot_shipments'
+    id = Column(Integer, primary_key=True)
+    lot_id = Column(Integer, ForeignKey('product_lots.id'), nullable=False)
+    co_line_id = Column(Integer, ForeignKey('customer_order_lines.id'), nullable=False)
+    co_id = Column(Integer, ForeignKey('customer_orders.id'), nullable=False)
+    customer_id = Column(Integer, ForeignKey('customers.id'), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    shipped_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_lot_shipments_lot', 'lot_id', 'co_line_id'),
+        Index('ix_lot_shipments_co', 'co_id', 'co_line_id', 'lot_id'),
+    )
+
+# Lot genealogy: `quantity` of the parent lot went into the child (repack, blend)
+class LotSource(Base):
+    __tablename__ = 'lot_sources'
+    parent_lot_id = Column(Integer, ForeignKey('product_lots.id'), primary_key=True)
+    child_lot_id = Column(Integer, ForeignKey('product_lots.id'), primary_key=True)
+    quantity = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (Index('ix_lot_sources_child', 'child_lot_id', 'parent_lot_id'),)
+
 # --- Invoice Models ---
 class Invoice(Base):
     __tablename__ = 'invoices'
@@ -255,13 +364,100 @@ class Document(Base):
     reference_type = Column(String(50), nullable=False) # 'CustomerOrder', 'Invoice', etc.
     file_path = Column(String(500), nullable=False)
     description = Column(String(255))
+    
+    # File metadata (see document_store.py)
+    original_name = Column(String(255), nullable=True)
+    size_bytes = Column(Integer, nullable=True)
+    sha256 = Column(String(64), nullable=True, index=True)
+    mime_type = Column(String(100), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (Index('ix_documents_reference', 'reference_type', 'reference_id'),)
+
+# --- Document Numbering ---
+class DocumentSequence(Base):
+    __tablename__ = 'document_sequences'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), unique=True, nullable=False) # 'purchase_order', 'invoice'
+    format = Column(String(100), nullable=False) # e.g. PO-{YYYY}-{seq:04}
+
+class DocumentSequenceCounter(Base):
+    __tablename__ = 'document_sequence_counters'
+    id = Column(Integer, primary_key=True)
+    sequence_name = Column(String(50), nullable=False)
+    period = Column(String(20), nullable=False, default='') # '2025' for yearly formats, '' if never reset
+    next_value = Column(Integer, nullable=False, default=1)
+
+    __table_args__ = (UniqueConstraint('sequence_name', 'period', name='uq_sequence_period'),)
+
+# --- Background Render Jobs ---
+class RenderJob(Base):
+    __tablename__ = 'render_jobs'
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False) # 'po_pdf', 'invoice_excel', 'invoice_pdf'
+    target_id = Column(Integer, nullable=False) # PO, CustomerOrder or Invoice ID depending on kind
+    status = Column(Enum('Queued', 'Running', 'Done', 'Failed', name='render_job_status'), nullable=False, default='Queued')
+    progress = Column(Integer, nullable=False, default=0) # 0-100
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime, default=datetime.utcnow) # retry backoff
+    worker = Column(String(100), nullable=True)
+    result_path = Column(String(500), nullable=True)
+    message = Column(Text, nullable=True) # last error
+    notified = Column(Boolean, nullable=False, default=False) # completion shown to the operator
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index('ix_render_jobs_status_run_after', 'status', 'run_after'),)
+
+# --- Change Data Capture (see change_log.py) ---
+class ChangeLog(Base):
+    __tablename__ = 'change_log'
+    seq = Column(Integer, primary_key=True)
+    table_name = Column(String(50), nullable=False)
+    row_id = Column(Integer, nullable=True)
+    operation = Column(Enum('insert', 'update', 'delete', name='change_operation'), nullable=False)
+    data = Column(Text, nullable=False) # JSON column values
+    changed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    # AUTOINCREMENT so sequence numbers are never reused after old entries are pruned
+    __table_args__ = {'sqlite_autoincrement': True}
+
+class ChangeConsumer(Base):
+    __tablename__ = 'change_consumers'
+    name = Column(String(100), primary_key=True) # e.g. 'accounting', 'search_index'
+    last_seq = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+change_log.track(ChangeLog.__table__, ChangeConsumer.__table__)
+
+# --- Audit Trail (see audit.py) ---
+class AuditEntry(Base):
+    __tablename__ = 'audit_entries'
+    id = Column(Integer, primary_key=True)
+    entity_type = Column(String(50), nullable=False) # 'customer', 'supplier', 'purchase_order', 'customer_order'
+    entity_id = Column(Integer, nullable=False) # order id for order lines too
+    table_name = Column(String(50), nullable=False)
+    row_id = Column(Integer, nullable=False)
+    action = Column(Enum('insert', 'update', 'delete', name='audit_action'), nullable=False)
+    changes = Column(Text, nullable=False) # JSON {column: [old, new]}
+    changed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    changed_by = Column(String(100), nullable=True)
+
+    __table_args__ = (Index('ix_audit_entity_time', 'entity_type', 'entity_id', 'changed_at'),)
+
+audit.track(AuditEntry.__table__)
 
 # --- Database Initialization ---
-# Default connection string (User should change this if needed)
-DATABASE_URL = "sqlite:///./app.db"  # file in current folder
+# Set ERP_DATABASE_URL to use MySQL/PostgreSQL instead of ./app.db (see db_config.py)
+DATABASE_URL = db_config.database_url()
 
 def get_engine(db_url=DATABASE_URL):
-    return create_engine(db_url, echo=False)
+    engine = db_config.create_engine_from_config(db_url)
+    # Statement timing / N+1 detection when started with --profile or ERP_SQL_PROFILE=1
+    return sql_profiler.instrument(engine)
 
 def init_db(engine):
     Base.metadata.create_all(engine)
@@ -1,15 +1,19 @@
 # database.py
-from sqlalchemy import create_engine
+import os
+import sys
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///./app.db"  # file in current folder
+# The engine comes from the ERP's shared factory (../db_config.py) so this
+# prototype follows ERP_DATABASE_URL and the same pool/pragma settings instead
+# of building a second, differently configured engine.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_config import create_engine_from_config, database_url  # noqa: E402
+
+DATABASE_URL = database_url()
 # For a full path: sqlite:////absolute/path/to/app.db
 
-# For SQLite, you usually want check_same_thread=False in desktop apps
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
+# check_same_thread=False is set by the factory for file-based SQLite
+engine = create_engine_from_config(DATABASE_URL)
 
 # SessionLocal = sessionmaker(
 #     autocommit=False,
@@ -2,12 +2,16 @@ from fpdf import FPDF
 import os
 from datetime import datetime
 
+import addresses
+
 class PurchaseOrderPDF(FPDF):
     def __init__(self, po, our_company):
         super().__init__()
         self.po = po
         self.our_company = our_company
         self.logo_path = os.path.join("assets", "media", "mana-organics-IVTF Ver 3.png")
+        # Address blocks come precomputed from the row (see addresses.py); header() runs on every page
+        self.company_address = addresses.formatted(our_company, "address_formatted") if our_company else ""
 
     def header(self):
         # Logo (Top Left)
@@ -24,15 +28,11 @@ class PurchaseOrderPDF(FPDF):
         
         self.set_font('Arial', '', 9)
         if self.our_company:
-            addr = f"{self.our_company.address1 or ''} {self.our_company.address2 or ''}"
-            csz = f"{self.our_company.city or ''}, {self.our_company.state or ''} {self.our_company.zip_code or ''}"
-            country = self.our_company.country or ""
             phone = f"Phone: {self.our_company.phone}" if self.our_company.phone else ""
             email = f"Email: {self.our_company.email}" if self.our_company.email else ""
             
-            self.cell(100, 4, addr.strip(), ln=True)
-            self.cell(100, 4, csz.strip(), ln=True)
-            if country: self.cell(100, 4, country, ln=True)
+            for line in self.company_address.splitlines():
+                self.cell(100, 4, line, ln=True)
             if phone: self.cell(100, 4, phone, ln=True)
             if email: self.cell(100, 4, email, ln=True)
         else:
@@ -91,7 +91,8 @@ class PurchaseOrderPDF(FPDF):
         v_y = self.get_y()
         self.set_xy(10, v_y)
         supplier = po.supplier
-        self.multi_cell(90, 5, f"{supplier.name}\n{supplier.contact_name or ''}\n{supplier.address1 or ''}\n{supplier.city or ''} {supplier.state or ''}\n{supplier.country or ''}\n{supplier.phone or ''}")
+        vendor = [supplier.name, supplier.contact_name, addresses.formatted(supplier, "address_formatted"), supplier.phone]
+        self.multi_cell(90, 5, "\n".join(p for p in vendor if p))
         v_end_y = self.get_y()
         
         # Ship To Block
@@ -101,7 +102,7 @@ class PurchaseOrderPDF(FPDF):
         else:
             # Default to Our Company
              if self.our_company:
-                 self.multi_cell(90, 5, f"{self.our_company.company_name}\n{self.our_company.address1 or ''}\n{self.our_company.city or ''} {self.our_company.state or ''}\n{self.our_company.country or ''}")
+                 self.multi_cell(90, 5, addresses.with_name(self.our_company.company_name, self.company_address))
              else:
                  self.multi_cell(90, 5, "Same as User Company")
         s_end_y = self.get_y()
@@ -0,0 +1,196 @@
+"""
+Profiling mode for document rendering and batch operations.
+
+Set ERP_PROFILE_RENDER, or pass --profile-render to main.py, render_queue.py
+worker, bulk_order_import.py or supplier_pdf_import.py. Every render job and
+batch import/conversion then runs under a profiler. Its output is written
+next to the generated document, or under logs/profiles/ when the operation
+has no single output file:
+
+    sample   (default) a sampling profiler thread that reads the rendering
+             thread's stack every ERP_PROFILE_INTERVAL ms (default 1). It writes
+             <doc>.collapsed.txt (flamegraph.pl / speedscope "collapsed stacks")
+             and <doc>.speedscope.json (open at https://www.speedscope.app).
+             The overhead is low enough for production-sized data.
+    cprofile deterministic cProfile. It writes <doc>.prof (pstats, for
+             snakeviz / flameprof) and <doc>.prof.txt with the top functions by
+             cumulative time.
+
+Nothing is collected unless the variable is set; profile() then yields a
+placeholder. Nested profile() blocks are folded into the outermost one.
+
+Example:
+    ERP_PROFILE_RENDER=sample python render_queue.py worker --workers 1
+    python bulk_order_import.py orders.xlsx --type co --profile-render cprofile
+"""
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+ENV_FLAG = "ERP_PROFILE_RENDER"
+ENV_INTERVAL = "ERP_PROFILE_INTERVAL"
+MODES = ("sample", "cprofile")
+PROFILE_DIR = os.path.join("logs", "profiles")
+DEFAULT_INTERVAL_MS = 1.0
+
+_active = threading.local()
+
+
+def enable(mode="sample"):
+    """Turns profiling on for this process and the worker processes it starts."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown profiling mode '{mode}'. Valid options: {', '.join(MODES)}")
+    os.environ[ENV_FLAG] = mode
+
+
+def current_mode():
+    value = os.environ.get(ENV_FLAG, "").strip().lower()
+    if not value or value in ("0", "off", "false"):
+        return None
+    return value if value in MODES else "sample"
+
+
+class Sampler:
+    """Samples one thread's Python stack from a background thread."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL_MS / 1000, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()  # tuple of (name, file, line) root -> leaf
+        self.samples = 0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _frame_stack(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._frame_stack(frame)] += 1
+                self.samples += 1
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="render-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+
+    # --- Output formats ---
+
+    @staticmethod
+    def frame_label(frame):
+        name, filename, line = frame
+        return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ",")
+
+    def collapsed(self):
+        """Brendan Gregg's folded format: 'root;child;leaf count' per line."""
+        return "".join(f"{';'.join(self.frame_label(f) for f in stack)} {count}\n"
+                       for stack, count in self.stacks.most_common())
+
+    def speedscope(self, name):
+        frames, index = [], {}
+        samples, weights = [], []
+        seconds_per_sample = self.duration / self.samples if self.samples else 0
+        for stack, count in self.stacks.most_common():
+            ids = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                ids.append(index[frame])
+            samples.append(ids)
+            weights.append(count * seconds_per_sample)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "exporter": "erp render_profiler",
+            "name": name,
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [{"type": "sampled", "name": name, "unit": "seconds", "startValue": 0,
+                          "endValue": sum(weights), "samples": samples, "weights": weights}],
+        }
+
+
+class Profile:
+    """Handle yielded by profile(); set .document to the generated file to store output next to it."""
+
+    def __init__(self, name, mode):
+        self.name = name
+        self.mode = mode
+        self.document = None
+        self.outputs = []
+
+    def _base_path(self):
+        if self.document:
+            return str(self.document)
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        safe = re.sub(r"[^\w.-]+", "_", self.name)
+        return os.path.join(PROFILE_DIR, f"{safe}-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}")
+
+    def write_sampled(self, sampler):
+        base = self._base_path()
+        with open(base + ".collapsed.txt", "w", encoding="utf-8") as f:
+            f.write(sampler.collapsed())
+        with open(base + ".speedscope.json", "w", encoding="utf-8") as f:
+            json.dump(sampler.speedscope(self.name), f)
+        self.outputs = [base + ".collapsed.txt", base + ".speedscope.json"]
+
+    def write_cprofile(self, profiler):
+        base = self._base_path()
+        profiler.dump_stats(base + ".prof")
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(40)
+        with open(base + ".prof.txt", "w", encoding="utf-8") as f:
+            f.write(text.getvalue())
+        self.outputs = [base + ".prof", base + ".prof.txt"]
+
+
+@contextlib.contextmanager
+def profile(name):
+    """Profiles the block when ERP_PROFILE_RENDER is set; output is written when it exits."""
+    mode = current_mode()
+    if mode is None or getattr(_active, "profile", None) is not None:
+        yield Profile(name, None)
+        return
+
+    handle = Profile(name, mode)
+    _active.profile = handle
+    if mode == "cprofile":
+        collector = cProfile.Profile()
+        collector.enable()
+    else:
+        interval = float(os.environ.get(ENV_INTERVAL, DEFAULT_INTERVAL_MS)) / 1000
+        collector = Sampler(interval).start()
+    try:
+        yield handle
+    finally:
+        _active.profile = None
+        if mode == "cprofile":
+            collector.disable()
+            handle.write_cprofile(collector)
+        else:
+            collector.stop()
+            handle.write_sampled(collector)
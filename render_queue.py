@@ -0,0 +1,405 @@
+"""
+Background document rendering.
+
+The CLI enqueues a row in render_jobs and returns immediately; a small pool of
+worker processes claims queued jobs and renders PO PDFs and Excel/PDF invoices
+in parallel. Because the queue lives in the database, several CLI sessions and
+a standalone worker can share it, and queued jobs survive a restart.
+
+Job lifecycle:  Queued -> Running -> Done
+                            |
+                            +-> Queued again (retry with backoff) -> ... -> Failed
+
+A worker claims a job with a conditional UPDATE (status = 'Queued'), so two
+workers never render the same job. When a pool starts, jobs still Running
+under a worker process of this machine that has exited are re-queued, while
+those of live local workers are left alone; jobs of other machines are
+re-queued once they have run longer than STALE_AFTER. Progress is written back in short separate
+transactions so other sessions can show it. Each output file is registered in
+the document repository (document_store.py) as the job completes. Finished jobs are reported once
+to the operator via pop_notifications().
+
+Usage:
+    python render_queue.py worker --workers 4     # standalone worker pool
+    python render_queue.py enqueue po_pdf 12
+    python render_queue.py status
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, update, or_
+from tabulate import tabulate
+
+import document_store
+import render_profiler
+import telemetry
+from models import get_engine, init_db, get_session, DATABASE_URL, RenderJob, PurchaseOrder, OurCompany
+
+POLL_INTERVAL = 1.0
+RETRY_BACKOFF_SECONDS = 5  # doubled after every failed attempt
+STALE_AFTER = timedelta(minutes=15)  # a Running job older than this lost its worker
+
+
+# --- Renderers ---
+# Each takes (session, target_id, progress) and returns the output path.
+# They are looked up by kind inside the worker, so the CLI never imports fpdf/openpyxl/COM.
+
+def render_po_pdf(session, po_id, progress):
+    from po_pdf_generator import generate_po_pdf
+
+    po = session.get(PurchaseOrder, po_id)
+    if po is None:
+        raise ValueError(f"Purchase order {po_id} not found")
+    progress(30)
+    return generate_po_pdf(po, session.query(OurCompany).first())
+
+
+def render_invoice_excel(session, co_id, progress):
+    from excel_invoice_generator import generate_invoice
+
+    progress(10)
+    path = generate_invoice(session, co_id)
+    if path is None:
+        raise RuntimeError(f"Invoice generation failed for customer order {co_id}")
+    return path
+
+
+def render_invoice_pdf(session, invoice_id, progress):
+    from services.invoicing import render_invoice_pdfs
+
+    progress(30)
+    paths = render_invoice_pdfs(session, [invoice_id])
+    if not paths:
+        raise ValueError(f"Invoice {invoice_id} not found")
+    return paths[0]
+
+
+RENDERERS = {
+    'po_pdf': render_po_pdf,
+    'invoice_excel': render_invoice_excel,
+    'invoice_pdf': render_invoice_pdf,
+}
+
+# Document.reference_type the output of each kind is registered under
+REFERENCE_TYPES = {
+    'po_pdf': 'PurchaseOrder',
+    'invoice_excel': 'CustomerOrder',
+    'invoice_pdf': 'Invoice',
+}
+
+
+# --- Queue API (used by the CLI) ---
+
+def enqueue(session, kind, target_id, max_attempts=3):
+    """
+    Queues a render and commits. If the same document is already queued or
+    running, returns that job instead of adding a duplicate.
+    """
+    if kind not in RENDERERS:
+        raise ValueError(f"Unknown render kind '{kind}'. Valid options: {', '.join(sorted(RENDERERS))}")
+    existing = (
+        session.query(RenderJob)
+        .filter(RenderJob.kind == kind, RenderJob.target_id == target_id,
+                RenderJob.status.in_(['Queued', 'Running']))
+        .first()
+    )
+    if existing:
+        return existing
+    job = RenderJob(kind=kind, target_id=target_id, max_attempts=max_attempts)
+    session.add(job)
+    session.commit()
+    return job
+
+
+def enqueue_many(session, kind, target_ids, max_attempts=3):
+    """
+    Queues a render per target with one executemany INSERT (e.g. all invoices
+    of a month-end run) and commits. Targets that already have a Queued or
+    Running job are skipped. Returns the number of jobs queued.
+    """
+    if kind not in RENDERERS:
+        raise ValueError(f"Unknown render kind '{kind}'. Valid options: {', '.join(sorted(RENDERERS))}")
+    # Like enqueue(): documents already queued or running are not queued twice
+    pending = set(session.scalars(
+        select(RenderJob.target_id)
+        .where(RenderJob.kind == kind, RenderJob.target_id.in_(target_ids), RenderJob.status.in_(['Queued', 'Running']))
+    )) if target_ids else set()
+    rows = [{"kind": kind, "target_id": t, "max_attempts": max_attempts}
+            for t in dict.fromkeys(target_ids) if t not in pending]
+    if rows:
+        session.execute(insert(RenderJob), rows)
+    session.commit()
+    return len(rows)
+
+
+def retry(session, job_id):
+    """Puts a Failed job back in the queue with a fresh set of attempts."""
+    result = session.execute(
+        update(RenderJob)
+        .where(RenderJob.id == job_id, RenderJob.status == 'Failed')
+        .values(status='Queued', attempts=0, progress=0, run_after=datetime.utcnow(), notified=False)
+    )
+    session.commit()
+    return result.rowcount == 1
+
+
+def pop_notifications(session):
+    """Returns finished jobs not yet shown to the operator and marks them shown."""
+    jobs = (
+        session.query(RenderJob)
+        .filter(RenderJob.status.in_(['Done', 'Failed']), RenderJob.notified == False)  # noqa: E712
+        .order_by(RenderJob.finished_at)
+        .all()
+    )
+    if jobs:
+        session.execute(update(RenderJob).where(RenderJob.id.in_([j.id for j in jobs])).values(notified=True))
+        session.commit()
+    return jobs
+
+
+def recent_jobs(session, limit=20):
+    return session.query(RenderJob).order_by(RenderJob.id.desc()).limit(limit).all()
+
+
+def _pid_alive(pid):
+    if os.name == "nt":
+        # os.kill(pid, 0) would terminate the process on Windows
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        kernel32.CloseHandle(handle)
+        return code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def worker_alive(worker_name):
+    """
+    Whether the process of `worker_name` (host:pid) is still running: True or
+    False for workers of this machine, None when it cannot be checked.
+    """
+    host, _, pid = (worker_name or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return None
+    return _pid_alive(int(pid))
+
+
+def requeue_stale(session, older_than=STALE_AFTER):
+    """
+    Re-queues Running jobs whose worker died (e.g. the CLI was closed
+    mid-render). A job whose worker ran on this machine is re-queued as soon as
+    that process is gone, and never while it is alive, however long the render
+    takes. Jobs of other machines, whose processes cannot be checked, are
+    re-queued once they have been running longer than `older_than`.
+    """
+    cutoff = datetime.utcnow() - older_than
+    running = session.query(RenderJob.id, RenderJob.worker, RenderJob.started_at) \
+        .filter(RenderJob.status == 'Running').all()
+    dead = []
+    for job_id, worker, started in running:
+        alive = worker_alive(worker)
+        if alive is False or (alive is None and (started is None or started < cutoff)):
+            dead.append(job_id)
+    if not dead:
+        session.commit()
+        return 0
+    result = session.execute(
+        update(RenderJob)
+        .where(RenderJob.id.in_(dead), RenderJob.status == 'Running')
+        .values(status='Queued', worker=None)
+    )
+    session.commit()
+    return result.rowcount
+
+
+# --- Worker side ---
+
+def claim_next(session, worker_name):
+    """
+    Claims the oldest runnable job. The UPDATE only matches while the job is
+    still Queued, so when two workers race for it exactly one gets rowcount 1.
+    """
+    now = datetime.utcnow()
+    candidates = (
+        session.query(RenderJob.id)
+        .filter(RenderJob.status == 'Queued', or_(RenderJob.run_after == None, RenderJob.run_after <= now))  # noqa: E711
+        .order_by(RenderJob.id)
+        .limit(5)
+        .all()
+    )
+    for (job_id,) in candidates:
+        result = session.execute(
+            update(RenderJob)
+            .where(RenderJob.id == job_id, RenderJob.status == 'Queued')
+            .values(status='Running', worker=worker_name, started_at=now, progress=0,
+                    attempts=RenderJob.attempts + 1)
+        )
+        session.commit()
+        if result.rowcount == 1:
+            return session.get(RenderJob, job_id)
+    return None
+
+
+def run_job(session, job):
+    """Renders one claimed job and records the outcome (Done, re-queued or Failed)."""
+    def progress(pct):
+        session.execute(update(RenderJob).where(RenderJob.id == job.id).values(progress=pct))
+        session.commit()
+
+    try:
+        with telemetry.screen(f"render:{job.kind}", kind="render"), \
+                render_profiler.profile(f"{job.kind}-{job.target_id}") as prof:
+            with telemetry.rendering():
+                path = RENDERERS[job.kind](session, job.target_id, progress)
+            prof.document = path
+        # Registered in the same transaction that marks the job Done
+        document_store.add_document(session, REFERENCE_TYPES[job.kind], job.target_id, path,
+                                    description=f"Generated ({job.kind})", copy_to_store=False)
+    except Exception as e:
+        session.rollback()
+        message = f"{type(e).__name__}: {e}"
+        if job.attempts < job.max_attempts:
+            backoff = RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+            values = {"status": 'Queued', "run_after": datetime.utcnow() + timedelta(seconds=backoff)}
+        else:
+            values = {"status": 'Failed', "finished_at": datetime.utcnow()}
+            message += "\n" + traceback.format_exc(limit=5)
+        session.execute(update(RenderJob).where(RenderJob.id == job.id).values(message=message, worker=None, **values))
+        session.commit()
+        return False
+
+    session.execute(
+        update(RenderJob).where(RenderJob.id == job.id)
+        .values(status='Done', progress=100, result_path=path, finished_at=datetime.utcnow())
+    )
+    session.commit()
+    return True
+
+
+def work(session, worker_name, max_jobs=None):
+    """Runs queued jobs until the queue is empty (or max_jobs ran). Returns the number run."""
+    count = 0
+    while max_jobs is None or count < max_jobs:
+        job = claim_next(session, worker_name)
+        if job is None:
+            break
+        run_job(session, job)
+        session.expire_all()
+        count += 1
+    return count
+
+
+def worker_loop(db_url, stop_event, poll_interval=POLL_INTERVAL):
+    """Process entry point: polls the queue until stop_event is set."""
+    engine = get_engine(db_url)
+    if telemetry.enable():
+        telemetry.instrument(engine)
+    session = get_session(engine)
+    worker_name = f"{socket.gethostname()}:{os.getpid()}"
+    try:
+        while not stop_event.is_set():
+            try:
+                if work(session, worker_name) == 0:
+                    stop_event.wait(poll_interval)
+            except Exception:
+                # e.g. database locked longer than busy_timeout; try again next poll
+                session.rollback()
+                stop_event.wait(poll_interval)
+    finally:
+        session.close()
+        engine.dispose()
+
+
+class WorkerPool:
+    """A set of daemon worker processes; they exit with the CLI."""
+
+    def __init__(self, db_url=DATABASE_URL, workers=2, poll_interval=POLL_INTERVAL):
+        self.db_url = db_url
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = multiprocessing.Event()
+        self._processes = []
+
+    def start(self):
+        session = get_session(get_engine(self.db_url))
+        try:
+            # Jobs a crashed pool on this machine left Running are queued again at once
+            requeue_stale(session)
+        finally:
+            session.close()
+        for _ in range(self.workers):
+            p = multiprocessing.Process(target=worker_loop, args=(self.db_url, self._stop, self.poll_interval), daemon=True)
+            p.start()
+            self._processes.append(p)
+        return self
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        for p in self._processes:
+            p.join(timeout)
+        self._processes.clear()
+
+
+def print_jobs(jobs):
+    rows = [[j.id, j.kind, j.target_id, j.status, f"{j.progress}%", f"{j.attempts}/{j.max_attempts}",
+             j.result_path or ((j.message or "").splitlines() or [""])[0]]
+            for j in jobs]
+    print(tabulate(rows, headers=["Job", "Kind", "Target", "Status", "Progress", "Attempts", "Result"], tablefmt="grid"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Background render queue for PO and invoice documents.")
+    parser.add_argument("--db-url", default=DATABASE_URL)
+    sub = parser.add_subparsers(dest="command", required=True)
+    w = sub.add_parser("worker", help="Run a pool of render workers until Ctrl+C")
+    w.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    w.add_argument("--profile-render", nargs="?", const="sample", choices=render_profiler.MODES,
+                   help="Profile every render; output is written next to each document")
+    e = sub.add_parser("enqueue", help="Queue a render")
+    e.add_argument("kind", choices=sorted(RENDERERS))
+    e.add_argument("target_id", type=int)
+    sub.add_parser("status", help="Show the most recent jobs")
+    r = sub.add_parser("retry", help="Re-queue a failed job")
+    r.add_argument("job_id", type=int)
+    args = parser.parse_args()
+
+    engine = get_engine(args.db_url)
+    init_db(engine)
+    session = get_session(engine)
+
+    if args.command == "worker":
+        if args.profile_render:
+            render_profiler.enable(args.profile_render)
+        pool = WorkerPool(args.db_url, args.workers).start()
+        print(f"{args.workers} render worker(s) running. Press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pool.stop()
+    elif args.command == "enqueue":
+        job = enqueue(session, args.kind, args.target_id)
+        print(f"Queued job {job.id}.")
+    elif args.command == "status":
+        print_jobs(recent_jobs(session))
+    elif args.command == "retry":
+        print("Re-queued." if retry(session, args.job_id) else "Job not found or not Failed.")
+    session.close()
+
+
+if __name__ == "__main__":
+    main()
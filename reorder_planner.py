@@ -0,0 +1,224 @@
+"""
+Reorder planning from sales velocity, stock on hand, lot expiry and open POs.
+
+The whole catalogue is evaluated in one pass: five aggregate queries load
+sales per product per day, lots, open PO quantities, supplier lead times and
+the product list. Everything after that is pandas/NumPy column arithmetic,
+with no per-product queries or loops.
+
+For each active product:
+
+    velocity      daily demand; a weighted blend of rolling-window averages
+                  (VELOCITY_WINDOWS) over non-cancelled customer order lines
+    lead_days     median days from PO date to line receipt for the supplier,
+                  DEFAULT_LEAD_DAYS when nothing has been received yet
+    on_hand       unexpired lot quantity; lots expiring before a new delivery
+                  could arrive count only as far as demand uses them first
+                  (first-expiry-first-out), the rest is written off
+    open_po       qty - quantity_received on Draft/Sent/Accepted POs, so a
+                  second run does not propose the same order again
+    position      projected stock when a delivery would arrive + open_po
+    reorder_point max(velocity * safety_days, Product.reorder_level)
+
+Products whose position is below their reorder point get an order quantity
+that brings them up to velocity * (safety_days + cover_days), or to
+reorder_level if that is higher. create_draft_pos() turns the plan into one
+Draft PO per supplier through the services layer. Products without a supplier
+are reported but not ordered.
+
+Usage:
+    python reorder_planner.py                      # show the plan
+    python reorder_planner.py --cover-days 45 --create
+"""
+import argparse
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func
+from tabulate import tabulate
+
+import services
+from models import (
+    get_engine, init_db, get_session, Product, ProductLot, PurchaseOrder, PurchaseOrderLine,
+    CustomerOrder, CustomerOrderLine,
+)
+
+VELOCITY_WINDOWS = {28: 0.6, 91: 0.4}  # window in days -> weight
+DEFAULT_LEAD_DAYS = 21
+SAFETY_DAYS = 14
+COVER_DAYS = 30
+OPEN_PO_STATUSES = ('Draft', 'Sent', 'Accepted')
+
+
+def _frame(session, query, columns):
+    return pd.DataFrame(session.execute(query).all(), columns=columns)
+
+
+def sales_velocity(session, as_of, windows=VELOCITY_WINDOWS):
+    """Series of daily demand per product_id, from rolling sums over a day x product matrix."""
+    longest = max(windows)
+    start = (as_of - timedelta(days=longest - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    day = func.date(CustomerOrder.date)
+    sales = _frame(session, (
+        select(day, CustomerOrderLine.product_id, func.sum(CustomerOrderLine.qty))
+        .join(CustomerOrder, CustomerOrderLine.co_id == CustomerOrder.id)
+        .where(CustomerOrder.status != 'Cancelled', CustomerOrder.date >= start, CustomerOrder.date <= as_of)
+        .group_by(day, CustomerOrderLine.product_id)
+    ), ["day", "product_id", "qty"])
+    if sales.empty:
+        return pd.Series(dtype=float)
+    days = pd.date_range(start, as_of.replace(hour=0, minute=0, second=0, microsecond=0), freq="D")
+    daily = (sales.assign(day=pd.to_datetime(sales["day"]))
+             .pivot_table(index="day", columns="product_id", values="qty", aggfunc="sum", fill_value=0)
+             .reindex(days, fill_value=0))
+    velocity = sum(weight * daily.rolling(window, min_periods=1).sum().iloc[-1] / window
+                   for window, weight in windows.items())
+    return velocity / sum(windows.values())
+
+
+def supplier_lead_days(session):
+    """Median receipt delay per supplier_id, from received PO lines."""
+    received = _frame(session, (
+        select(PurchaseOrder.supplier_id, PurchaseOrder.date, PurchaseOrderLine.received_date)
+        .join(PurchaseOrderLine, PurchaseOrderLine.po_id == PurchaseOrder.id)
+        .where(PurchaseOrderLine.received_date.isnot(None), PurchaseOrder.date.isnot(None))
+    ), ["supplier_id", "date", "received_date"])
+    if received.empty:
+        return pd.Series(dtype=float)
+    delay = (pd.to_datetime(received["received_date"]) - pd.to_datetime(received["date"])).dt.days.clip(lower=0)
+    return delay.groupby(received["supplier_id"]).median()
+
+
+def plan(session, as_of=None, cover_days=COVER_DAYS, safety_days=SAFETY_DAYS):
+    """
+    Returns a DataFrame with one row per active product (index product_id)
+    and an order_qty column; rows with order_qty > 0 are the proposals.
+    """
+    as_of = as_of or datetime.utcnow()
+    products = _frame(session, (
+        select(Product.id, Product.sku, Product.name, Product.supplier_id, Product.reorder_level, Product.cost_price)
+        .where(Product.is_active.isnot(False))
+    ), ["product_id", "sku", "name", "supplier_id", "reorder_level", "cost_price"]).set_index("product_id")
+    if products.empty:
+        return products
+
+    lots = _frame(session, (
+        select(ProductLot.product_id, ProductLot.expiration_date, ProductLot.quantity).where(ProductLot.quantity > 0)
+    ), ["product_id", "expiration_date", "quantity"])
+    open_po = _frame(session, (
+        select(PurchaseOrderLine.product_id,
+               func.sum(PurchaseOrderLine.qty - func.coalesce(PurchaseOrderLine.quantity_received, 0)))
+        .join(PurchaseOrder, PurchaseOrderLine.po_id == PurchaseOrder.id)
+        .where(PurchaseOrder.status.in_(OPEN_PO_STATUSES))
+        .group_by(PurchaseOrderLine.product_id)
+    ), ["product_id", "open_po"]).set_index("product_id")["open_po"]
+
+    df = products
+    df["reorder_level"] = df["reorder_level"].fillna(0)
+    df["velocity"] = sales_velocity(session, as_of).reindex(df.index, fill_value=0.0)
+    df["lead_days"] = df["supplier_id"].map(supplier_lead_days(session)).fillna(DEFAULT_LEAD_DAYS)
+    df["open_po"] = open_po.reindex(df.index, fill_value=0).clip(lower=0)
+
+    # Lots: split each product's unexpired stock by whether it outlives the next delivery
+    lots["expiration_date"] = pd.to_datetime(lots["expiration_date"])
+    lots["arrival"] = as_of + pd.to_timedelta(df["lead_days"].reindex(lots["product_id"]).to_numpy(), unit="D")
+    unexpired = lots["expiration_date"].isna() | (lots["expiration_date"] > as_of)
+    outlives = lots["expiration_date"].isna() | (lots["expiration_date"] > lots["arrival"])
+    by_product = lots["product_id"]
+    good = lots["quantity"].where(unexpired & outlives, 0).groupby(by_product).sum()
+    short = lots["quantity"].where(unexpired & ~outlives, 0).groupby(by_product).sum()
+    df["on_hand"] = good.reindex(df.index, fill_value=0) + short.reindex(df.index, fill_value=0)
+    df["expiring"] = short.reindex(df.index, fill_value=0)
+
+    demand_lead = df["velocity"] * df["lead_days"]
+    # Demand during the lead time eats short-dated stock first; only the rest draws on good stock
+    at_arrival = df["on_hand"] - df["expiring"] - np.maximum(demand_lead - df["expiring"], 0)
+    df["position"] = at_arrival + df["open_po"]
+    df["reorder_point"] = np.maximum(df["velocity"] * safety_days, df["reorder_level"])
+    target = np.maximum(df["velocity"] * (safety_days + cover_days), df["reorder_level"])
+    needs = (df["position"] < df["reorder_point"]) & (target > 0)
+    df["order_qty"] = np.where(needs, np.ceil(target - df["position"]), 0).astype(int)
+    df["unit_cost"] = pd.to_numeric(df["cost_price"], errors="coerce").fillna(0.0)  # 'TBD' -> 0
+    return df.drop(columns=["cost_price"])
+
+
+def proposals(df):
+    """The rows to order, grouped by supplier, largest orders first."""
+    if df.empty:
+        return df
+    return df[df["order_qty"] > 0].sort_values(["supplier_id", "order_qty"], ascending=[True, False])
+
+
+def create_draft_pos(session, df, as_of=None):
+    """
+    Creates one Draft PO per supplier for the proposed quantities, in one commit.
+    Returns the new POs.
+    """
+    as_of = as_of or datetime.utcnow()
+    rows = proposals(df)
+    rows = rows[rows["supplier_id"].notna()]
+    pos = []
+    try:
+        for supplier_id, group in rows.groupby("supplier_id"):
+            lead = int(group["lead_days"].max())
+            pos.append(services.build_po(session, int(supplier_id), {
+                'status': 'Draft',
+                'date': as_of,
+                'expected_date': as_of + timedelta(days=lead),
+                'notes': f"Proposed by reorder planner on {as_of:%Y-%m-%d}",
+            }, [
+                {'product_id': int(pid), 'qty': int(r.order_qty), 'cost': float(r.unit_cost)}
+                for pid, r in group.iterrows()
+            ]))
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return pos
+
+
+def print_plan(df):
+    rows = proposals(df)
+    if rows.empty:
+        print("Nothing to reorder.")
+        return
+    for supplier_id, group in rows.groupby(rows["supplier_id"].fillna(0)):
+        label = f"Supplier {int(supplier_id)}" if supplier_id else "No supplier (not ordered)"
+        value = (group["order_qty"] * group["unit_cost"]).sum()
+        print(f"\n{label}: {len(group)} products, ${value:,.2f}")
+        print(tabulate(
+            [(r.sku, r.name, f"{r.velocity:.2f}", r.on_hand, r.expiring, r.open_po, int(r.lead_days),
+              math.floor(r.position), math.ceil(r.reorder_point), r.order_qty)
+             for r in group.itertuples()],
+            headers=["SKU", "Name", "Per day", "On hand", "Expiring", "Open PO", "Lead", "Position", "ROP", "Order"],
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Propose purchase orders from sales velocity and stock.")
+    parser.add_argument("--cover-days", type=int, default=COVER_DAYS, help="Days of demand to order beyond safety stock")
+    parser.add_argument("--safety-days", type=int, default=SAFETY_DAYS)
+    parser.add_argument("--as-of", help="Plan as of YYYY-MM-DD (default: now)")
+    parser.add_argument("--create", action="store_true", help="Create Draft POs for the proposals")
+    args = parser.parse_args()
+
+    as_of = datetime.strptime(args.as_of, "%Y-%m-%d") if args.as_of else None
+    engine = get_engine()
+    init_db(engine)
+    session = get_session(engine)
+
+    df = plan(session, as_of, args.cover_days, args.safety_days)
+    print_plan(df)
+    if args.create:
+        try:
+            pos = create_draft_pos(session, df, as_of)
+        except services.ValidationError as e:
+            print("Error: " + "; ".join(e.errors))
+            return
+        print(f"\nCreated {len(pos)} draft POs: {', '.join(po.po_number for po in pos)}")
+
+
+if __name__ == "__main__":
+    main()
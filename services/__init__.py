@@ -0,0 +1,17 @@
+"""
+Non-interactive business logic for the ERP.
+
+The CLI in main.py, the HTTP API and batch importers all call these functions
+instead of talking to the models directly, so validation rules live in one place.
+"""
+from services.errors import ValidationError, ConcurrencyConflict
+from services.concurrency import save_changes
+from services.orders import (
+    build_po, create_po, update_po,
+    build_co, create_co, update_co,
+    load_products, po_number_exists, invoice_number_exists, parse_date,
+    is_auto_number, AUTO_NUMBER, PO_STATUSES, CO_STATUSES,
+)
+from services import sequences
+from services.products import build_product, add_product, parse_price
+from services import invoicing
@@ -0,0 +1,58 @@
+"""
+Optimistic concurrency helpers.
+
+Orders, products and lots carry a version_id column (SQLAlchemy version_id_col).
+Every UPDATE includes `WHERE version_id = <version we loaded>`, so an edit based
+on a stale copy matches zero rows and raises StaleDataError instead of silently
+overwriting someone else's work.
+
+save_changes() turns that into a retry/merge flow: if the other writer changed
+different fields, our edits are re-applied on top of their row and committed;
+only edits to the same fields come back to the caller as a ConcurrencyConflict.
+"""
+from sqlalchemy.orm.exc import StaleDataError, ObjectDeletedError
+
+from services.errors import ConcurrencyConflict
+
+DEFAULT_RETRIES = 3
+
+
+def save_changes(session, obj, changes, retries=DEFAULT_RETRIES):
+    """
+    Applies {field: value} to obj and commits, merging with concurrent edits.
+    Fields whose value equals the loaded value are not treated as edits, so
+    "keep current" answers never overwrite another writer's changes.
+    """
+    changes = {k: v for k, v in changes.items() if getattr(obj, k) != v}
+    if not changes:
+        return obj
+    base = {k: getattr(obj, k) for k in changes}
+
+    for _ in range(retries + 1):
+        for key, val in changes.items():
+            setattr(obj, key, val)
+        try:
+            session.commit()
+            return obj
+        except StaleDataError:
+            session.rollback()
+            try:
+                session.refresh(obj)
+            except ObjectDeletedError:
+                raise ConcurrencyConflict(obj, {}, f"{type(obj).__name__} was deleted by another user.")
+
+            theirs = {k: getattr(obj, k) for k in changes}
+            conflicts = {
+                k: (changes[k], theirs[k])
+                for k in changes
+                if theirs[k] != base[k] and theirs[k] != changes[k]
+            }
+            if conflicts:
+                raise ConcurrencyConflict(obj, conflicts)
+            # The other writer touched different fields: re-apply ours on top of their row
+            base = theirs
+        except Exception:
+            session.rollback()
+            raise
+
+    raise ConcurrencyConflict(obj, {}, f"{type(obj).__name__} {obj.id} kept changing; gave up after {retries} retries.")
@@ -0,0 +1,27 @@
+class ValidationError(Exception):
+    """
+    Raised by the service layer when a payload fails validation.
+    Collects every problem found so callers can report them all at once.
+    """
+    def __init__(self, errors):
+        if isinstance(errors, str):
+            errors = [errors]
+        self.errors = list(errors)
+        super().__init__("; ".join(self.errors))
+
+
+class ConcurrencyConflict(Exception):
+    """
+    Raised when a record was changed by another writer since it was loaded and
+    the two sets of edits touch the same fields.
+
+    `conflicts` maps field name -> (your_value, their_value). The object passed
+    in has already been refreshed to the other writer's version, so the caller
+    can decide per field and call the update again.
+    """
+    def __init__(self, obj, conflicts, message=None):
+        self.obj = obj
+        self.conflicts = conflicts
+        if message is None:
+            message = f"{type(obj).__name__} {obj.id} was changed by another user: {', '.join(conflicts)}"
+        super().__init__(message)
@@ -0,0 +1,220 @@
+"""
+Customer order -> invoice conversion.
+
+Orders are converted in batches: each batch reads its orders, and its lines
+with their product names, as plain rows in two queries, flips the orders to
+'Invoiced' with one UPDATE, inserts every Invoice and InvoiceLine of the batch
+with one executemany each and commits once. Orders that cannot be invoiced (missing, not Pending, no lines)
+are dropped from their batch and reported; the rest still convert. A batch
+that fails rolls back on its own and leaves the other batches committed.
+
+These Core statements bypass the ORM flush, so each batch logs its changes
+to the change log (change_log.record) and the orders' status change to the
+audit trail (audit.record) itself, in the same transaction.
+"""
+from datetime import datetime
+
+from sqlalchemy import insert, update, select, func, bindparam
+from sqlalchemy.orm import selectinload
+
+import audit
+import change_log
+from models import Invoice, InvoiceLine, CustomerOrder, CustomerOrderLine, Product
+from services.errors import ValidationError
+from services import sequences
+
+INVOICE_TYPES = ['Proforma', 'Commercial']
+DEFAULT_BATCH_SIZE = 500
+
+
+def order_total(co):
+    subtotal = sum(l.amount or 0.0 for l in co.lines)
+    return subtotal + (co.shipping or 0.0) - (co.discount or 0.0) - (co.credit or 0.0)
+
+
+def pending_order_ids(session):
+    rows = session.query(CustomerOrder.id).filter(CustomerOrder.status == 'Pending').order_by(CustomerOrder.id)
+    return [i for (i,) in rows.all()]
+
+
+def _convert_batch(session, co_ids, invoice_type):
+    """
+    Converts the valid orders of one batch. Returns (invoice_ids, errors); missing,
+    non-Pending and line-less orders are left out and reported in errors.
+    """
+    # Plain rows rather than ORM objects: nothing here is edited through the ORM,
+    # and building an instance per line was most of the batch's Python time
+    orders = session.execute(
+        select(CustomerOrder.id, CustomerOrder.status, CustomerOrder.invoice_number, CustomerOrder.version_id)
+        .where(CustomerOrder.id.in_(co_ids))
+        .order_by(CustomerOrder.id)
+    ).all()
+    order_lines = {}
+    for line in session.execute(
+        select(CustomerOrderLine.co_id, CustomerOrderLine.description, Product.name, CustomerOrderLine.qty,
+               CustomerOrderLine.selling_price, CustomerOrderLine.amount)
+        .outerjoin(Product, Product.id == CustomerOrderLine.product_id)
+        .where(CustomerOrderLine.co_id.in_(co_ids))
+        .order_by(CustomerOrderLine.co_id, CustomerOrderLine.id)
+    ):
+        order_lines.setdefault(line.co_id, []).append(line)
+    found = {co.id for co in orders}
+    errors = [f"CO {i}: not found" for i in co_ids if i not in found]
+    valid = []
+    for co in orders:
+        if co.status != 'Pending':
+            errors.append(f"CO {co.id}: status is {co.status}, expected Pending")
+        elif co.id not in order_lines:
+            errors.append(f"CO {co.id}: has no lines")
+        else:
+            valid.append(co)
+    orders = valid
+    co_ids = [co.id for co in orders]
+    if not orders:
+        return [], errors
+
+    # Claim the orders first: the status flip is a single UPDATE that also bumps
+    # version_id, so concurrent editors holding these orders see a stale version,
+    # and a second converter racing for the same orders matches fewer rows.
+    result = session.execute(
+        update(CustomerOrder)
+        .where(CustomerOrder.id.in_(co_ids), CustomerOrder.status == 'Pending')
+        .values(status='Invoiced', version_id=CustomerOrder.version_id + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(orders):
+        raise ValidationError("Some orders were invoiced or changed by another user; batch not converted")
+
+    # Orders entered without an invoice number get theirs from one sequence block;
+    # the numbers differ per order, so they go through one executemany
+    unnumbered = [co.id for co in orders if not co.invoice_number]
+    numbers = sequences.allocate_block(session, sequences.INVOICE, len(unnumbered))
+    if numbers:
+        table = CustomerOrder.__table__
+        session.execute(
+            update(table).where(table.c.id == bindparam("co_id")).values(invoice_number=bindparam("number")),
+            [{"co_id": i, "number": n} for i, n in zip(unnumbered, numbers)],
+        )
+
+    # Core executemany on the tables, not ORM add_all or ORM bulk inserts: the ORM
+    # needs RETURNING per row to learn the new ids and falls back to one INSERT per
+    # invoice on SQLite, and its bulk path adds per-row bookkeeping we do not use. The ids are
+    # read back in one query; this transaction owns these orders, so the newest
+    # invoice of each is the one just inserted.
+    now = datetime.utcnow()
+    session.execute(insert(Invoice.__table__), [
+        {"type": invoice_type, "date": now, "customer_order_id": co.id} for co in orders
+    ])
+    invoice_ids = dict(session.execute(
+        select(Invoice.customer_order_id, func.max(Invoice.id))
+        .where(Invoice.customer_order_id.in_(co_ids))
+        .group_by(Invoice.customer_order_id)
+    ).all())
+
+    line_rows = [
+        {
+            "invoice_id": invoice_ids[co.id],
+            "description": l.description or l.name or "",
+            "qty": l.qty,
+            "unit_price": l.selling_price,
+            "total": l.amount if l.amount is not None else l.qty * l.selling_price,
+        }
+        for co in orders
+        for l in order_lines[co.id]
+    ]
+    session.execute(insert(InvoiceLine.__table__), line_rows)
+
+    numbered = dict(zip(unnumbered, numbers))
+    changes = [
+        ("update", "customer_orders", {"id": co.id, "status": "Invoiced", "version_id": co.version_id + 1,
+                                       **({"invoice_number": numbered[co.id]} if co.id in numbered else {})})
+        for co in orders
+    ]
+    changes += [("insert", "invoices", {"id": invoice_ids[co.id], "type": invoice_type, "date": now,
+                                        "customer_order_id": co.id}) for co in orders]
+    # Only the new line ids are read back: within an invoice they follow insertion order
+    line_ids = session.execute(
+        select(InvoiceLine.id).where(InvoiceLine.invoice_id.in_(invoice_ids.values()))
+        .order_by(InvoiceLine.invoice_id, InvoiceLine.id)
+    ).scalars().all()
+    changes += [("insert", "invoice_lines", {"id": line_id, **row})
+                for line_id, row in zip(line_ids, sorted(line_rows, key=lambda r: r["invoice_id"]))]
+    change_log.record(session, changes)
+    audit.record(session, [
+        ("customer_order", co.id, "customer_orders", co.id, "update",
+         {"status": ["Pending", "Invoiced"], **({"invoice_number": [None, numbered[co.id]]} if co.id in numbered else {})})
+        for co in orders
+    ])
+    return [invoice_ids[co.id] for co in orders], errors
+
+
+def convert_orders(session, co_ids=None, invoice_type='Commercial', batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Converts the given customer orders (default: every Pending order) to invoices.
+    Returns (invoice_ids, errors). Invalid orders are skipped and reported in
+    errors without holding up the rest of their batch; errors also lists the
+    messages of batches that failed and rolled back.
+    """
+    if invoice_type not in INVOICE_TYPES:
+        raise ValidationError(f"Invalid invoice type '{invoice_type}'. Valid options: {', '.join(INVOICE_TYPES)}")
+    if co_ids is None:
+        co_ids = pending_order_ids(session)
+
+    invoice_ids, errors = [], []
+    for start in range(0, len(co_ids), batch_size):
+        batch = co_ids[start:start + batch_size]
+        try:
+            converted, invalid = _convert_batch(session, batch, invoice_type)
+            session.commit()
+            invoice_ids.extend(converted)
+            errors.extend(invalid)
+        except ValidationError as e:
+            session.rollback()
+            errors.extend(e.errors)
+        except Exception as e:
+            session.rollback()
+            errors.append(f"Batch of COs {batch[0]}-{batch[-1]} rolled back: {e}")
+        # Converted orders were updated in bulk; drop stale copies from the identity map
+        session.expire_all()
+    return invoice_ids, errors
+
+
+def convert_order(session, co_id, invoice_type='Commercial'):
+    """Converts a single customer order. Returns the Invoice; raises ValidationError."""
+    invoice_ids, errors = convert_orders(session, [co_id], invoice_type)
+    if errors:
+        raise ValidationError(errors)
+    return session.get(Invoice, invoice_ids[0])
+
+
+def invoice_data(invoice):
+    """The dict pdf_generator.generate_invoice_pdf expects."""
+    co = invoice.order
+    return {
+        "id": (co.invoice_number if co and co.invoice_number else invoice.id),
+        "type": invoice.type,
+        "date": invoice.date,
+        "customer_name": co.customer.customer_name if co and co.customer else "",
+        "lines": [
+            {"description": l.description, "qty": l.qty, "unit_price": l.unit_price, "total": l.total}
+            for l in invoice.lines
+        ],
+        "total_amount": order_total(co) if co else sum(l.total for l in invoice.lines),
+    }
+
+
+def render_invoice_pdfs(session, invoice_ids, output_folder='./erp_pdfs/'):
+    """Renders a PDF per invoice (loaded in one query). Returns the file paths."""
+    from pdf_generator import generate_invoice_pdf
+
+    if not invoice_ids:
+        return []
+    invoices = (
+        session.query(Invoice)
+        .options(selectinload(Invoice.lines), selectinload(Invoice.order).selectinload(CustomerOrder.lines),
+                 selectinload(Invoice.order).selectinload(CustomerOrder.customer))
+        .filter(Invoice.id.in_(invoice_ids))
+        .order_by(Invoice.id)
+        .all()
+    )
+    return [generate_invoice_pdf(invoice_data(inv), output_folder) for inv in invoices]
@@ -0,0 +1,288 @@
+"""
+Purchase order and customer order business logic.
+
+Every function takes the whole payload up front, validates all of it in one
+pass (reporting every problem, not just the first) and touches the database
+with a fixed number of queries regardless of how many lines an order has.
+`build_*` functions stage objects in the session without committing so batch
+callers can create many orders per transaction; `create_*`/`update_*` commit once.
+"""
+from datetime import datetime
+
+from models import (
+    Supplier, Customer, Product,
+    PurchaseOrder, PurchaseOrderLine,
+    CustomerOrder, CustomerOrderLine,
+)
+from services.errors import ValidationError
+from services.concurrency import save_changes, DEFAULT_RETRIES
+from services import sequences
+
+# Pass as po_number / invoice_number to take the next number from the document sequence
+AUTO_NUMBER = 'auto'
+
+PO_STATUSES = ['Draft', 'Sent', 'Accepted', 'Received', 'Cancelled', 'Closed']
+CO_STATUSES = ['Pending', 'Invoiced', 'Cancelled']
+
+PO_HEADER_FIELDS = {
+    'po_number', 'date', 'expected_date', 'status', 'created_by', 'approved_by',
+    'vendor_reference', 'currency', 'payment_terms', 'discount_amount', 'shipping_cost',
+    'tax_amount', 'ship_to_address', 'shipping_method', 'incoterm', 'port_of_destination',
+    'consignee', 'notify_party', 'tc_party', 'notes',
+}
+PO_LINE_FIELDS = {'product_id', 'qty', 'unit', 'cost', 'description', 'packing_structure'}
+
+CO_HEADER_FIELDS = {
+    'invoice_number', 'po_number', 'date', 'status', 'credit', 'discount', 'amount_paid',
+    'shipping', 'tracking_terms', 'bill_to_address', 'ship_to_address', 'notes',
+}
+CO_LINE_FIELDS = {'product_id', 'qty', 'unit', 'selling_price', 'description', 'amount'}
+
+DATE_FIELDS = {'date', 'expected_date'}
+FLOAT_FIELDS = {'discount_amount', 'shipping_cost', 'tax_amount', 'credit', 'discount', 'amount_paid', 'shipping'}
+
+
+def parse_date(value):
+    """Accepts a datetime, 'YYYY-MM-DD' or ISO string. Returns None for empty values."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).strip())
+
+
+def _clean_header(header, allowed, statuses, errors, label):
+    """Validates header keys and coerces dates/floats. Appends problems to errors."""
+    values = {}
+    for key, val in header.items():
+        if key not in allowed:
+            errors.append(f"{label}: unknown field '{key}'")
+            continue
+        if key in DATE_FIELDS:
+            try:
+                val = parse_date(val)
+            except ValueError:
+                errors.append(f"{label}: invalid date for '{key}': {val}")
+                continue
+        elif key in FLOAT_FIELDS:
+            try:
+                val = float(val) if val not in (None, "") else 0.0
+            except (ValueError, TypeError):
+                errors.append(f"{label}: invalid number for '{key}': {val}")
+                continue
+        elif key == 'status' and val not in statuses:
+            errors.append(f"{label}: invalid status '{val}' (expected one of {', '.join(statuses)})")
+            continue
+        values[key] = val
+    return values
+
+
+def _clean_lines(lines, allowed, price_field, products, errors, label):
+    """Validates line dicts against the preloaded {product_id: Product} map."""
+    cleaned = []
+    for i, line in enumerate(lines, 1):
+        prefix = f"{label} line {i}"
+        unknown = set(line) - allowed
+        if unknown:
+            errors.append(f"{prefix}: unknown field(s) {', '.join(sorted(unknown))}")
+            continue
+
+        product = products.get(line.get('product_id'))
+        if product is None:
+            errors.append(f"{prefix}: product {line.get('product_id')} not found")
+            continue
+
+        try:
+            qty = int(line.get('qty'))
+            if qty <= 0:
+                raise ValueError
+        except (ValueError, TypeError):
+            errors.append(f"{prefix}: quantity must be a positive whole number, got {line.get('qty')!r}")
+            continue
+
+        try:
+            price = float(line.get(price_field) or 0.0)
+        except (ValueError, TypeError):
+            errors.append(f"{prefix}: invalid {price_field} {line.get(price_field)!r}")
+            continue
+
+        values = dict(line)
+        if values.get('amount') not in (None, ""):
+            try:
+                values['amount'] = float(values['amount'])
+            except (ValueError, TypeError):
+                errors.append(f"{prefix}: invalid amount {values['amount']!r}")
+                continue
+        values['qty'] = qty
+        values[price_field] = price
+        values['description'] = line.get('description') or product.name
+        cleaned.append(values)
+    return cleaned
+
+
+def load_products(session, product_ids):
+    """Fetches all referenced products with a single IN query."""
+    ids = {pid for pid in product_ids if pid is not None}
+    if not ids:
+        return {}
+    return {p.id: p for p in session.query(Product).filter(Product.id.in_(ids)).all()}
+
+
+def is_auto_number(value, missing_is_auto=False):
+    if value is None or str(value).strip() == "":
+        return missing_is_auto
+    return str(value).strip().lower() == AUTO_NUMBER
+
+
+def po_number_exists(session, po_number):
+    return session.query(PurchaseOrder.id).filter_by(po_number=po_number).first() is not None
+
+
+def invoice_number_exists(session, invoice_number):
+    return session.query(CustomerOrder.id).filter_by(invoice_number=invoice_number).first() is not None
+
+
+# --- Purchase Orders ---
+
+def build_po(session, supplier_id, header, lines, products=None, check_unique=True, assign_number=True):
+    """
+    Validates a complete PO payload and stages it in the session (no commit).
+    `products` may be a preloaded {product_id: Product} map shared across a batch;
+    batch callers that already checked PO numbers in bulk pass check_unique=False.
+    A missing or 'auto' po_number is allocated from the purchase_order sequence,
+    unless assign_number=False (the caller allocates a block and assigns it).
+    Raises ValidationError listing every problem found.
+    """
+    errors = []
+    label = f"PO {header.get('po_number') or ''}".strip()
+
+    if not session.get(Supplier, supplier_id):
+        errors.append(f"{label}: supplier {supplier_id} not found")
+
+    values = _clean_header(header, PO_HEADER_FIELDS, PO_STATUSES, errors, label)
+    auto_number = is_auto_number(values.get('po_number'), missing_is_auto=True)
+    if auto_number:
+        values.pop('po_number', None)
+    elif check_unique and po_number_exists(session, values['po_number']):
+        errors.append(f"{label}: PO number '{values['po_number']}' already exists")
+
+    if not lines:
+        errors.append(f"{label}: at least one line is required")
+    if products is None:
+        products = load_products(session, [l.get('product_id') for l in lines])
+    cleaned = _clean_lines(lines, PO_LINE_FIELDS, 'cost', products, errors, label)
+
+    if errors:
+        raise ValidationError(errors)
+
+    values.setdefault('date', datetime.utcnow())
+    values.setdefault('status', 'Draft')
+    if auto_number and assign_number:
+        values['po_number'] = sequences.allocate(session, sequences.PURCHASE_ORDER, values['date'])
+    po = PurchaseOrder(supplier_id=supplier_id, **values)
+    for l in cleaned:
+        po.lines.append(PurchaseOrderLine(**l))
+    session.add(po)
+    return po
+
+
+def create_po(session, supplier_id, header, lines):
+    """Validates and saves a purchase order with its lines in one commit."""
+    try:
+        po = build_po(session, supplier_id, header, lines)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return po
+
+
+def update_po(session, po, changes, retries=DEFAULT_RETRIES):
+    """
+    Applies a dict of header changes to an existing PO after validating all of them.
+    Concurrent edits to other fields are merged; edits to the same fields raise
+    ConcurrencyConflict (see services.concurrency).
+    """
+    errors = []
+    label = f"PO {po.po_number}"
+    values = _clean_header(changes, PO_HEADER_FIELDS, PO_STATUSES, errors, label)
+
+    new_number = values.get('po_number')
+    if new_number and new_number != po.po_number and po_number_exists(session, new_number):
+        errors.append(f"{label}: PO number '{new_number}' already exists")
+    if errors:
+        raise ValidationError(errors)
+
+    return save_changes(session, po, values, retries)
+
+
+# --- Customer Orders ---
+
+def build_co(session, customer_id, header, lines, products=None, check_unique=True, assign_number=True):
+    """
+    Validates a complete customer order payload and stages it in the session (no commit).
+    Line `amount` defaults to qty * selling_price. invoice_number is optional; 'auto'
+    allocates from the invoice sequence. See build_po for the keyword arguments.
+    """
+    errors = []
+    label = f"CO {header.get('invoice_number') or ''}".strip()
+
+    if not session.get(Customer, customer_id):
+        errors.append(f"{label}: customer {customer_id} not found")
+
+    values = _clean_header(header, CO_HEADER_FIELDS, CO_STATUSES, errors, label)
+    auto_number = is_auto_number(values.get('invoice_number'))
+    if auto_number or not values.get('invoice_number'):
+        values['invoice_number'] = None
+    elif check_unique and invoice_number_exists(session, values['invoice_number']):
+        errors.append(f"{label}: invoice number '{values['invoice_number']}' already exists")
+
+    if not lines:
+        errors.append(f"{label}: at least one line is required")
+    if products is None:
+        products = load_products(session, [l.get('product_id') for l in lines])
+    cleaned = _clean_lines(lines, CO_LINE_FIELDS, 'selling_price', products, errors, label)
+
+    if errors:
+        raise ValidationError(errors)
+
+    values.setdefault('date', datetime.utcnow())
+    values.setdefault('status', 'Pending')
+    if auto_number and assign_number:
+        values['invoice_number'] = sequences.allocate(session, sequences.INVOICE, values['date'])
+    co = CustomerOrder(customer_id=customer_id, **values)
+    for l in cleaned:
+        if l.get('amount') in (None, ""):
+            l['amount'] = l['qty'] * l['selling_price']
+        co.lines.append(CustomerOrderLine(**l))
+    session.add(co)
+    return co
+
+
+def create_co(session, customer_id, header, lines):
+    """Validates and saves a customer order with its lines in one commit."""
+    try:
+        co = build_co(session, customer_id, header, lines)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return co
+
+
+def update_co(session, co, changes, retries=DEFAULT_RETRIES):
+    """
+    Applies a dict of header changes to an existing customer order after validating
+    all of them. Concurrent edits are merged as in update_po.
+    """
+    errors = []
+    label = f"CO {co.id}"
+    values = _clean_header(changes, CO_HEADER_FIELDS, CO_STATUSES, errors, label)
+
+    new_number = values.get('invoice_number')
+    if new_number and new_number != co.invoice_number and invoice_number_exists(session, new_number):
+        errors.append(f"{label}: invoice number '{new_number}' already exists")
+    if errors:
+        raise ValidationError(errors)
+
+    return save_changes(session, co, values, retries)
@@ -0,0 +1,68 @@
+"""
+Product business logic shared by the CLI, the API and batch callers.
+"""
+from models import Product, Supplier
+from services.errors import ValidationError
+
+PRODUCT_FIELDS = {
+    'sku', 'sku_number', 'name', 'description', 'category', 'unit_price',
+    'cost_price', 'reorder_level', 'is_active', 'supplier_id',
+}
+
+
+def parse_price(value):
+    """
+    Normalizes a price entry. Prices are stored as strings so 'TBD' is allowed.
+    Returns "0.0" for empty input; raises ValueError for anything else non-numeric.
+    """
+    if value is None or str(value).strip() == "":
+        return "0.0"
+    text = str(value).strip()
+    if text.upper() == "TBD":
+        return "TBD"
+    float(text)
+    return text
+
+
+def build_product(session, payload):
+    """Validates a product payload and stages it in the session (no commit)."""
+    errors = []
+    unknown = set(payload) - PRODUCT_FIELDS
+    if unknown:
+        errors.append(f"Product: unknown field(s) {', '.join(sorted(unknown))}")
+
+    values = {k: v for k, v in payload.items() if k in PRODUCT_FIELDS}
+    sku = (values.get('sku') or "").strip()
+    if not sku:
+        errors.append("Product: SKU is required")
+    elif session.query(Product.id).filter_by(sku=sku).first():
+        errors.append(f"Product: SKU '{sku}' already exists")
+    values['sku'] = sku
+
+    for field in ('unit_price', 'cost_price'):
+        if field in values:
+            try:
+                values[field] = parse_price(values[field])
+            except ValueError:
+                errors.append(f"Product: invalid {field} '{values[field]}' (number or TBD)")
+
+    if values.get('supplier_id') and not session.get(Supplier, values['supplier_id']):
+        errors.append(f"Product: supplier {values['supplier_id']} not found")
+
+    if errors:
+        raise ValidationError(errors)
+
+    product = Product(**values)
+    session.add(product)
+    return product
+
+
+def add_product(session, payload):
+    """Validates and saves a single product."""
+    try:
+        product = build_product(session, payload)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return product
@@ -0,0 +1,138 @@
+"""
+Gapless document number sequences (PO numbers, invoice numbers).
+
+Numbers are allocated with a single UPDATE ... SET next_value = next_value + n
+inside the caller's transaction. The UPDATE takes the write lock (SQLite) or
+row lock (server databases), so concurrent writers queue behind it and can
+never receive the same number. Because the counter only moves when the order
+insert commits with it, a rolled-back order gives its number back: no gaps.
+
+Formats use {seq} with any str.format spec plus date tokens:
+    {YYYY} 4-digit year   {YY} 2-digit year   {MM} month
+A format containing a date token restarts its counter each period,
+e.g. PO-{YYYY}-{seq:04} gives PO-2025-0001 ... then PO-2026-0001.
+"""
+from datetime import datetime
+
+from sqlalchemy import update, select
+
+from models import DocumentSequence, DocumentSequenceCounter
+from services.errors import ValidationError
+
+PURCHASE_ORDER = 'purchase_order'
+INVOICE = 'invoice'
+
+DEFAULT_FORMATS = {
+    PURCHASE_ORDER: 'PO-{YYYY}-{seq:04}',
+    INVOICE: 'INV-{YYYY}-{seq:04}',
+}
+
+# Order matters: {YYYY} must be replaced before {YY}
+DATE_TOKENS = [('{YYYY}', '%Y'), ('{YY}', '%y'), ('{MM}', '%m')]
+
+
+def period_for(fmt, when):
+    """The counter bucket for a format: '' (never resets), 'YYYY' or 'YYYY-MM'."""
+    if '{MM}' in fmt:
+        return when.strftime('%Y-%m')
+    if '{YYYY}' in fmt or '{YY}' in fmt:
+        return when.strftime('%Y')
+    return ''
+
+
+def render(fmt, seq, when):
+    text = fmt
+    for token, code in DATE_TOKENS:
+        text = text.replace(token, when.strftime(code))
+    return text.format(seq=seq)
+
+
+def get_format(session, name):
+    row = session.execute(select(DocumentSequence.format).where(DocumentSequence.name == name)).scalar()
+    if row:
+        return row
+    if name not in DEFAULT_FORMATS:
+        raise ValidationError(f"Unknown document sequence '{name}'")
+    return DEFAULT_FORMATS[name]
+
+
+def configure_sequence(session, name, fmt, next_value=None, when=None):
+    """
+    Sets the number format for a sequence (and optionally the next number for the
+    current period, e.g. to continue after numbers typed by hand). Commits.
+    """
+    try:
+        render(fmt, 1, datetime.utcnow())
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValidationError(f"Invalid sequence format '{fmt}': {e}")
+
+    seq = session.query(DocumentSequence).filter_by(name=name).first()
+    if seq is None:
+        seq = DocumentSequence(name=name, format=fmt)
+        session.add(seq)
+    else:
+        seq.format = fmt
+
+    if next_value is not None:
+        period = period_for(fmt, when or datetime.utcnow())
+        result = session.execute(
+            update(DocumentSequenceCounter)
+            .where(DocumentSequenceCounter.sequence_name == name, DocumentSequenceCounter.period == period)
+            .values(next_value=next_value)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            session.add(DocumentSequenceCounter(sequence_name=name, period=period, next_value=next_value))
+    session.commit()
+    return seq
+
+
+def allocate_block(session, name, count, when=None):
+    """
+    Reserves `count` consecutive numbers in the caller's transaction and returns
+    them formatted. Does not commit: the numbers become permanent when the
+    caller's orders commit, and are released if the caller rolls back.
+    """
+    if count <= 0:
+        return []
+    when = when or datetime.utcnow()
+    fmt = get_format(session, name)
+    period = period_for(fmt, when)
+
+    # UPDATE first so the lock is taken before we read; the SELECT then sees our own
+    # increment and nobody else's. (No RETURNING so this also works on MySQL.)
+    where = (DocumentSequenceCounter.sequence_name == name, DocumentSequenceCounter.period == period)
+    result = session.execute(
+        update(DocumentSequenceCounter)
+        .where(*where)
+        .values(next_value=DocumentSequenceCounter.next_value + count)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        # First number of a new period. On SQLite the UPDATE above already holds the
+        # write lock; elsewhere a racing first allocator fails on uq_sequence_period
+        # rather than issuing a duplicate.
+        session.add(DocumentSequenceCounter(sequence_name=name, period=period, next_value=1 + count))
+        session.flush()
+        new_next = 1 + count
+    else:
+        new_next = session.execute(select(DocumentSequenceCounter.next_value).where(*where)).scalar_one()
+    first = new_next - count
+    return [render(fmt, n, when) for n in range(first, new_next)]
+
+
+def allocate(session, name, when=None):
+    """Reserves the next number in the caller's transaction. See allocate_block."""
+    return allocate_block(session, name, 1, when)[0]
+
+
+def peek_next(session, name, when=None):
+    """The number the next allocation would return. For display only; not reserved."""
+    when = when or datetime.utcnow()
+    fmt = get_format(session, name)
+    current = session.execute(
+        select(DocumentSequenceCounter.next_value)
+        .where(DocumentSequenceCounter.sequence_name == name,
+               DocumentSequenceCounter.period == period_for(fmt, when))
+    ).scalar()
+    return render(fmt, current or 1, when)
@@ -0,0 +1,234 @@
+"""
+SQL profiler and slow-query log.
+
+When enabled, every engine returned by models.get_engine() gets a pair of
+before/after_cursor_execute listeners. They time each statement and group it
+by fingerprint: literals become '?', IN lists collapse, and whitespace is
+normalised, so the same query with different ids is counted as one.
+
+The CLI wraps each screen in operation(name). This gives per-screen query
+counts, and allows N+1 detection. A fingerprint that runs n_plus_one times or
+more inside one operation is reported, usually a lazy load inside a loop.
+
+Slow statements, N+1 warnings and per-screen totals go to a rotating log
+(logs/sql_profile.log). With summary=True a report is printed at exit.
+
+When disabled, no listeners are attached and operation() returns a
+nullcontext, so the only cost is one flag check per engine and per screen.
+
+Usage:
+    python main.py --profile                  # summary on exit
+    ERP_SQL_PROFILE=1 python bulk_order_import.py orders.xlsx
+    ERP_SQL_PROFILE=1 ERP_SQL_LOG_ALL=1 ...   # also log every statement
+"""
+import atexit
+import contextlib
+import contextvars
+import functools
+import logging
+import logging.handlers
+import os
+import re
+import time
+from collections import Counter
+
+from sqlalchemy import event
+from tabulate import tabulate
+
+LOG_PATH = os.path.join("logs", "sql_profile.log")
+LOG_MAX_BYTES = 1_000_000
+LOG_BACKUPS = 3
+SLOW_MS = 100
+N_PLUS_ONE = 10
+ENV_FLAG = "ERP_SQL_PROFILE"
+NO_OPERATION = "(no screen)"
+
+log = logging.getLogger("erp.sql")
+
+_profiler = None
+_current = contextvars.ContextVar("sql_profiler_operation", default=None)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_ROWS = re.compile(r"(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(statement):
+    """Normalises a SQL statement so that executions differing only in literals match."""
+    s = _STRING.sub("?", statement)
+    s = _NUMBER.sub("?", s)
+    s = _SPACE.sub(" ", s).strip()
+    s = _IN_LIST.sub("(...)", s)
+    s = _VALUES_ROWS.sub(r"\1, ...", s)
+    return s
+
+
+class _Operation:
+    __slots__ = ("name", "queries", "seconds", "counts", "flagged")
+
+    def __init__(self, name):
+        self.name = name
+        self.queries = 0
+        self.seconds = 0.0
+        self.counts = Counter()
+        self.flagged = set()
+
+
+class Profiler:
+    """Collects statement timings for the engines it is attached to."""
+
+    def __init__(self, slow_ms=SLOW_MS, n_plus_one=N_PLUS_ONE, log_all=False):
+        self.slow_ms = slow_ms
+        self.n_plus_one = n_plus_one
+        self.log_all = log_all
+        self.statements = {}  # fingerprint -> [calls, total seconds, max seconds]
+        self.screens = {}  # operation name -> [runs, queries, seconds]
+        self.suspects = {}  # (operation name, fingerprint) -> highest repeat count
+        self.slow = 0
+
+    def attach(self, engine):
+        if not event.contains(engine, "before_cursor_execute", self._before):
+            event.listen(engine, "before_cursor_execute", self._before)
+            event.listen(engine, "after_cursor_execute", self._after)
+        return engine
+
+    def detach(self, engine):
+        if event.contains(engine, "before_cursor_execute", self._before):
+            event.remove(engine, "before_cursor_execute", self._before)
+            event.remove(engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("sql_profiler_start", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["sql_profiler_start"].pop()
+        self.record(statement, time.perf_counter() - started, parameters, executemany)
+
+    def record(self, statement, elapsed, parameters=None, executemany=False):
+        fp = fingerprint(statement)
+        stats = self.statements.get(fp)
+        if stats is None:
+            stats = self.statements[fp] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+
+        op = _current.get()
+        name = op.name if op else NO_OPERATION
+        if op is not None:
+            op.queries += 1
+            op.seconds += elapsed
+            op.counts[fp] += 1
+            repeats = op.counts[fp]
+            if repeats >= self.n_plus_one:
+                key = (op.name, fp)
+                self.suspects[key] = max(self.suspects.get(key, 0), repeats)
+                if fp not in op.flagged:
+                    op.flagged.add(fp)
+                    log.warning("N+1 suspect in %s: %s", op.name, fp)
+
+        ms = elapsed * 1000
+        if ms >= self.slow_ms:
+            self.slow += 1
+            params = f"{len(parameters)} rows" if executemany else parameters
+            log.warning("slow %.1f ms in %s: %s | params=%r", ms, name, _SPACE.sub(" ", statement).strip(), params)
+        elif self.log_all:
+            log.debug("%.2f ms in %s: %s", ms, name, fp)
+
+    @contextlib.contextmanager
+    def operation(self, name):
+        op = _Operation(name)
+        token = _current.set(op)
+        try:
+            yield op
+        finally:
+            _current.reset(token)
+            runs = self.screens.setdefault(name, [0, 0, 0.0])
+            runs[0] += 1
+            runs[1] += op.queries
+            runs[2] += op.seconds
+            for fp in op.flagged:
+                # The warning fired at the threshold; record the final count for this run
+                log.warning("N+1 in %s: %d x %s", name, op.counts[fp], fp)
+            log.info("screen %s: %d queries, %.1f ms in SQL", name, op.queries, op.seconds * 1000)
+
+    def report(self, top=15):
+        """Returns the summary as text: per-screen totals, the heaviest fingerprints and N+1 suspects."""
+        out = []
+        if self.screens:
+            rows = [[name, runs, queries, f"{seconds * 1000:.1f}"]
+                    for name, (runs, queries, seconds) in sorted(self.screens.items(), key=lambda kv: -kv[1][1])]
+            out.append(tabulate(rows, headers=["Screen", "Runs", "Queries", "SQL ms"], tablefmt="grid"))
+        heaviest = sorted(self.statements.items(), key=lambda kv: -kv[1][1])[:top]
+        if heaviest:
+            rows = [[calls, f"{total * 1000:.1f}", f"{total / calls * 1000:.2f}", f"{peak * 1000:.1f}", _shorten(fp)]
+                    for fp, (calls, total, peak) in heaviest]
+            out.append(tabulate(rows, headers=["Calls", "Total ms", "Avg ms", "Max ms", "Statement"], tablefmt="grid"))
+        if self.suspects:
+            rows = [[name, count, _shorten(fp)]
+                    for (name, fp), count in sorted(self.suspects.items(), key=lambda kv: -kv[1])]
+            out.append("Possible N+1 queries:\n" +
+                       tabulate(rows, headers=["Screen", "Repeats", "Statement"], tablefmt="grid"))
+        total = sum(s[0] for s in self.statements.values())
+        out.append(f"{total} statements, {len(self.statements)} distinct, {self.slow} slower than {self.slow_ms} ms.")
+        return "\n\n".join(out)
+
+
+def _shorten(text, width=100):
+    return text if len(text) <= width else text[:width - 3] + "..."
+
+
+def _configure_log(path):
+    if any(getattr(h, "baseFilename", None) == os.path.abspath(path) for h in log.handlers):
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                                                   encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s %(process)d %(levelname)s %(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.DEBUG)
+    log.propagate = False
+
+
+def enable(summary=False, log_path=LOG_PATH, slow_ms=SLOW_MS, n_plus_one=N_PLUS_ONE, log_all=False):
+    """Turns profiling on for engines created from now on. Returns the Profiler."""
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler(slow_ms, n_plus_one, log_all)
+        if log_path:
+            _configure_log(log_path)
+        if summary:
+            atexit.register(lambda: print("\n--- SQL profile ---\n" + _profiler.report()))
+    return _profiler
+
+
+def disable():
+    global _profiler
+    _profiler = None
+
+
+def enabled():
+    return _profiler is not None
+
+
+def get_profiler():
+    return _profiler
+
+
+def instrument(engine):
+    """Attaches the active profiler to an engine; a no-op while profiling is off."""
+    if _profiler is None and os.environ.get(ENV_FLAG):
+        enable(summary=True, log_all=bool(os.environ.get("ERP_SQL_LOG_ALL")))
+    if _profiler is not None:
+        _profiler.attach(engine)
+    return engine
+
+
+def operation(name):
+    """Context manager naming the current screen/operation for per-screen counts and N+1 detection."""
+    if _profiler is None:
+        return contextlib.nullcontext()
+    return _profiler.operation(name)
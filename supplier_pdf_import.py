@@ -0,0 +1,352 @@
+"""
+Drafts purchase orders from supplier PO / invoice PDFs.
+
+Each PDF is read with pypdf and parsed in a worker process:
+
+  Header  - "PO#"/"Invoice #" (stored as vendor_reference), Date, Ship via,
+            INCOTERM, Port-of-Destination, Payment Terms, TC Party, Currency.
+  Lines   - quantity lines such as "198 kg  Paper Sacks  $4.50" give qty, unit,
+            packing and cost; product lines are any text that matches the
+            product lookup index. Supplier PDFs often lay the table out
+            column by column, so quantities and products are paired in order.
+  Supplier - detected by fuzzy-matching text lines against supplier names,
+            unless one is given.
+
+The product and supplier lookup indexes are built once per run from two queries
+and handed to every worker, so matching never touches the database. Parsed
+PDFs become Draft POs (PO number from the purchase_order sequence) in one
+transaction per batch, with the source PDF attached in the document repository.
+A PDF whose vendor reference is already on a PO for that supplier is skipped.
+
+Usage:
+    python supplier_pdf_import.py "erp_documents/PO 202540R MO Denman Island Tea Co.pdf"
+    python supplier_pdf_import.py inbox/*.pdf --supplier "Mana Organics Pvt. Ltd." --workers 4
+"""
+import argparse
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from difflib import SequenceMatcher
+
+from tabulate import tabulate
+
+from models import get_engine, init_db, get_session, Supplier, Product, PurchaseOrder
+import services
+from services import ValidationError
+import document_store
+import render_profiler
+
+UNITS = r"kg|kgs|g|lb|lbs|oz|pcs|pc|ea|units?|boxes|box|cases?|bags?|cartons?|tins?"
+QTY_LINE = re.compile(rf"^\s*(\d[\d,]*(?:\.\d+)?)\s*({UNITS})\b\.?\s*(.*)$", re.IGNORECASE)
+MONEY = re.compile(r"\$\s*([\d,]+(?:\.\d+)?)")
+
+HEADER_PATTERNS = {
+    "vendor_reference": re.compile(r"\b(?:PO|P\.O\.|Invoice|Order)\s*(?:#|No\.?|Number)\s*:?\s*([A-Z0-9][\w\-/]*)", re.IGNORECASE),
+    "date": re.compile(r"\bDate\b\s*:?\s*(\d{1,2}[-/ ][A-Za-z]{3,9}[-/ ]\d{2,4}|\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{2,4})"),
+    "shipping_method": re.compile(r"\bShip(?:ping)?\s+via\s*:\s*(.+)", re.IGNORECASE),
+    "incoterm": re.compile(r"\bINCOTERMS?\s*:\s*([A-Z]{3})\b", re.IGNORECASE),
+    "port_of_destination": re.compile(r"\bPort[- ]of[- ]Destination\s*:\s*(.+)", re.IGNORECASE),
+    "payment_terms": re.compile(r"\bPayment\s+Terms\s*:\s*(.+)", re.IGNORECASE),
+    "tc_party": re.compile(r"\bTC\s+Party\s*:\s*(.+)", re.IGNORECASE),
+    "currency": re.compile(r"\bCurrency\s*:\s*([A-Z]{3})\b"),
+}
+DATE_FORMATS = ["%d-%b-%y", "%d-%b-%Y", "%d %b %Y", "%d-%B-%Y", "%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y"]
+
+# Words that say nothing about which company or product a line names
+STOP_WORDS = {"PVT", "LTD", "LLC", "INC", "CO", "CORP", "LIMITED", "PRIVATE", "THE", "OF", "AND"}
+MAX_NGRAM = 4
+MIN_TOKEN_SCORE = 0.6
+SUPPLIER_MATCH_RATIO = 0.85
+
+
+def normalize(text):
+    return " ".join(re.sub(r"[^A-Z0-9]+", " ", (text or "").upper()).split())
+
+
+def tokens(text):
+    return [t for t in normalize(text).split() if t not in STOP_WORDS]
+
+
+# --- Lookup indexes (built once per run, shipped to every worker) ---
+
+def build_product_index(session):
+    """
+    {'exact': {normalized sku/sku_number/name/description: product_id},
+     'tokens': {token: [product_id, ...]}, 'sizes': {product_id: token count}}
+    """
+    exact, token_map, sizes = {}, {}, {}
+    rows = session.query(Product.id, Product.sku, Product.sku_number, Product.name, Product.description).all()
+    for pid, sku, sku_number, name, description in rows:
+        # SKUs win over names when two products share a key
+        for key in (name, description):
+            if normalize(key):
+                exact.setdefault(normalize(key), pid)
+        for key in (sku, sku_number):
+            if normalize(key):
+                exact[normalize(key)] = pid
+        name_tokens = set(tokens(name or description or sku))
+        sizes[pid] = len(name_tokens)
+        for t in name_tokens:
+            token_map.setdefault(t, []).append(pid)
+    return {"exact": exact, "tokens": token_map, "sizes": sizes}
+
+
+def build_supplier_index(session):
+    return {normalize(name): sid for sid, name in session.query(Supplier.id, Supplier.name).all() if normalize(name)}
+
+
+def match_product(line, index):
+    """
+    Product id for a text line, or None. Exact SKU/name n-grams first (longest
+    wins), then the best token-overlap score if it is clear of the runner-up.
+    """
+    words = normalize(line).split()
+    for n in range(min(MAX_NGRAM, len(words)), 0, -1):
+        for i in range(len(words) - n + 1):
+            pid = index["exact"].get(" ".join(words[i:i + n]))
+            if pid is not None:
+                return pid
+
+    line_tokens = set(tokens(line))
+    hits = {}
+    for t in line_tokens:
+        for pid in index["tokens"].get(t, ()):
+            hits[pid] = hits.get(pid, 0) + 1
+    scored = sorted(((count / index["sizes"][pid], pid) for pid, count in hits.items()), reverse=True)
+    if scored and scored[0][0] >= MIN_TOKEN_SCORE and (len(scored) == 1 or scored[0][0] > scored[1][0]):
+        return scored[0][1]
+    return None
+
+
+def match_supplier(lines, supplier_index):
+    best, best_ratio = None, SUPPLIER_MATCH_RATIO
+    for line in lines:
+        norm = normalize(line)
+        if not norm:
+            continue
+        for name, sid in supplier_index.items():
+            ratio = SequenceMatcher(None, norm, name).ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = sid, ratio
+    return best
+
+
+# --- Parsing (runs in worker processes) ---
+
+def parse_date_text(value):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_text(text, product_index, supplier_index):
+    """Parses extracted PDF text into {'header', 'lines', 'supplier_id', 'errors', 'warnings'}."""
+    lines = [l.strip() for l in text.splitlines() if l.strip()]
+    header, errors, warnings = {}, [], []
+
+    for field, pattern in HEADER_PATTERNS.items():
+        for line in lines:
+            m = pattern.search(line)
+            if m:
+                header[field] = m.group(1).strip()
+                break
+    if "date" in header:
+        parsed = parse_date_text(header["date"])
+        if parsed:
+            header["date"] = parsed
+        else:
+            warnings.append(f"Unrecognised date '{header.pop('date')}'")
+    if "vendor_reference" not in header:
+        errors.append("No PO/invoice number found")
+
+    quantities, products = [], []
+    for line in lines:
+        m = QTY_LINE.match(line)
+        if m:
+            rest = MONEY.sub("", m.group(3)).strip()
+            prices = [float(p.replace(",", "")) for p in MONEY.findall(line)]
+            pid = match_product(rest, product_index) if rest else None
+            entry = {"qty": m.group(1).replace(",", ""), "unit": m.group(2).lower()}
+            if prices:
+                entry["cost"] = prices[0]
+            if pid is not None:
+                # Whole line on one row: qty, description and price together
+                products.append((pid, rest))
+            elif rest:
+                entry["packing_structure"] = rest
+            quantities.append(entry)
+        elif ":" not in line and not any(p.search(line) for p in HEADER_PATTERNS.values()):
+            pid = match_product(line, product_index)
+            if pid is not None:
+                products.append((pid, line))
+
+    parsed_lines = []
+    for i, entry in enumerate(quantities):
+        if i >= len(products):
+            errors.append(f"No product matched for quantity line '{entry['qty']} {entry['unit']}'")
+            continue
+        pid, description = products[i]
+        parsed_lines.append(dict(entry, product_id=pid, description=description))
+    for pid, description in products[len(quantities):]:
+        warnings.append(f"Product text without a quantity skipped: '{description}'")
+    if not quantities:
+        errors.append("No quantity lines found")
+
+    return {
+        "header": header,
+        "lines": parsed_lines,
+        "supplier_id": match_supplier(lines, supplier_index),
+        "errors": errors,
+        "warnings": warnings,
+    }
+
+
+_INDEXES = {}
+
+
+def _init_worker(product_index, supplier_index):
+    _INDEXES["product"] = product_index
+    _INDEXES["supplier"] = supplier_index
+
+
+def parse_pdf(path):
+    """Worker entry point: extract text with pypdf and parse it."""
+    try:
+        from pypdf import PdfReader
+        reader = PdfReader(path)
+        text = "\n".join(page.extract_text() or "" for page in reader.pages)
+    except Exception as e:
+        return {"path": path, "errors": [f"Could not read PDF: {e}"], "warnings": [], "header": {}, "lines": [],
+                "supplier_id": None}
+    result = parse_text(text, _INDEXES["product"], _INDEXES["supplier"])
+    result["path"] = path
+    return result
+
+
+# --- Import ---
+
+def parse_pdfs(paths, product_index, supplier_index, workers=None):
+    """Parses PDFs in a process pool (in-process for a single file). Results keep input order."""
+    if len(paths) == 1 or workers == 1:
+        _init_worker(product_index, supplier_index)
+        return [parse_pdf(p) for p in paths]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(product_index, supplier_index)) as pool:
+        return list(pool.map(parse_pdf, paths))
+
+
+def import_pdfs(session, paths, supplier_id=None, workers=None, batch_size=50, attach=True,
+                store_dir=document_store.STORE_DIR):
+    """
+    Drafts a PO per PDF. Returns a report: dicts with file, po_number, status
+    ('created' / 'skipped' / 'error') and message.
+    """
+    product_index = build_product_index(session)
+    supplier_index = build_supplier_index(session)
+    results = parse_pdfs(list(paths), product_index, supplier_index, workers)
+
+    product_ids = {l["product_id"] for r in results for l in r["lines"]}
+    products = services.load_products(session, product_ids)
+    existing = {
+        (sid, ref) for sid, ref in session.query(PurchaseOrder.supplier_id, PurchaseOrder.vendor_reference)
+        .filter(PurchaseOrder.vendor_reference.in_({r["header"].get("vendor_reference") for r in results} - {None}))
+        .all()
+    }
+
+    report, pending = [], []
+
+    def flush_batch():
+        if not pending:
+            return
+        try:
+            session.commit()
+            for path, po, warnings in pending:
+                report.append({"file": path, "po_number": po.po_number, "status": "created", "message": "; ".join(warnings)})
+        except Exception as e:
+            session.rollback()
+            for path, _, _ in pending:
+                report.append({"file": path, "po_number": "", "status": "error", "message": f"Batch rolled back: {e}"})
+        pending.clear()
+
+    for result in results:
+        path = result["path"]
+        sid = supplier_id or result["supplier_id"]
+        errors = list(result["errors"])
+        if sid is None:
+            errors.append("Supplier not recognised; pass one explicitly")
+        ref = result["header"].get("vendor_reference")
+        if not errors and (sid, ref) in existing:
+            report.append({"file": path, "po_number": "", "status": "skipped",
+                           "message": f"Vendor reference {ref} already imported"})
+            continue
+        if errors:
+            report.append({"file": path, "po_number": "", "status": "error", "message": "; ".join(errors)})
+            continue
+
+        header = dict(result["header"], status="Draft", notes=f"Drafted from {os.path.basename(path)}")
+        lines = []
+        for line in result["lines"]:
+            line = dict(line)
+            if "cost" not in line:
+                try:
+                    line["cost"] = float(products[line["product_id"]].cost_price)
+                except (TypeError, ValueError):
+                    line["cost"] = 0.0  # TBD prices draft as 0.0, same as the CLI
+            lines.append(line)
+        try:
+            po = services.build_po(session, sid, header, lines, products=products)
+            if attach:
+                session.flush()
+                document_store.add_document(session, "PurchaseOrder", po.id, path, "Supplier PDF (parsed)",
+                                            store_dir=store_dir)
+            existing.add((sid, ref))
+            pending.append((path, po, result["warnings"]))
+        except ValidationError as e:
+            report.append({"file": path, "po_number": "", "status": "error", "message": "; ".join(e.errors)})
+            continue
+
+        if len(pending) >= batch_size:
+            flush_batch()
+
+    flush_batch()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Draft purchase orders from supplier PO/invoice PDFs.")
+    parser.add_argument("paths", nargs="+", help="PDF files")
+    parser.add_argument("--supplier", help="Supplier name or ID (default: detect from the PDF)")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--profile-render", nargs="?", const="sample", choices=render_profiler.MODES,
+                        help="Profile the import; output is written under logs/profiles")
+    args = parser.parse_args()
+    if args.profile_render:
+        render_profiler.enable(args.profile_render)
+
+    engine = get_engine()
+    init_db(engine)
+    session = get_session(engine)
+    try:
+        supplier_id = None
+        if args.supplier:
+            s = session.get(Supplier, int(args.supplier)) if args.supplier.isdigit() else \
+                session.query(Supplier).filter_by(name=args.supplier).first()
+            if s is None:
+                print(f"Supplier '{args.supplier}' not found.")
+                return
+            supplier_id = s.id
+        with render_profiler.profile("supplier_pdf_import"):
+            report = import_pdfs(session, args.paths, supplier_id, args.workers)
+    finally:
+        session.close()
+
+    print(tabulate([[os.path.basename(r["file"]), r["po_number"], r["status"], r["message"]] for r in report],
+                   headers=["File", "PO #", "Status", "Message"], tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    main()
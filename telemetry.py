@@ -0,0 +1,281 @@
+"""
+Per-screen latency telemetry for the interactive CLI.
+
+Every menu and action in main.py runs inside screen(name). When the screen
+ends, one row is written to a local SQLite metrics store (logs/metrics.db). It
+is kept apart from app.db so telemetry never competes with business writes.
+Each row records:
+
+    wall_ms     time from opening the screen to leaving it
+    input_ms    part of wall_ms spent waiting at a prompt
+    db_ms       time inside database cursor calls (engines passed to instrument())
+    queries     number of statements
+    rows_loaded ORM objects loaded
+    render_ms   time inside rendering() blocks (PDF / Excel generation)
+
+Active time (wall_ms - input_ms) is what the operator perceives as the system
+being slow; `stats` reports its percentiles per screen. Screens nest (menu ->
+action) and the outer screen includes its inner ones.
+
+Render workers record each job as a 'render:<kind>' screen, so background
+rendering shows up in the same report.
+
+Telemetry is off until enable() is called (main.run() and the render workers
+do). Setting ERP_TELEMETRY=0 keeps it off. A failing metrics store is ignored
+rather than interrupting the operator.
+
+Usage:
+    python telemetry.py stats                     # all screens, last 30 days
+    python telemetry.py stats --days 7 --kind action
+"""
+import argparse
+import contextlib
+import contextvars
+import math
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Mapper
+from tabulate import tabulate
+
+METRICS_DB = os.path.join("logs", "metrics.db")
+ENV_FLAG = "ERP_TELEMETRY"
+KINDS = ("menu", "action", "render")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS screen_metrics (
+    id INTEGER PRIMARY KEY,
+    recorded_at TEXT NOT NULL,
+    screen TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    wall_ms REAL NOT NULL,
+    input_ms REAL NOT NULL,
+    db_ms REAL NOT NULL,
+    queries INTEGER NOT NULL,
+    rows_loaded INTEGER NOT NULL,
+    render_ms REAL NOT NULL,
+    ok INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_screen_metrics_screen ON screen_metrics (screen, recorded_at);
+"""
+
+_store_path = None
+_conn = None
+_conn_pid = None
+_spans = contextvars.ContextVar("telemetry_spans", default=())
+
+
+class Span:
+    __slots__ = ("screen", "kind", "input", "db", "queries", "rows", "render")
+
+    def __init__(self, screen, kind):
+        self.screen = screen
+        self.kind = kind
+        self.input = self.db = self.render = 0.0
+        self.queries = self.rows = 0
+
+
+# --- Store ---
+
+def enable(path=METRICS_DB):
+    """Starts recording screens to `path`. Returns False when disabled by ERP_TELEMETRY=0."""
+    global _store_path
+    if os.environ.get(ENV_FLAG) == "0":
+        return False
+    _store_path = path
+    return True
+
+
+def disable():
+    global _store_path, _conn
+    if _conn is not None:
+        _conn.close()
+    _store_path = _conn = None
+
+
+def enabled():
+    return _store_path is not None
+
+
+def _connect():
+    """One connection per process; a forked render worker must not reuse its parent's."""
+    global _conn, _conn_pid
+    if _conn is None or _conn_pid != os.getpid():
+        os.makedirs(os.path.dirname(_store_path) or ".", exist_ok=True)
+        _conn = sqlite3.connect(_store_path, timeout=5, isolation_level=None)
+        _conn.executescript(SCHEMA)
+        _conn_pid = os.getpid()
+    return _conn
+
+
+def _write(span, wall, ok):
+    try:
+        _connect().execute(
+            "INSERT INTO screen_metrics (recorded_at, screen, kind, wall_ms, input_ms, db_ms, queries, rows_loaded, "
+            "render_ms, ok) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (datetime.now().isoformat(timespec="seconds"), span.screen, span.kind, wall * 1000, span.input * 1000,
+             span.db * 1000, span.queries, span.rows, span.render * 1000, int(ok)))
+    except sqlite3.Error:
+        pass  # telemetry must never get in the operator's way
+
+
+# --- Recording ---
+
+@contextlib.contextmanager
+def screen(name, kind="action"):
+    """Measures one menu or action and stores it when the block exits."""
+    if _store_path is None:
+        yield None
+        return
+    span = Span(name, kind)
+    token = _spans.set(_spans.get() + (span,))
+    ok = False
+    start = time.perf_counter()
+    try:
+        yield span
+        ok = True
+    except SystemExit:
+        ok = True  # 'exit' typed at a prompt
+        raise
+    finally:
+        wall = time.perf_counter() - start
+        _spans.reset(token)
+        _write(span, wall, ok)
+
+
+@contextlib.contextmanager
+def _timed(field):
+    spans = _spans.get()
+    if not spans:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        for span in spans:
+            setattr(span, field, getattr(span, field) + elapsed)
+
+
+def waiting():
+    """Wraps a blocking prompt so its time is reported as input, not latency."""
+    return _timed("input")
+
+
+def rendering():
+    """Wraps PDF/Excel generation so it is reported as render time."""
+    return _timed("render")
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if _spans.get():
+        conn.info.setdefault("telemetry_start", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = _spans.get()
+    started = conn.info.get("telemetry_start")
+    if not spans or not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    for span in spans:
+        span.db += elapsed
+        span.queries += 1
+
+
+def _on_load(target, context):
+    for span in _spans.get():
+        span.rows += 1
+
+
+def instrument(engine):
+    """Adds DB time, query and loaded-row counting for screens using this engine."""
+    if not event.contains(engine, "before_cursor_execute", _before_execute):
+        event.listen(engine, "before_cursor_execute", _before_execute)
+        event.listen(engine, "after_cursor_execute", _after_execute)
+    if not event.contains(Mapper, "load", _on_load):
+        event.listen(Mapper, "load", _on_load)
+    return engine
+
+
+# --- Reporting ---
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def screen_stats(path=METRICS_DB, days=30, kind=None, screen_name=None):
+    """Per-screen active-time percentiles and averages, slowest p95 first."""
+    if not os.path.exists(path):
+        return []
+    since = (datetime.now() - timedelta(days=days)).isoformat(timespec="seconds")
+    sql = ("SELECT screen, kind, wall_ms - input_ms, db_ms, queries, rows_loaded, render_ms, ok "
+           "FROM screen_metrics WHERE recorded_at >= ?")
+    params = [since]
+    if kind:
+        sql += " AND kind = ?"
+        params.append(kind)
+    if screen_name:
+        sql += " AND screen = ?"
+        params.append(screen_name)
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+    grouped = {}
+    for name, k, active, db_ms, queries, loaded, render_ms, ok in rows:
+        grouped.setdefault((name, k), []).append((active, db_ms, queries, loaded, render_ms, ok))
+
+    stats = []
+    for (name, k), samples in grouped.items():
+        active = sorted(s[0] for s in samples)
+        n = len(samples)
+        stats.append({
+            "screen": name, "kind": k, "count": n,
+            "p50": percentile(active, 50), "p95": percentile(active, 95), "p99": percentile(active, 99),
+            "db_ms": sum(s[1] for s in samples) / n, "queries": sum(s[2] for s in samples) / n,
+            "rows": sum(s[3] for s in samples) / n, "render_ms": sum(s[4] for s in samples) / n,
+            "errors": sum(1 for s in samples if not s[5]),
+        })
+    stats.sort(key=lambda s: -s["p95"])
+    return stats
+
+
+def print_stats(stats):
+    if not stats:
+        print("No telemetry recorded yet.")
+        return
+    rows = [[s["screen"], s["kind"], s["count"], f"{s['p50']:.0f}", f"{s['p95']:.0f}", f"{s['p99']:.0f}",
+             f"{s['db_ms']:.0f}", f"{s['queries']:.0f}", f"{s['rows']:.0f}", f"{s['render_ms']:.0f}", s["errors"]]
+            for s in stats]
+    print(tabulate(rows, headers=["Screen", "Kind", "Count", "p50 ms", "p95 ms", "p99 ms", "Avg DB ms",
+                                  "Avg queries", "Avg rows", "Avg render ms", "Errors"], tablefmt="grid"))
+    print("Times exclude time spent waiting at prompts.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI latency telemetry.")
+    parser.add_argument("--db", default=METRICS_DB, help="Metrics store (default: %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    s = sub.add_parser("stats", help="p50/p95/p99 active time per screen")
+    s.add_argument("--days", type=int, default=30)
+    s.add_argument("--kind", choices=KINDS)
+    s.add_argument("--screen")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print_stats(screen_stats(args.db, args.days, args.kind, args.screen))
+
+
+if __name__ == "__main__":
+    main()
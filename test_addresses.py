@@ -0,0 +1,44 @@
+from models import get_engine, init_db, get_session, Customer, Supplier, OurCompany
+from addresses import Address
+import addresses
+from main import get_formatted_address
+
+def test_address_formatting_skips_missing_parts():
+    assert Address.of("  10 Hughes,  A204 ", "", "Irvine", "CA", "92618", "USA").format() == \
+        "10 Hughes, A204\nIrvine, CA 92618\nUSA"
+    assert Address.of("1 Tea Rd", None, None, "CA", None, None).format() == "1 Tea Rd\nCA"
+    assert Address.of(None, None, None, None, None, None).format() == ""
+    assert addresses.with_name("Leaf House", "") == "Leaf House"
+
+def test_formatted_columns_follow_edits():
+    engine = get_engine("sqlite://")
+    init_db(engine)
+    session = get_session(engine)
+    customer = Customer(customer_name="Leaf House", ship_to_addr1="1 Main St", ship_to_city="Salem",
+                        ship_to_state="OR", bill_to_addr1="PO Box 9", bill_to_country="USA")
+    supplier = Supplier(name="Estate 1", city="Darjeeling", country="India")
+    company = OurCompany(company_name="Bench Tea Imports", address1="10 Hughes", zip_code="92618")
+    session.add_all([customer, supplier, company])
+    session.commit()
+    assert customer.ship_to_formatted == "1 Main St\nSalem, OR" and customer.bill_to_formatted == "PO Box 9\nUSA"
+    assert supplier.address_formatted == "Darjeeling\nIndia" and supplier.bill_to_formatted is None
+    assert get_formatted_address(company) == "Bench Tea Imports\n10 Hughes\n92618"
+    assert get_formatted_address(customer) == "Leaf House\n1 Main St\nSalem, OR"
+
+    customer.ship_to_zip = "97301"
+    session.commit()
+    assert customer.ship_to_formatted == "1 Main St\nSalem, OR 97301"
+
+    # Rows loaded by Core before the backfill are formatted on the fly, then by refresh_all
+    with engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE customers SET ship_to_formatted = NULL")
+    session.expire_all()
+    assert addresses.formatted(customer, "ship_to_formatted") == "1 Main St\nSalem, OR 97301"
+    assert addresses.refresh_all(session, Customer) == 1
+    assert customer.ship_to_formatted == "1 Main St\nSalem, OR 97301"
+    assert addresses.refresh_all(session, Customer) == 0
+
+if __name__ == "__main__":
+    test_address_formatting_skips_missing_parts()
+    test_formatted_columns_follow_edits()
+    print("SUCCESS: address formatting verified.")
@@ -0,0 +1,71 @@
+import os
+import tempfile
+from fastapi.testclient import TestClient
+from api import create_app
+
+def test_api_crud_and_pagination():
+    tmp_dir = tempfile.mkdtemp()
+    db_url = f"sqlite+aiosqlite:///{os.path.join(tmp_dir, 'api_test.db')}"
+
+    with TestClient(create_app(db_url)) as client:
+        # 1. Create supplier, customer and products
+        sup = client.post("/suppliers", json={"name": "API Tea Supplier", "country": "India"})
+        assert sup.status_code == 201
+        sup_id = sup.json()["id"]
+
+        cust = client.post("/customers", json={"customer_name": "API Chai House"})
+        assert cust.status_code == 201
+        cust_id = cust.json()["id"]
+
+        for i in range(5):
+            r = client.post("/products", json={"sku": f"API-SKU-{i}", "name": f"API Product {i}", "supplier_id": sup_id})
+            assert r.status_code == 201
+
+        # Duplicate SKU hits the unique constraint
+        assert client.post("/products", json={"sku": "API-SKU-0"}).status_code == 409
+        # Unknown fields are rejected
+        assert client.post("/products", json={"sku": "X", "bogus": 1}).status_code == 422
+
+        # 2. Pagination and search
+        page = client.get("/products", params={"limit": 2, "offset": 2}).json()
+        assert page["total"] == 5
+        assert [p["sku"] for p in page["items"]] == ["API-SKU-2", "API-SKU-3"]
+
+        found = client.get("/products", params={"q": "product 4"}).json()
+        assert found["total"] == 1
+
+        # 3. Orders with lines
+        po = client.post("/purchase-orders", json={
+            "supplier_id": sup_id,
+            "po_number": "PO-API-001",
+            "date": "2025-01-15T00:00:00",
+            "lines": [{"product_id": 1, "qty": 10, "cost": 2.5, "unit": "kg"}],
+        })
+        assert po.status_code == 201
+        po_json = po.json()
+        assert po_json["date"].startswith("2025-01-15")
+        assert len(po_json["lines"]) == 1
+
+        co = client.post("/customer-orders", json={
+            "customer_id": cust_id,
+            "invoice_number": "INV-API-001",
+            "lines": [{"product_id": 2, "qty": 3, "selling_price": 4.0, "amount": 12.0}],
+        })
+        assert co.status_code == 201
+
+        # 4. Update and delete
+        upd = client.patch(f"/purchase-orders/{po_json['id']}", json={"status": "Sent", "version_id": po_json["version_id"]})
+        assert upd.json()["status"] == "Sent"
+        assert upd.json()["version_id"] == po_json["version_id"] + 1
+
+        # A second writer still holding the old version is rejected
+        stale = client.patch(f"/purchase-orders/{po_json['id']}", json={"notes": "late", "version_id": po_json["version_id"]})
+        assert stale.status_code == 409
+
+        assert client.delete(f"/customer-orders/{co.json()['id']}").status_code == 204
+        assert client.get(f"/customer-orders/{co.json()['id']}").status_code == 404
+
+    print("SUCCESS: API CRUD, search and pagination verified.")
+
+if __name__ == "__main__":
+    test_api_crud_and_pagination()
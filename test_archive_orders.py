@@ -0,0 +1,104 @@
+import os
+import sqlite3
+import tempfile
+from datetime import datetime
+from sqlalchemy import text
+from models import get_engine, get_session, PurchaseOrder, CustomerOrder, Invoice, Document, RenderJob
+from generate_dataset import generate, SCALES
+import services
+import archive_orders
+from archive_orders import archive_orders as run_archive, history_connection, find_order
+
+NOW = datetime(2026, 6, 30)
+
+def counts(engine, tables=archive_orders.ARCHIVED_TABLES):
+    with engine.connect() as conn:
+        return {t: conn.execute(text(f"SELECT count(*) FROM {t}")).scalar() for t in tables}
+
+def test_archive_settled_orders_and_read_history():
+    folder = tempfile.mkdtemp()
+    engine = get_engine(f"sqlite:///{os.path.join(folder, 'app.db')}")
+    generate(engine, seed=5, progress=lambda msg: None, **SCALES["tiny"])
+    session = get_session(engine)
+    invoice_ids, _ = services.invoicing.convert_orders(session)
+    session.add(Document(reference_type="Invoice", reference_id=invoice_ids[0], file_path="x.pdf"))
+    old_po = session.query(PurchaseOrder).filter(PurchaseOrder.status == "Closed").order_by(PurchaseOrder.id).first()
+    session.add(Document(reference_type="PurchaseOrder", reference_id=old_po.id, file_path="po.pdf"))
+    # A PO still being rendered stays in the working set
+    busy_po = session.query(PurchaseOrder).filter(PurchaseOrder.status == "Closed", PurchaseOrder.id != old_po.id).first()
+    session.add(RenderJob(kind="po_pdf", target_id=busy_po.id, status="Running"))
+    session.commit()
+    old_id, old_number, old_year = old_po.id, old_po.po_number, old_po.date.strftime("%Y")
+    busy_id = busy_po.id
+    before = counts(engine)
+
+    archive_dir = os.path.join(folder, "archive")
+    preview = run_archive(engine, months=18, archive_dir=archive_dir, dry_run=True, now=NOW)
+    assert set(preview) == {2023, 2024} and not os.path.exists(archive_dir)
+
+    moved = run_archive(engine, months=18, archive_dir=archive_dir, now=NOW)
+    assert archive_orders.history_years(archive_dir) == [2023, 2024]
+    assert {y: (c["purchase_orders"], c["customer_orders"]) for y, c in moved.items()} == \
+        {y: (p["purchase_orders"], p["customer_orders"]) for y, p in preview.items()}
+    after = counts(engine)
+    assert all(after[t] + sum(m[t] for m in moved.values()) == before[t] for t in before)
+    assert sum(m["documents"] for m in moved.values()) == 2 and sum(m["invoice_lines"] for m in moved.values()) > 0
+
+    session.expire_all()
+    assert session.get(PurchaseOrder, old_id) is None and session.get(PurchaseOrder, busy_id) is not None
+    remaining = session.query(CustomerOrder).filter(CustomerOrder.date < datetime(2024, 12, 1),
+                                                    CustomerOrder.status.in_(("Invoiced", "Cancelled"))).count()
+    assert remaining == 0
+    # Invoices never outlive their order in the working set
+    assert all(inv.order is not None for inv in session.query(Invoice).all())
+
+    # The unified views see everything, tagged with where it lives
+    with history_connection(engine, archive_dir) as conn:
+        totals = {t: conn.execute(text(f"SELECT count(*) FROM all_{t}")).scalar() for t in before}
+        where = conn.execute(text("SELECT archive FROM all_purchase_orders WHERE id = :id"), {"id": old_id}).scalar()
+    assert totals == before and where == old_year
+
+    [row] = find_order(engine, old_number, archive_dir)
+    assert (row[0], row[1], row[6]) == ("PO", old_id, old_year) and row[7] > 0  # lines found in history too
+
+    # Pooled connections come back without the history files attached
+    with engine.connect() as conn:
+        assert {row[1] for row in conn.exec_driver_sql("PRAGMA database_list")} <= {"main", "temp"}
+        assert not conn.exec_driver_sql("SELECT name FROM temp.sqlite_master WHERE name LIKE 'all_%'").fetchall()
+
+    # Running again moves nothing and is harmless
+    assert run_archive(engine, months=18, archive_dir=archive_dir, now=NOW) == {}
+    assert counts(engine) == after
+
+    # A live order reusing an archived id is refused rather than copied over the archived one
+    history_file = archive_orders.history_path(int(old_year), archive_dir)
+    with sqlite3.connect(os.path.join(folder, "app.db")) as conn:
+        conn.execute("ATTACH DATABASE ? AS h", (history_file,))
+        conn.execute("INSERT INTO main.purchase_orders SELECT * FROM h.purchase_orders WHERE id = ?", (old_id,))
+        conn.execute("UPDATE main.purchase_orders SET po_number = 'PO-REUSED' WHERE id = ?", (old_id,))
+    try:
+        run_archive(engine, months=18, archive_dir=archive_dir, now=NOW)
+        assert False, "Expected ArchiveError"
+    except archive_orders.ArchiveError as e:
+        assert str(old_id) in str(e)
+    [row] = find_order(engine, old_number, archive_dir)
+    assert row[6] == old_year
+    assert counts(engine)["purchase_orders"] == after["purchase_orders"] + 1
+
+    # The same row left behind in both places (a crash between copy and delete) is just removed from app.db
+    with sqlite3.connect(os.path.join(folder, "app.db")) as conn:
+        conn.execute("UPDATE purchase_orders SET po_number = ? WHERE id = ?", (old_number, old_id))
+    moved = run_archive(engine, months=18, archive_dir=archive_dir, now=NOW)
+    assert moved[int(old_year)]["purchase_orders"] == 1
+    assert counts(engine) == after
+    [row] = find_order(engine, old_number, archive_dir)
+    assert row[6] == old_year
+
+def test_months_ago():
+    assert archive_orders.months_ago(18, datetime(2026, 6, 30)) == datetime(2024, 12, 28)
+    assert archive_orders.months_ago(1, datetime(2026, 1, 15)) == datetime(2025, 12, 15)
+
+if __name__ == "__main__":
+    test_archive_settled_orders_and_read_history()
+    test_months_ago()
+    print("SUCCESS: order archival verified.")
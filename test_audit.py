@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+from datetime import datetime
+from models import get_engine, get_session, PurchaseOrder, PurchaseOrderLine, Customer, CustomerOrder
+from generate_dataset import generate, SCALES
+import audit
+import services
+
+def make_db():
+    engine = get_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'app.db')}")
+    generate(engine, seed=13, progress=lambda msg: None, **SCALES["tiny"])
+    return get_session(engine)
+
+def test_edits_store_only_changed_columns_and_replay():
+    session = make_db()
+    po = session.query(PurchaseOrder).filter(PurchaseOrder.status == "Draft").order_by(PurchaseOrder.id).first()
+    original = {"payment_terms": po.payment_terms, "notes": po.notes, "lines": sorted(l.id for l in po.lines)}
+    first_line = po.lines[0]
+    original_qty = first_line.qty
+    before_edits = datetime.utcnow()
+
+    with audit.acting_as("alice"):
+        services.update_po(session, po, {"payment_terms": "Net 60", "notes": "Rush order"})
+    after_first = datetime.utcnow()
+
+    first_line.qty = original_qty + 10
+    po.lines.remove(po.lines[-1])
+    po.lines.append(PurchaseOrderLine(product_id=first_line.product_id, qty=1, cost=2.5))
+    session.commit()
+    session.expire_all()
+    po.payment_terms = "Net 90"  # assigned while expired: the old value is read from the row
+    session.commit()
+
+    entries = audit.history(session, "purchase_order", po.id)
+    header_edits = [json.loads(e.changes) for e in entries if e.table_name == "purchase_orders"]
+    assert header_edits[-1] == {"notes": [original["notes"], "Rush order"],
+                                "payment_terms": [original["payment_terms"], "Net 60"]}
+    assert header_edits[0] == {"payment_terms": ["Net 60", "Net 90"]}
+    assert entries[-1].changed_by == "alice"
+    assert {(e.table_name, e.action) for e in entries} == {
+        ("purchase_orders", "update"), ("purchase_order_lines", "update"),
+        ("purchase_order_lines", "delete"), ("purchase_order_lines", "insert")}
+
+    then = audit.state_at(session, "purchase_order", po.id, before_edits)
+    assert then["row"]["payment_terms"] == original["payment_terms"] and then["row"]["notes"] == original["notes"]
+    assert sorted(then["lines"]) == original["lines"]
+    assert then["lines"][first_line.id]["qty"] == original_qty
+
+    middle = audit.state_at(session, "purchase_order", po.id, after_first)
+    assert middle["row"]["payment_terms"] == "Net 60" and middle["lines"][first_line.id]["qty"] == original_qty
+
+    now = audit.state_at(session, "purchase_order", po.id, datetime.utcnow())
+    assert now["row"]["payment_terms"] == "Net 90" and len(now["lines"]) == len(original["lines"])
+
+def test_new_records_and_bulk_invoicing():
+    session = make_db()
+    before = datetime.utcnow()
+    customer = Customer(customer_name="Audit Tea Co")
+    session.add(customer)
+    session.commit()
+    assert audit.state_at(session, "customer", customer.id, before) is None
+    customer.contact_name = "Bo"
+    session.commit()
+    assert [e.action for e in audit.history(session, "customer", customer.id)] == ["update", "insert"]
+
+    co = session.query(CustomerOrder).filter(CustomerOrder.status == "Pending").first()
+    co_id = co.id
+    services.invoicing.convert_orders(session, [co_id])
+    [entry] = audit.history(session, "customer_order", co_id)
+    assert json.loads(entry.changes)["status"] == ["Pending", "Invoiced"]
+    assert audit.state_at(session, "customer_order", co_id, before)["row"]["status"] == "Pending"
+
+    try:
+        audit.state_at(session, "product", 1, before)
+        assert False, "Expected ValueError"
+    except ValueError:
+        pass
+
+if __name__ == "__main__":
+    test_edits_store_only_changed_columns_and_replay()
+    test_new_records_and_bulk_invoicing()
+    print("SUCCESS: audit trail verified.")
@@ -0,0 +1,89 @@
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+import backup_db
+from backup_db import snapshot, restore, prune, select_retained, list_snapshots, BackupError
+from models import get_engine, init_db, get_session, Product
+
+def make_db(folder, n=2000):
+    path = os.path.join(folder, "app.db")
+    engine = get_engine(f"sqlite:///{path}")
+    init_db(engine)
+    session = get_session(engine)
+    session.add_all([Product(sku=f"SKU-{i}", name=f"Tea {i}", description="x" * 200) for i in range(n)])
+    session.commit()
+    return path, engine
+
+def test_snapshot_while_writing_then_restore():
+    folder = tempfile.mkdtemp()
+    path, engine = make_db(folder)
+    backups = os.path.join(folder, "backups")
+    writes = []
+
+    def progress(done, total):
+        # An operator commits between backup steps; the writer must not wait for the backup
+        if len(writes) < 3:
+            session = get_session(engine)
+            session.add(Product(sku=f"LIVE-{len(writes)}", name="During backup"))
+            session.commit()
+            session.close()
+            writes.append(done)
+
+    snap = snapshot(path, backups, pages=8, sleep=0, progress=progress)
+    manifest = snap.wait()
+    assert len(writes) == 3 and snap.ok
+    assert manifest["pages"] > 8 and manifest["sha256"] == backup_db.file_sha256(snap.archive)
+    with open(snap.manifest_path) as f:
+        assert json.load(f)["integrity"] == "ok"
+    assert not [n for n in os.listdir(backups) if n.endswith((".db", ".tmp"))]
+
+    dest = os.path.join(folder, "restored.db")
+    restore(snap.archive, dest)
+    conn = sqlite3.connect(dest)
+    # The snapshot is the database as of the start of the backup
+    assert conn.execute("SELECT count(*) FROM products").fetchone()[0] == 2000
+    conn.close()
+    try:
+        restore(snap.archive, dest)
+        assert False, "Expected BackupError"
+    except BackupError:
+        pass
+    assert backup_db.verify_archive(snap.archive) == "ok"
+    assert list_snapshots(backups)[0]["archive"] == snap.archive
+
+def test_retention_policy():
+    start = datetime(2025, 3, 31, 23, 0)  # a Monday
+    snapshots = [{"archive": f"a{i}", "taken_at": (start - timedelta(hours=12 * i)).isoformat(), "integrity": "ok"}
+                 for i in range(40)]
+    snapshots[1]["integrity"] = "*** in database main ***"
+    keep = select_retained(snapshots, keep_last=2, keep_daily=3, keep_weekly=2)
+    # Newest two, then the newest verified snapshot of each of 3 days and 2 ISO weeks.
+    # a1 failed verification, so it is kept only as one of the newest two; Mar 30 is a Sunday (week 13)
+    assert keep == {"a0", "a1", "a2", "a4"}
+
+def test_prune_removes_files():
+    folder = tempfile.mkdtemp()
+    path, _ = make_db(folder, n=10)
+    backups = os.path.join(folder, "backups")
+    snaps = []
+    for i in range(3):
+        snap = snapshot(path, backups)
+        snap.wait()
+        snaps.append(snap)
+        # Distinct timestamps without sleeping: rename to an earlier day
+        manifest = dict(snap.manifest, taken_at=f"2025-01-0{i + 1}T10:00:00")
+        with open(snap.manifest_path, "w") as f:
+            json.dump(manifest, f)
+        os.rename(snap.archive, snap.archive.replace(".db.gz", f"-{i}.db.gz"))
+        os.rename(snap.manifest_path, snap.manifest_path.replace(".json", f"-{i}.json"))
+    removed = prune(backups, keep_last=1, keep_daily=2, keep_weekly=0)
+    assert len(removed) == 1 and removed[0].endswith("-0.db.gz")
+    assert len(list_snapshots(backups)) == 2
+
+if __name__ == "__main__":
+    test_snapshot_while_writing_then_restore()
+    test_retention_policy()
+    test_prune_removes_files()
+    print("SUCCESS: backups verified.")
@@ -0,0 +1,19 @@
+import benchmark
+
+def test_tiny_run_counts_queries_and_flags_regressions():
+    results = benchmark.run(["tiny"], ["convert_invoices", "view_product_details"], repeat=1, progress=lambda msg: None)
+    assert set(results) == {"tiny/convert_invoices", "tiny/view_product_details"}
+    assert all(r["queries"] > 0 and r["seconds"] > 0 for r in results.values())
+
+    baseline = {k: dict(r) for k, r in results.items()}
+    _, regressions = benchmark.compare(results, baseline, tolerance=0.25)
+    assert regressions == []
+
+    # One extra query is a regression even if the timing is identical
+    baseline["tiny/convert_invoices"]["queries"] -= 1
+    _, regressions = benchmark.compare(results, baseline, tolerance=0.25, queries_only=True)
+    assert len(regressions) == 1 and regressions[0].startswith("tiny/convert_invoices: queries")
+
+if __name__ == "__main__":
+    test_tiny_run_counts_queries_and_flags_regressions()
+    print("SUCCESS: benchmark runner verified.")
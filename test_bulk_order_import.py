@@ -0,0 +1,77 @@
+import os
+import tempfile
+from models import get_engine, init_db, get_session, Supplier, Customer, Product, PurchaseOrder, CustomerOrder
+from bulk_order_import import import_orders
+
+PO_SHEET = """po_number,supplier,date,payment_terms,sku,qty,unit,cost,packing_structure
+PO-BULK-1,Bulk Tea Estate,2025-02-01,Net 30,BULK-ASSAM,100,kg,4.5,20kg Sacks
+,,,,BULK-DARJ,50,kg,,
+PO-BULK-2,Bulk Tea Estate,,,BULK-ASSAM,10,kg,4.0,
+,,,,NOPE-SKU,5,kg,1,
+PO-EXISTING,1,,,BULK-ASSAM,1,kg,1,
+PO-BULK-3,Unknown Supplier,,,BULK-ASSAM,1,kg,1,
+PO-BULK-4,1,,,DARJ-NUM-7,3,kg,2,
+"""
+
+CO_SHEET = """invoice_number,customer,po_number,sku,qty,selling_price
+INV-BULK-1,Bulk Chai Cafe,CUST-PO-9,BULK-ASSAM,2,10
+,,,BULK-DARJ,1,
+INV-BULK-2,Bulk Chai Cafe,,BULK-ASSAM,zero,10
+"""
+
+def make_session():
+    engine = get_engine("sqlite://")
+    init_db(engine)
+    session = get_session(engine)
+    session.add_all([
+        Supplier(name="Bulk Tea Estate"),
+        Customer(customer_name="Bulk Chai Cafe"),
+        Product(sku="BULK-ASSAM", name="Assam", unit_price="9.0", cost_price="4.0"),
+        Product(sku="BULK-DARJ", sku_number="DARJ-NUM-7", name="Darjeeling", unit_price="15.0", cost_price="TBD"),
+    ])
+    session.flush()
+    session.add(PurchaseOrder(supplier_id=1, po_number="PO-EXISTING"))
+    session.commit()
+    return session
+
+def write_sheet(text):
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    return path
+
+def test_bulk_po_import():
+    session = make_session()
+    report = import_orders(session, write_sheet(PO_SHEET), "po", batch_size=2)
+
+    created = sorted({r["order"] for r in report if r["status"] == "created"})
+    assert created == ["PO-BULK-1", "PO-BULK-4"]
+
+    errors = {r["row"]: r["message"] for r in report if r["status"] == "error"}
+    assert "Unknown SKU 'NOPE-SKU'" in errors[5]
+    assert "already exists" in errors[6]
+    assert "Unknown supplier" in errors[7]
+
+    po = session.query(PurchaseOrder).filter_by(po_number="PO-BULK-1").one()
+    assert po.payment_terms == "Net 30"
+    assert [(l.qty, l.cost) for l in po.lines] == [(100, 4.5), (50, 0.0)]
+
+    # sku_number resolves too
+    po4 = session.query(PurchaseOrder).filter_by(po_number="PO-BULK-4").one()
+    assert po4.lines[0].product.sku == "BULK-DARJ"
+
+def test_bulk_co_import():
+    session = make_session()
+    report = import_orders(session, write_sheet(CO_SHEET), "co")
+
+    co = session.query(CustomerOrder).filter_by(invoice_number="INV-BULK-1").one()
+    assert co.po_number == "CUST-PO-9"
+    assert [l.amount for l in co.lines] == [20.0, 15.0]
+
+    errors = [r for r in report if r["status"] == "error"]
+    assert len(errors) == 1 and errors[0]["row"] == 4
+
+if __name__ == "__main__":
+    test_bulk_po_import()
+    test_bulk_co_import()
+    print("SUCCESS: bulk order import verified.")
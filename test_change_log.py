@@ -0,0 +1,89 @@
+import os
+import tempfile
+from sqlalchemy import text
+from models import get_engine, get_session, Product, ProductLot, CustomerOrder
+from generate_dataset import generate, SCALES
+import change_log
+import services
+
+def make_db():
+    engine = get_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'app.db')}")
+    generate(engine, seed=11, progress=lambda msg: None, **SCALES["tiny"])
+    return engine, get_session(engine)
+
+def test_orm_changes_are_logged_in_order():
+    engine, session = make_db()
+    start = change_log.latest_seq(session)  # the generator loads with Core and logs nothing
+    assert start == 0
+
+    product = session.query(Product).order_by(Product.id).first()
+    product.lots.append(ProductLot(lot_number="LOT-CDC-1", quantity=5))
+    session.commit()
+    product.name = "Renamed tea"
+    session.commit()
+    lot_id = product.lots[-1].id
+    product.lots.remove(product.lots[-1])  # orphan delete through the cascade
+    session.commit()
+
+    session.add(ProductLot(product_id=product.id, lot_number="LOT-ROLLED-BACK"))
+    session.flush()
+    session.rollback()
+
+    changes = change_log.changes_after(session, start)
+    assert [(c.table, c.operation) for c in changes] == \
+        [("product_lots", "insert"), ("products", "update"), ("product_lots", "delete")]
+    assert [c.seq for c in changes] == sorted(c.seq for c in changes)
+    assert changes[0].data["lot_number"] == "LOT-CDC-1" and changes[0].row_id == lot_id
+    assert changes[1].data == {"id": product.id, "name": "Renamed tea"}
+    assert changes[2].data["quantity"] == 5
+
+def test_core_invoice_conversion_is_logged():
+    engine, session = make_db()
+    co_id = session.query(CustomerOrder.id).filter(CustomerOrder.status == "Pending").first()[0]
+    [invoice_id], errors = services.invoicing.convert_orders(session, [co_id])
+    assert not errors
+    changes = change_log.changes_after(session, 0)
+    ops = [(c.table, c.operation) for c in changes]
+    assert ops[0] == ("customer_orders", "update") and changes[0].data["status"] == "Invoiced"
+    assert ("invoices", "insert") in ops and changes[ops.index(("invoices", "insert"))].row_id == invoice_id
+    with engine.connect() as conn:
+        lines = conn.execute(text("SELECT count(*) FROM invoice_lines WHERE invoice_id = :id"), {"id": invoice_id}).scalar()
+    assert ops.count(("invoice_lines", "insert")) == lines > 0
+
+def test_consumer_reads_in_batches_from_its_cursor():
+    engine, session = make_db()
+    for product in session.query(Product).order_by(Product.id).limit(7):
+        product.reorder_level = 99
+    session.commit()
+
+    seen = []
+    for batch in change_log.batches(session, "reports", batch_size=3):
+        seen.append([c.row_id for c in batch])
+    assert [len(b) for b in seen] == [3, 3, 1]
+    assert change_log.cursor(session, "reports") == change_log.latest_seq(session)
+    assert list(change_log.batches(session, "reports")) == []
+
+    # A consumer that fails mid-batch gets the same batch again
+    session.query(Product).order_by(Product.id).first().reorder_level = 1
+    session.commit()
+    try:
+        for batch in change_log.batches(session, "reports"):
+            raise RuntimeError("sync failed")
+        assert False, "Expected RuntimeError"
+    except RuntimeError:
+        pass
+    [retry] = list(change_log.batches(session, "reports"))
+    assert len(retry) == 1 and retry[0].data["reorder_level"] == 1
+
+    # Another consumer keeps its own position, so nothing is pruned until it catches up
+    change_log.advance(session, "accounting", 2)
+    session.commit()
+    assert change_log.prune(session) == 2
+    assert [name for name, *_ in change_log.consumers(session)] == ["accounting", "reports"]
+    assert change_log.changes_after(session, 0)[0].seq == 3
+
+if __name__ == "__main__":
+    test_orm_changes_are_logged_in_order()
+    test_core_invoice_conversion_is_logged()
+    test_consumer_reads_in_batches_from_its_cursor()
+    print("SUCCESS: change log verified.")
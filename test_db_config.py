@@ -0,0 +1,66 @@
+import os
+import tempfile
+from unittest.mock import patch
+from sqlalchemy import text, inspect
+import db_config
+from copy_database import copy_database, CopyError
+from generate_dataset import generate, SCALES
+from models import get_engine, get_session, CustomerOrder
+
+def test_engine_options_per_dialect():
+    sqlite = db_config.engine_options("sqlite:///./app.db")
+    assert sqlite["connect_args"] == {"check_same_thread": False} and "pool_size" not in sqlite
+    assert "connect_args" not in db_config.engine_options("sqlite://")
+
+    with patch.dict(os.environ, {"ERP_DB_POOL_SIZE": "4"}):
+        mysql = db_config.engine_options("mysql+pymysql://erp:pw@db/erp")
+    assert (mysql["pool_size"], mysql["max_overflow"], mysql["pool_pre_ping"]) == (4, 20, True)
+    assert mysql["connect_args"] == {"charset": "utf8mb4"}
+    pg = db_config.engine_options("postgresql+psycopg2://erp@db/erp", pool_size=25)
+    assert pg["pool_size"] == 25 and pg["insertmanyvalues_page_size"] == 2000
+
+    engine = db_config.create_engine_from_config("mysql+pymysql://erp:pw@db/erp")  # no connection is made
+    assert engine.pool.size() == 10 and engine.dialect.name == "mysql"
+
+    assert db_config.async_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+    assert db_config.async_url("mysql+pymysql://erp:pw@db/erp") == "mysql+aiomysql://erp:pw@db/erp"
+
+def test_url_from_environment():
+    with patch.dict(os.environ, {db_config.ENV_URL: "sqlite:////tmp/other.db"}):
+        assert db_config.database_url() == "sqlite:////tmp/other.db"
+    with patch.dict(os.environ, {db_config.ENV_URL: ""}):
+        assert db_config.database_url() == db_config.DEFAULT_URL
+
+def test_copy_database_streams_every_table():
+    folder = tempfile.mkdtemp()
+    source = get_engine(f"sqlite:///{os.path.join(folder, 'source.db')}")
+    generate(source, seed=3, progress=lambda msg: None, **SCALES["tiny"])
+    with source.begin() as conn:
+        # An extra table outside models.py (like the FTS index) is skipped
+        conn.execute(text("CREATE TABLE scratch (x INTEGER)"))
+    target = get_engine(f"sqlite:///{os.path.join(folder, 'target.db')}")
+
+    messages = []
+    copied = copy_database(source, target, batch_size=97, progress=messages.append)
+    assert copied["customer_order_lines"] > 97 and copied["products"] == 50
+    assert any("scratch" in m for m in messages)
+    assert "scratch" not in inspect(target).get_table_names()
+
+    def snapshot(engine):
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT * FROM customer_orders ORDER BY id")).fetchall()
+    assert snapshot(source) == snapshot(target)
+    assert get_session(target).get(CustomerOrder, 1).customer is not None
+
+    try:
+        copy_database(source, target, progress=messages.append)
+        assert False, "Expected CopyError"
+    except CopyError as e:
+        assert "not empty" in str(e)
+    assert copy_database(source, target, replace=True, progress=messages.append) == copied
+
+if __name__ == "__main__":
+    test_engine_options_per_dialect()
+    test_url_from_environment()
+    test_copy_database_streams_every_table()
+    print("SUCCESS: database configuration and copy verified.")
@@ -0,0 +1,86 @@
+import json
+from models import get_engine, init_db, get_session, Customer, Supplier, CustomerOrder, PurchaseOrder, Product, Document
+import audit
+import change_log
+import dedup
+from dedup import find_duplicates, merge, DedupError
+
+def make_session():
+    engine = get_engine("sqlite://")
+    init_db(engine)
+    return get_session(engine)
+
+def test_normalisation_and_blocking():
+    assert dedup.normalize_name("The Aahaa Chai, LLC.") == "aahaa chai"
+    assert dedup.normalize_name("Test Co Customer") == "test co customer"  # only trailing suffixes go
+    assert dedup.email_domain("Buyer@AahaaChai.com") == "aahaachai.com" and dedup.email_domain("x@gmail.com") is None
+    records = [dedup.Record(1, "aahaa chai", None, None, "92618", None),
+               dedup.Record(2, "aahaa chai house", None, None, None, None),
+               dedup.Record(3, "kettle house", None, None, "92618", None),
+               dedup.Record(4, "brew bar", None, None, None, None)]
+    blocks = dedup.build_blocks(records)
+    assert blocks == {"n:aahaa": [0, 1], "z:92618": [0, 2]}  # record 4 is never compared
+
+def test_find_and_merge_customers():
+    session = make_session()
+    a = Customer(customer_name="Aahaa Chai", email_address="orders@aahaachai.com", ship_to_zip="92618")
+    b = Customer(customer_name="Aahaa Chai LLC", ship_to_phone="(949) 555-0101", ship_to_city="Irvine")
+    c = Customer(customer_name="Aahaa Tea Lounge", ship_to_zip="10001")
+    session.add_all([a, b, c])
+    session.flush()
+    session.add_all([CustomerOrder(customer_id=b.id), CustomerOrder(customer_id=b.id), CustomerOrder(customer_id=a.id)])
+    contract = Document(reference_type="Customer", reference_id=a.id, file_path="contract.pdf")
+    unrelated = Document(reference_type="CustomerOrder", reference_id=a.id, file_path="order.pdf")
+    session.add_all([contract, unrelated])
+    session.commit()
+
+    [proposal] = find_duplicates(session, "customers")
+    # b has more orders, so it survives
+    assert (proposal.keep_id, proposal.drop_id, proposal.score) == (b.id, a.id, 1.0)
+
+    a_id, b_id = a.id, b.id
+    moved = merge(session, "customers", b_id, [a_id])
+    assert moved == {"customer_orders": 1, "lot_shipments": 0, "documents": 1}
+    assert session.get(Customer, a_id) is None
+    survivor = session.get(Customer, b_id)
+    assert survivor.email_address == "orders@aahaachai.com" and survivor.ship_to_zip == "92618"
+    assert session.query(CustomerOrder).filter(CustomerOrder.customer_id == b_id).count() == 3
+    # The customer's documents follow it; a document of another type with the same id does not
+    assert session.get(Document, contract.id).reference_id == b_id
+    assert session.get(Document, unrelated.id).reference_id == a_id
+
+    order = session.query(CustomerOrder).order_by(CustomerOrder.id.desc()).first()
+    assert order.version_id == 2
+    entry = audit.history(session, "customer_order", order.id)[0]
+    assert json.loads(entry.changes) == {"customer_id": [a_id, b_id]}
+    ops = [(ch.table, ch.operation) for ch in change_log.changes_after(session, 0)]
+    assert ("customers", "delete") in ops and ("customer_orders", "update") in ops
+    assert ("documents", "update") in ops
+
+    assert find_duplicates(session, "customers") == []
+    try:
+        merge(session, "customers", b_id, [a_id])
+        assert False, "Expected DedupError"
+    except DedupError as e:
+        assert str(a_id) in str(e)
+
+def test_merge_suppliers_repoints_orders_and_products():
+    session = make_session()
+    s1, s2 = Supplier(name="Assam Estate Pvt. Ltd.", email="sales@assam.example"), Supplier(name="Assam Estate")
+    session.add_all([s1, s2])
+    session.flush()
+    session.add_all([PurchaseOrder(supplier_id=s2.id), Product(sku="A1", name="Assam", supplier_id=s2.id),
+                     Document(reference_type="Supplier", reference_id=s2.id, file_path="price_list.pdf")])
+    session.commit()
+    [proposal] = find_duplicates(session, "suppliers")
+    assert proposal.keep_id in (s1.id, s2.id)
+    moved = merge(session, "suppliers", s1.id, [s2.id])
+    assert moved == {"purchase_orders": 1, "products": 1, "lot_receipts": 0, "documents": 1}
+    assert session.query(Product).one().supplier_id == s1.id
+    assert session.query(Document).one().reference_id == s1.id
+
+if __name__ == "__main__":
+    test_normalisation_and_blocking()
+    test_find_and_merge_customers()
+    test_merge_suppliers_repoints_orders_and_products()
+    print("SUCCESS: deduplication verified.")
@@ -0,0 +1,100 @@
+import os
+import tempfile
+from fpdf import FPDF
+from models import get_engine, init_db, get_session, Document
+import document_store
+import document_search
+
+def make_pdf(folder, name, lines):
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("helvetica", size=12)
+    for line in lines:
+        pdf.cell(0, 10, line, new_x="LMARGIN", new_y="NEXT")
+    path = os.path.join(folder, name)
+    pdf.output(path)
+    return path
+
+def test_index_and_search():
+    engine = get_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'search.db')}")
+    init_db(engine)
+    session = get_session(engine)
+    folder, store = tempfile.mkdtemp(), tempfile.mkdtemp()
+
+    po_pdf = make_pdf(folder, "PO 202540.pdf", ["PO# 202540", "198 kg Paper Sacks", "Lot LOT-2025-014 Assam"])
+    other = make_pdf(folder, "PO 202541.pdf", ["PO# 202541", "Darjeeling first flush", "Lot LOT-2025-015"])
+    notes = os.path.join(folder, "notes.txt")
+    with open(notes, "w") as f:
+        f.write("Customer asked about paper sacks for Assam")
+
+    d1 = document_store.register_document(session, "PurchaseOrder", 1, po_pdf, store_dir=store)
+    d2 = document_store.register_document(session, "PurchaseOrder", 2, other, store_dir=store)
+    d3 = document_store.register_document(session, "CustomerOrder", 7, notes, store_dir=store)
+
+    # Searchable as soon as they are registered; a full rebuild re-extracts all of them
+    assert [h["document_id"] for h in document_search.search(session, "darjeeling")] == [d2.id]
+    assert document_search.index_documents(session) == {"indexed": 0, "removed": 0, "failed": []}
+    summary = document_search.index_documents(session, workers=2, full=True)
+    assert summary == {"indexed": 3, "removed": 0, "failed": []}
+
+    hits = document_search.search(session, "LOT-2025-014")
+    assert [h["document_id"] for h in hits] == [d1.id]
+    assert hits[0]["reference_type"] == "PurchaseOrder" and hits[0]["reference_id"] == 1
+    assert "[LOT-2025-014]" in hits[0]["snippet"]
+
+    # Stemming and multi-word AND queries
+    assert {h["document_id"] for h in document_search.search(session, "sack assam")} == {d1.id, d3.id}
+    assert [h["document_id"] for h in document_search.search(session, "assam", reference_type="CustomerOrder")] == [d3.id]
+    assert document_search.search(session, "") == []
+
+    # Nothing changed: nothing re-extracted
+    assert document_search.index_documents(session)["indexed"] == 0
+
+    # A file registered in place and edited is re-extracted exactly once, and its recorded hash follows it
+    memo = os.path.join(folder, "memo.txt")
+    with open(memo, "w") as f:
+        f.write("Quality hold on paper sacks")
+    d4 = document_store.register_document(session, "CustomerOrder", 7, memo, copy_to_store=False)
+    assert document_search.index_documents(session)["indexed"] == 0
+    with open(memo, "w") as f:
+        f.write("Customer asked about wooden chests for Nilgiri")
+    os.utime(memo, ns=(1, 1_000_000_000))  # a different mtime even on coarse clocks
+    assert document_search.index_documents(session, workers=1)["indexed"] == 1
+    assert session.get(Document, d4.id).sha256 == document_store.file_sha256(memo)
+    assert session.get(Document, d4.id).size_bytes == os.path.getsize(memo)
+    assert [h["document_id"] for h in document_search.search(session, "wooden chest")] == [d4.id]
+    assert document_search.index_documents(session)["indexed"] == 0
+
+    # A store file edited behind our back is reported corrupt; its row and indexed text stay as they were
+    stored_notes = session.get(Document, d3.id).file_path
+    original_sha = session.get(Document, d3.id).sha256
+    with open(stored_notes, "w") as f:
+        f.write("Tampered")
+    os.utime(stored_notes, ns=(3, 3_000_000_000))
+    summary = document_search.index_documents(session, workers=1)
+    assert summary["indexed"] == 0
+    assert len(summary["failed"]) == 1 and "corrupt" in summary["failed"][0]
+    assert session.get(Document, d3.id).sha256 == original_sha
+    assert not document_store.verify(session.get(Document, d3.id))
+    assert [h["document_id"] for h in document_search.search(session, "assam", reference_type="CustomerOrder")] == [d3.id]
+
+    # Uploading the original again restores the stored file; nothing needs re-extracting
+    again = document_store.register_document(session, "CustomerOrder", 7, notes, store_dir=store)
+    assert again.id == d3.id and document_store.verify(again)
+    assert document_search.index_documents(session) == {"indexed": 0, "removed": 0, "failed": []}
+
+    # Touched but unchanged: not re-extracted, then skipped without hashing
+    os.utime(session.get(Document, d1.id).file_path, ns=(2, 2_000_000_000))
+    assert document_search.index_documents(session)["indexed"] == 0
+    assert document_search.documents_to_index(session) == []
+
+    # A deleted document is dropped from the index
+    session.delete(d2)
+    session.commit()
+    summary = document_search.index_documents(session, workers=1)
+    assert (summary["indexed"], summary["removed"]) == (0, 1)
+    assert document_search.search(session, "darjeeling") == []
+
+if __name__ == "__main__":
+    test_index_and_search()
+    print("SUCCESS: document full-text search verified.")
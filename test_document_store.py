@@ -0,0 +1,65 @@
+import os
+import tempfile
+from models import get_engine, init_db, get_session
+import document_store
+
+def write_file(name, content):
+    path = os.path.join(tempfile.mkdtemp(), name)
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+def test_register_and_lookup():
+    engine = get_engine("sqlite://")
+    init_db(engine)
+    session = get_session(engine)
+    store = tempfile.mkdtemp()
+
+    scan = write_file("Signed PO.pdf", b"%PDF-1.4 signed")
+    doc = document_store.register_document(session, "PurchaseOrder", 5, scan, "Signed copy", store_dir=store)
+    assert doc.original_name == "Signed PO.pdf"
+    assert doc.mime_type == "application/pdf"
+    assert doc.size_bytes == 15
+    assert doc.created_at is not None
+
+    # Stored under two hash-prefix shard directories
+    rel = os.path.relpath(doc.file_path, store).split(os.sep)
+    assert rel[0] == doc.sha256[:2] and rel[1] == doc.sha256[2:4]
+    assert document_store.verify(doc)
+
+    # Same content uploaded against another order shares the stored file
+    copy = write_file("copy.pdf", b"%PDF-1.4 signed")
+    dup = document_store.register_document(session, "CustomerOrder", 9, copy, store_dir=store)
+    assert dup.file_path == doc.file_path
+    assert len(document_store.find_by_hash(session, doc.sha256)) == 2
+
+    # Generated files are registered in place
+    sheet = write_file("Invoice 1.xlsx", b"xlsx")
+    gen = document_store.register_document(session, "PurchaseOrder", 5, sheet, copy_to_store=False)
+    assert gen.file_path == sheet
+
+    assert [d.id for d in document_store.documents_for(session, "PurchaseOrder", 5)] == [gen.id, doc.id]
+    assert document_store.documents_for(session, "PurchaseOrder", 6) == []
+
+    with open(sheet, "ab") as f:
+        f.write(b"tampered")
+    assert not document_store.verify(gen)
+
+    # Regenerated at the same path: the existing row is refreshed, not duplicated
+    again = document_store.register_document(session, "PurchaseOrder", 5, sheet, copy_to_store=False)
+    assert again.id == gen.id and again.size_bytes == 12 and document_store.verify(again)
+    assert len(document_store.documents_for(session, "PurchaseOrder", 5)) == 2
+
+def test_lookup_uses_reference_index():
+    engine = get_engine("sqlite://")
+    init_db(engine)
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT * FROM documents WHERE reference_type = 'PurchaseOrder' AND reference_id = 1"
+        ).fetchall()
+    assert "ix_documents_reference" in " ".join(str(r) for r in plan)
+
+if __name__ == "__main__":
+    test_register_and_lookup()
+    test_lookup_uses_reference_index()
+    print("SUCCESS: document repository verified.")
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, text
+from models import get_engine, init_db, get_session, Product, ProductLot, ExpiryAlert
+import expiry_monitor
+from expiry_monitor import expiring_by_product, expiring_by_warehouse, expiring_lots, raise_alerts
+
+AS_OF = datetime(2025, 6, 1)
+
+def make_session():
+    engine = get_engine("sqlite://")
+    init_db(engine)
+    session = get_session(engine)
+    green, black = Product(sku="GRN", name="Sencha"), Product(sku="BLK", name="Assam")
+    session.add_all([green, black])
+    session.flush()
+    def lot(product, number, days, qty, warehouse=None):
+        return ProductLot(product_id=product.id, lot_number=number, quantity=qty, cost_price=2.0,
+                          warehouse=warehouse, expiration_date=AS_OF + timedelta(days=days))
+    session.add_all([
+        lot(green, "G-OLD", -3, 5),
+        lot(green, "G-SOON", 10, 20, "Bonded-LA"),
+        lot(green, "G-LATER", 45, 30),
+        lot(green, "G-EMPTY", 5, 0),
+        lot(black, "B-SOON", 20, 8, "Bonded-LA"),
+        lot(black, "B-FRESH", 400, 100),
+        ProductLot(product_id=black.id, lot_number="B-NODATE", quantity=7),
+    ])
+    session.commit()
+    return session
+
+def test_reports_by_product_warehouse_and_lot():
+    session = make_session()
+    by_product = {r.sku: r for r in expiring_by_product(session, 30, AS_OF)}
+    assert (by_product["GRN"].lots, by_product["GRN"].quantity, by_product["GRN"].value) == (2, 25, 50.0)
+    assert by_product["BLK"].quantity == 8
+    assert [tuple(r[:4]) for r in expiring_by_warehouse(session, 30, AS_OF)] == [("(main)", 1, 1, 5), ("Bonded-LA", 2, 2, 28)]
+    lots = expiring_lots(session, 60, AS_OF, warehouse="(main)")
+    assert [(r.lot_number, r[-1]) for r in lots] == [("G-OLD", "expired"), ("G-LATER", "warning")]
+    assert [r.sku for r in expiring_by_product(session, 30, AS_OF, warehouse="Bonded-LA")] == ["GRN", "BLK"]
+
+def test_expiry_scan_uses_partial_covering_index():
+    session = make_session()
+    query = select(ProductLot.product_id, ProductLot.quantity).where(expiry_monitor._expiring(AS_OF, 30))
+    compiled = query.compile(session.get_bind(), compile_kwargs={"literal_binds": True})
+    plan = " ".join(row[-1] for row in session.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+    assert "USING COVERING INDEX ix_product_lots_expiry" in plan, plan
+
+def test_alerts_escalate_without_duplicates():
+    session = make_session()
+    assert raise_alerts(session, 30, AS_OF) == (3, 0)  # G-OLD expired, G-SOON critical, B-SOON warning
+    assert raise_alerts(session, 30, AS_OF) == (0, 0)
+    # Two weeks later B-SOON becomes critical; G-SOON sold out in the meantime
+    g_soon = session.query(ProductLot).filter_by(lot_number="G-SOON").one()
+    g_soon.quantity = 0
+    session.commit()
+    raised, closed = raise_alerts(session, 30, AS_OF + timedelta(days=14))
+    assert (raised, closed) == (1, 1)  # B-SOON escalated to critical; G-SOON's alert closed
+    b_soon = session.query(ProductLot).filter_by(lot_number="B-SOON").one()
+    assert sorted(a.severity for a in session.query(ExpiryAlert).filter_by(lot_id=b_soon.id)) == ["critical", "warning"]
+    open_ids = [r.id for r in expiry_monitor.open_alerts(session)]
+    assert len(open_ids) == 3 and expiry_monitor.acknowledge(session, open_ids[:2]) == 2
+    assert expiry_monitor.acknowledge(session, open_ids[:2]) == 0
+    assert len(expiry_monitor.open_alerts(session)) == 1
+
+if __name__ == "__main__":
+    test_reports_by_product_warehouse_and_lot()
+    test_expiry_scan_uses_partial_covering_index()
+    test_alerts_escalate_without_duplicates()
+    print("SUCCESS: expiry monitoring verified.")
@@ -0,0 +1,90 @@
+import os
+import tempfile
+from models import get_engine, init_db, get_session, Customer, Product, CustomerOrder, Invoice, InvoiceLine
+import services
+from services import ValidationError
+
+def make_session():
+    engine = get_engine("sqlite://")
+    init_db(engine)
+    session = get_session(engine)
+    session.add_all([Customer(customer_name="Invoice Cafe"), Product(sku="INVC-1", name="Invoice Tea")])
+    session.commit()
+    return session
+
+def add_order(session, invoice_number=None, lines=1):
+    return services.create_co(session, 1, {"invoice_number": invoice_number, "shipping": 5.0},
+                              [{"product_id": 1, "qty": 2, "selling_price": 10.0}] * lines)
+
+def test_batch_conversion():
+    session = make_session()
+    add_order(session, "INV-KEEP-1", lines=2)
+    for _ in range(4):
+        add_order(session)
+    cancelled = add_order(session)
+    cancelled.status = "Cancelled"
+    session.commit()
+
+    invoice_ids, errors = services.invoicing.convert_orders(session, batch_size=2)
+    assert errors == []
+    assert len(invoice_ids) == 5
+    assert session.query(InvoiceLine).count() == 6
+    assert session.query(CustomerOrder).filter_by(status="Invoiced").count() == 5
+
+    # Typed invoice numbers are kept, blank ones come from the sequence
+    numbers = sorted(co.invoice_number for co in session.query(CustomerOrder).filter_by(status="Invoiced"))
+    assert numbers[-1] == "INV-KEEP-1"
+    assert all(n.startswith("INV-") for n in numbers)
+
+    inv = session.get(Invoice, invoice_ids[0])
+    data = services.invoicing.invoice_data(inv)
+    assert data["id"] == "INV-KEEP-1"
+    assert data["total_amount"] == 45.0
+    assert [l["total"] for l in data["lines"]] == [20.0, 20.0]
+
+    # Nothing pending is left, and converting twice is rejected
+    assert services.invoicing.convert_orders(session) == ([], [])
+    try:
+        services.invoicing.convert_order(session, 1)
+        assert False, "Expected ValidationError"
+    except ValidationError as e:
+        assert "expected Pending" in e.errors[0]
+
+def test_failed_batch_rolls_back_alone():
+    session = make_session()
+    good = add_order(session)
+    empty = add_order(session)
+    empty.lines.clear()
+    session.commit()
+
+    invoice_ids, errors = services.invoicing.convert_orders(session, [empty.id, good.id], batch_size=1)
+    assert len(invoice_ids) == 1
+    assert "has no lines" in errors[0]
+    assert session.get(CustomerOrder, empty.id).status == "Pending"
+    assert session.get(CustomerOrder, good.id).status == "Invoiced"
+
+def test_invalid_order_does_not_hold_up_its_batch():
+    session = make_session()
+    first, empty, last = add_order(session), add_order(session), add_order(session)
+    empty.lines.clear()
+    session.commit()
+
+    invoice_ids, errors = services.invoicing.convert_orders(session, [first.id, empty.id, 999, last.id])
+    assert len(invoice_ids) == 2
+    assert errors == ["CO 999: not found", f"CO {empty.id}: has no lines"]
+    assert [session.get(CustomerOrder, co.id).status for co in (first, empty, last)] == ["Invoiced", "Pending", "Invoiced"]
+    assert session.query(Invoice).count() == 2
+
+def test_render_pdf():
+    session = make_session()
+    add_order(session, "INV-PDF-1")
+    invoice_ids, _ = services.invoicing.convert_orders(session)
+    paths = services.invoicing.render_invoice_pdfs(session, invoice_ids, tempfile.mkdtemp())
+    assert len(paths) == 1 and os.path.exists(paths[0])
+
+if __name__ == "__main__":
+    test_batch_conversion()
+    test_failed_batch_rolls_back_alone()
+    test_invalid_order_does_not_hold_up_its_batch()
+    test_render_pdf()
+    print("SUCCESS: CO to invoice conversion verified.")
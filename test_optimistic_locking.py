@@ -0,0 +1,69 @@
+import os
+import tempfile
+from models import get_engine, init_db, get_session, Supplier, Product, PurchaseOrder
+import services
+from services import ConcurrencyConflict
+
+def make_db():
+    path = os.path.join(tempfile.mkdtemp(), "locking.db")
+    engine = get_engine(f"sqlite:///{path}")
+    init_db(engine)
+    session = get_session(engine)
+    session.add_all([Supplier(name="Lock Supplier"), Product(sku="LOCK-1", name="Lock Tea")])
+    session.commit()
+    services.create_po(session, 1, {"po_number": "PO-LOCK-1"}, [{"product_id": 1, "qty": 1, "cost": 1.0}])
+    session.close()
+    return engine
+
+def test_disjoint_edits_are_merged():
+    engine = make_db()
+    alice, bob = get_session(engine), get_session(engine)
+    po_a = alice.query(PurchaseOrder).one()
+    po_b = bob.query(PurchaseOrder).one()
+
+    services.update_po(alice, po_a, {"payment_terms": "Net 30", "notes": None})
+    # Bob's copy is stale, but he only changed a different field
+    services.update_po(bob, po_b, {"incoterm": "FOB", "payment_terms": po_b.payment_terms})
+
+    check = get_session(engine).query(PurchaseOrder).one()
+    assert check.payment_terms == "Net 30"
+    assert check.incoterm == "FOB"
+    assert check.version_id == 3
+
+def test_same_field_edits_conflict():
+    engine = make_db()
+    alice, bob = get_session(engine), get_session(engine)
+    po_a = alice.query(PurchaseOrder).one()
+    po_b = bob.query(PurchaseOrder).one()
+
+    services.update_po(alice, po_a, {"payment_terms": "Net 30"})
+    try:
+        services.update_po(bob, po_b, {"payment_terms": "Net 60"})
+        assert False, "Expected ConcurrencyConflict"
+    except ConcurrencyConflict as e:
+        assert e.conflicts == {"payment_terms": ("Net 60", "Net 30")}
+        # Bob's object now shows Alice's version; he can choose to keep his value
+        assert po_b.payment_terms == "Net 30"
+
+    services.update_po(bob, po_b, {"payment_terms": "Net 60"})
+    assert get_session(engine).query(PurchaseOrder).one().payment_terms == "Net 60"
+
+def test_stale_product_update_detected():
+    engine = make_db()
+    s1, s2 = get_session(engine), get_session(engine)
+    p1 = s1.query(Product).one()
+    p2 = s2.query(Product).one()
+
+    p1.unit_price = "5.0"
+    s1.commit()
+    try:
+        services.save_changes(s2, p2, {"unit_price": "7.0"})
+        assert False, "Expected ConcurrencyConflict"
+    except ConcurrencyConflict as e:
+        assert "unit_price" in e.conflicts
+
+if __name__ == "__main__":
+    test_disjoint_edits_are_merged()
+    test_same_field_edits_conflict()
+    test_stale_product_update_detected()
+    print("SUCCESS: optimistic locking verified.")
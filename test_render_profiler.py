@@ -0,0 +1,57 @@
+import json
+import os
+import tempfile
+from unittest.mock import patch
+import render_profiler
+import render_queue
+from test_render_queue import make_db
+
+def busy_render(session, target_id, progress):
+    def checksum(n):
+        return sum(i * i % 7 for i in range(n))
+    for _ in range(40):
+        checksum(20000)
+    path = os.path.join(tempfile.mkdtemp(), f"doc_{target_id}.pdf")
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4")
+    return path
+
+def run_profiled_job(mode):
+    _, session = make_db()
+    job = render_queue.enqueue(session, "po_pdf", 1)
+    with patch.dict(render_queue.RENDERERS, {"po_pdf": busy_render}), \
+            patch.dict(os.environ, {render_profiler.ENV_FLAG: mode}):
+        assert render_queue.work(session, "test-worker") == 1
+    session.refresh(job)
+    assert job.status == "Done"
+    return job.result_path
+
+def test_sampling_profile_written_next_to_document():
+    doc = run_profiled_job("sample")
+    with open(doc + ".collapsed.txt") as f:
+        lines = f.read().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("busy_render (test_render_profiler.py" in line and "checksum" in line for line in lines)
+
+    with open(doc + ".speedscope.json") as f:
+        data = json.load(f)
+    profile = data["profiles"][0]
+    assert profile["type"] == "sampled" and len(profile["samples"]) == len(profile["weights"])
+    names = {frame["name"] for frame in data["shared"]["frames"]}
+    assert {"run_job", "busy_render", "checksum"} <= names
+
+def test_cprofile_mode_and_disabled():
+    doc = run_profiled_job("cprofile")
+    assert os.path.exists(doc + ".prof")
+    with open(doc + ".prof.txt") as f:
+        assert "checksum" in f.read()
+
+    with patch.dict(os.environ, {render_profiler.ENV_FLAG: ""}):
+        with render_profiler.profile("off") as prof:
+            prof.document = os.path.join(tempfile.mkdtemp(), "x.pdf")
+    assert prof.mode is None and prof.outputs == []
+
+if __name__ == "__main__":
+    test_sampling_profile_written_next_to_document()
+    test_cprofile_mode_and_disabled()
+    print("SUCCESS: render profiler verified.")
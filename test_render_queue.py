@@ -0,0 +1,156 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from models import get_engine, init_db, get_session, Customer, Product, RenderJob
+import services
+import render_queue
+import document_store
+
+def make_db():
+    path = os.path.join(tempfile.mkdtemp(), "render.db")
+    engine = get_engine(f"sqlite:///{path}")
+    init_db(engine)
+    session = get_session(engine)
+    session.add_all([Customer(customer_name="Render Cafe"), Product(sku="RND-1", name="Render Tea")])
+    session.commit()
+    return f"sqlite:///{path}", session
+
+def test_retry_then_fail_and_notify():
+    _, session = make_db()
+    calls = []
+    out_path = os.path.join(tempfile.mkdtemp(), "doc_7.pdf")
+
+    def flaky(session, target_id, progress):
+        calls.append(target_id)
+        progress(50)
+        if len(calls) == 1:
+            raise RuntimeError("Excel busy")
+        with open(out_path, "wb") as f:
+            f.write(b"%PDF-1.4")
+        return out_path
+
+    def broken(session, target_id, progress):
+        raise RuntimeError("template missing")
+
+    original = dict(render_queue.RENDERERS)
+    render_queue.RENDERERS.update({"po_pdf": flaky, "invoice_excel": broken})
+    try:
+        job = render_queue.enqueue(session, "po_pdf", 7)
+        # Enqueueing the same document again returns the pending job
+        assert render_queue.enqueue(session, "po_pdf", 7).id == job.id
+        failing = render_queue.enqueue(session, "invoice_excel", 3, max_attempts=1)
+
+        assert render_queue.work(session, "test") == 2
+        session.refresh(job)
+        assert job.status == "Queued" and job.attempts == 1 and "Excel busy" in job.message
+
+        # Backoff: not runnable until run_after passes
+        assert render_queue.work(session, "test") == 0
+        job.run_after = datetime.utcnow() - timedelta(seconds=1)
+        session.commit()
+        assert render_queue.work(session, "test") == 1
+        session.refresh(job)
+        assert (job.status, job.progress, job.result_path) == ("Done", 100, out_path)
+
+        done = {j.id: j.status for j in render_queue.pop_notifications(session)}
+        assert done == {job.id: "Done", failing.id: "Failed"}
+        assert render_queue.pop_notifications(session) == []
+
+        assert render_queue.retry(session, failing.id)
+        assert session.get(RenderJob, failing.id).status == "Queued"
+
+        # Rendering the same PO again overwrites its file and reuses its document row
+        again = render_queue.enqueue(session, "po_pdf", 7)
+        render_queue.work(session, "test")
+        assert session.get(RenderJob, again.id).status == "Done"
+        docs = document_store.documents_for(session, "PurchaseOrder", 7)
+        assert len(docs) == 1 and docs[0].file_path == out_path
+    finally:
+        render_queue.RENDERERS.clear()
+        render_queue.RENDERERS.update(original)
+
+def test_stale_running_job_requeued():
+    _, session = make_db()
+    job = render_queue.enqueue(session, "po_pdf", 1)
+    assert render_queue.claim_next(session, "w1").id == job.id
+    # Already claimed: a second worker gets nothing
+    assert render_queue.claim_next(session, "w2") is None
+
+    job.started_at = datetime.utcnow() - timedelta(hours=1)
+    session.commit()
+    assert render_queue.requeue_stale(session) == 1
+    assert render_queue.claim_next(session, "w2").id == job.id
+
+def test_jobs_of_dead_local_workers_requeued_at_once():
+    _, session = make_db()
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    host = socket.gethostname()
+    workers = {"crashed": f"{host}:{exited.pid}", "alive": f"{host}:{os.getpid()}", "remote": "other-host:1"}
+    jobs = {}
+    for name, worker in workers.items():
+        jobs[name] = render_queue.enqueue(session, "po_pdf", len(jobs) + 1)
+        assert render_queue.claim_next(session, worker).id == jobs[name].id
+
+    # Just started: only the job whose local process has exited goes back to the queue
+    assert render_queue.requeue_stale(session) == 1
+    session.expire_all()
+    assert {name: job.status for name, job in jobs.items()} == {"crashed": "Queued", "alive": "Running", "remote": "Running"}
+
+    # Past STALE_AFTER: the remote job is re-queued, the live local worker keeps its long render
+    for name in ("alive", "remote"):
+        jobs[name].started_at = datetime.utcnow() - timedelta(hours=2)
+    session.commit()
+    assert render_queue.requeue_stale(session) == 1
+    session.expire_all()
+    assert (jobs["alive"].status, jobs["remote"].status) == ("Running", "Queued")
+
+def test_enqueue_many_skips_pending_targets():
+    _, session = make_db()
+    render_queue.enqueue(session, "po_pdf", 1)
+    render_queue.enqueue(session, "po_pdf", 2)
+    assert render_queue.claim_next(session, "w1").target_id == 1
+    assert render_queue.enqueue_many(session, "po_pdf", [1, 2, 3, 3, 4]) == 2
+    assert render_queue.enqueue_many(session, "po_pdf", [1, 2, 3, 4]) == 0
+    assert render_queue.enqueue_many(session, "invoice_pdf", [1]) == 1  # other kind, other document
+    targets = sorted(j.target_id for j in session.query(RenderJob).filter_by(kind="po_pdf"))
+    assert targets == [1, 2, 3, 4]
+
+def test_worker_pool_renders_in_background():
+    db_url, session = make_db()
+    for _ in range(3):
+        services.create_co(session, 1, {}, [{"product_id": 1, "qty": 1, "selling_price": 5.0}])
+    invoice_ids, _ = services.invoicing.convert_orders(session)
+    render_queue.enqueue_many(session, "invoice_pdf", invoice_ids)
+
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp())  # renderers write to ./erp_pdfs
+    pool = render_queue.WorkerPool(db_url, workers=2, poll_interval=0.1).start()
+    try:
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            session.expire_all()
+            if session.query(RenderJob).filter(RenderJob.status != "Done").count() == 0:
+                break
+            time.sleep(0.2)
+        jobs = session.query(RenderJob).all()
+        assert [j.status for j in jobs] == ["Done"] * 3, [(j.status, j.message) for j in jobs]
+        assert all(os.path.exists(j.result_path) for j in jobs)
+        # Each output is registered against its invoice
+        docs = document_store.documents_for(session, "Invoice", invoice_ids[0])
+        assert len(docs) == 1 and docs[0].mime_type == "application/pdf" and docs[0].size_bytes > 0
+    finally:
+        pool.stop()
+        os.chdir(cwd)
+
+if __name__ == "__main__":
+    test_retry_then_fail_and_notify()
+    test_stale_running_job_requeued()
+    test_jobs_of_dead_local_workers_requeued_at_once()
+    test_enqueue_many_skips_pending_targets()
+    test_worker_pool_renders_in_background()
+    print("SUCCESS: render queue verified.")
@@ -0,0 +1,85 @@
+from models import get_engine, init_db, get_session, Supplier, Customer, Product, PurchaseOrder, CustomerOrder
+import services
+from services import ValidationError
+
+def make_session():
+    engine = get_engine("sqlite://")
+    init_db(engine)
+    session = get_session(engine)
+    session.add_all([
+        Supplier(name="Svc Supplier"),
+        Customer(customer_name="Svc Customer"),
+        Product(sku="SVC-1", name="Svc Tea", unit_price="12.0", cost_price="6.0"),
+        Product(sku="SVC-2", name="Svc Chai", unit_price="TBD", cost_price="TBD"),
+    ])
+    session.commit()
+    return session
+
+def test_create_po_and_co():
+    session = make_session()
+
+    po = services.create_po(session, 1, {"po_number": "PO-SVC-1", "date": "2025-03-01"}, [
+        {"product_id": 1, "qty": 10, "cost": 6.0, "unit": "kg"},
+        {"product_id": 2, "qty": "5", "cost": "7.5"},
+    ])
+    assert po.id is not None
+    assert po.status == "Draft"
+    assert [l.description for l in po.lines] == ["Svc Tea", "Svc Chai"]
+
+    co = services.create_co(session, 1, {"invoice_number": "INV-SVC-1"}, [
+        {"product_id": 1, "qty": 3, "selling_price": 12.0},
+    ])
+    assert co.lines[0].amount == 36.0
+    assert co.status == "Pending"
+
+def test_validation_reports_every_problem():
+    session = make_session()
+    services.create_po(session, 1, {"po_number": "PO-DUP"}, [{"product_id": 1, "qty": 1, "cost": 1}])
+
+    try:
+        services.create_po(session, 99, {"po_number": "PO-DUP", "status": "Bogus"}, [
+            {"product_id": 42, "qty": 1, "cost": 1},
+            {"product_id": 1, "qty": 0, "cost": 1},
+        ])
+        assert False, "Expected ValidationError"
+    except ValidationError as e:
+        text = " | ".join(e.errors)
+        assert "supplier 99 not found" in text
+        assert "already exists" in text
+        assert "invalid status" in text
+        assert "product 42 not found" in text
+        assert "positive whole number" in text
+
+    assert session.query(PurchaseOrder).count() == 1
+
+def test_update_po_validates_before_applying():
+    session = make_session()
+    po = services.create_po(session, 1, {"po_number": "PO-UPD"}, [{"product_id": 1, "qty": 1, "cost": 1}])
+
+    try:
+        services.update_po(session, po, {"notes": "changed", "shipping_cost": "abc"})
+        assert False, "Expected ValidationError"
+    except ValidationError:
+        pass
+    assert po.notes is None
+
+    services.update_po(session, po, {"notes": "changed", "shipping_cost": "12.5", "status": "Sent"})
+    assert po.shipping_cost == 12.5 and po.status == "Sent"
+
+def test_add_product_price_rules():
+    session = make_session()
+    p = services.add_product(session, {"sku": "SVC-3", "unit_price": "tbd"})
+    assert p.unit_price == "TBD"
+
+    try:
+        services.add_product(session, {"sku": "SVC-3", "unit_price": "free"})
+        assert False, "Expected ValidationError"
+    except ValidationError as e:
+        assert len(e.errors) == 2
+
+if __name__ == "__main__":
+    test_create_po_and_co()
+    test_validation_reports_every_problem()
+    test_update_po_validates_before_applying()
+    test_add_product_price_rules()
+    print("SUCCESS: service layer verified.")
@@ -0,0 +1,55 @@
+import os
+import tempfile
+from sqlalchemy import event
+from models import get_engine, init_db, get_session, Supplier, PurchaseOrder
+import sql_profiler
+from sql_profiler import fingerprint
+
+def test_fingerprint_ignores_literals():
+    a = fingerprint("SELECT * FROM products WHERE id = 12 AND sku = 'AB''C'")
+    b = fingerprint("SELECT *  FROM products\n WHERE id = 7 AND sku = 'X'")
+    assert a == b == "SELECT * FROM products WHERE id = ? AND sku = ?"
+    assert fingerprint("SELECT x FROM t WHERE id IN (?, ?, ?)") == fingerprint("SELECT x FROM t WHERE id IN (?, ?)")
+    # Identifiers containing digits are left alone
+    assert "col2" in fingerprint("SELECT col2 FROM t1")
+
+def test_disabled_attaches_nothing():
+    sql_profiler.disable()
+    engine = get_engine("sqlite://")
+    assert not event.contains(engine, "before_cursor_execute", sql_profiler.Profiler()._before)
+    assert sql_profiler.get_profiler() is None
+
+def test_profiler_counts_screens_and_flags_n_plus_one():
+    log_path = os.path.join(tempfile.mkdtemp(), "sql.log")
+    profiler = sql_profiler.enable(log_path=log_path, n_plus_one=5, slow_ms=10_000)
+    try:
+        engine = get_engine("sqlite://")
+        init_db(engine)
+        session = get_session(engine)
+        session.add_all([PurchaseOrder(po_number=f"PO-{i}", supplier=Supplier(name=f"S{i}")) for i in range(8)])
+        session.commit()
+        session.expunge_all()
+
+        with sql_profiler.operation("list_orders"):
+            for po in session.query(PurchaseOrder).all():
+                po.supplier.name  # lazy load per row
+        with sql_profiler.operation("list_orders_eager"):
+            session.expunge_all()
+            session.query(Supplier).all()
+    finally:
+        sql_profiler.disable()
+
+    runs, queries, _ = profiler.screens["list_orders"]
+    assert (runs, queries) == (1, 9)
+    assert profiler.screens["list_orders_eager"][1] == 1
+    [(screen, fp)] = profiler.suspects
+    assert screen == "list_orders" and fp.startswith("SELECT suppliers.") and profiler.suspects[(screen, fp)] == 8
+    assert "Possible N+1 queries" in profiler.report()
+    with open(log_path) as f:
+        assert "N+1 in list_orders: 8 x SELECT suppliers." in f.read()
+
+if __name__ == "__main__":
+    test_fingerprint_ignores_literals()
+    test_disabled_attaches_nothing()
+    test_profiler_counts_screens_and_flags_n_plus_one()
+    print("SUCCESS: SQL profiler verified.")
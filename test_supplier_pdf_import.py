@@ -0,0 +1,75 @@
+import os
+import tempfile
+from fpdf import FPDF
+from models import get_engine, init_db, get_session, Supplier, Product, PurchaseOrder
+import document_store
+import supplier_pdf_import
+from supplier_pdf_import import import_pdfs
+
+DENMAN_PDF = os.path.join(os.path.dirname(os.path.abspath(__file__)), "erp_documents",
+                          "PO 202540R MO Denman Island Tea Co.pdf")
+
+def make_session():
+    engine = get_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pdf_import.db')}")
+    init_db(engine)
+    session = get_session(engine)
+    session.add_all([
+        Supplier(name="Mana Organics Pvt. Ltd."),
+        Supplier(name="Hill Estate Teas"),
+        Product(sku="1234", name="TGFOP1", cost_price="4.25"),
+        Product(sku="DARJ-FF", name="Darjeeling First Flush", cost_price="TBD"),
+        Product(sku="NIL-BOP", name="Nilgiri BOP", cost_price="3.0"),
+    ])
+    session.commit()
+    return session
+
+def make_pdf(lines):
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("helvetica", size=11)
+    for line in lines:
+        pdf.cell(0, 8, line, new_x="LMARGIN", new_y="NEXT")
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    pdf.output(path)
+    return path
+
+def test_parse_denman_pdf():
+    session = make_session()
+    index = supplier_pdf_import.build_product_index(session)
+    result = supplier_pdf_import.parse_pdfs([DENMAN_PDF], index, supplier_pdf_import.build_supplier_index(session))[0]
+    assert result["errors"] == []
+    assert result["header"]["vendor_reference"] == "202540"
+    assert result["header"]["date"].strftime("%Y-%m-%d") == "2025-12-09"
+    assert (result["header"]["shipping_method"], result["header"]["incoterm"]) == ("DHL", "CIF")
+    assert result["supplier_id"] == 1
+    assert result["lines"] == [{"qty": "198", "unit": "kg", "packing_structure": "Paper Sacks",
+                                "product_id": 1, "description": "Organic Assam Tea Grade TGFOP1"}]
+
+def test_import_batch_in_parallel():
+    session = make_session()
+    store = tempfile.mkdtemp()
+    good = make_pdf(["Hill Estate Teas", "Invoice # HE-881", "Date 2025-03-04", "Payment Terms: Net 45",
+                     "40 kg Darjeeling First Flush $12.50 $500.00", "10 kg Nilgiri BOP"])
+    unknown = make_pdf(["Hill Estate Teas", "Invoice # HE-882", "5 kg Mystery Blend"])
+    report = import_pdfs(session, [good, unknown, DENMAN_PDF], workers=2, store_dir=store)
+    # Same PDF again is recognised by supplier + vendor reference
+    again = import_pdfs(session, [good], workers=1, store_dir=store)
+
+    status = {os.path.basename(r["file"]): r["status"] for r in report}
+    assert status == {os.path.basename(good): "created", os.path.basename(unknown): "error",
+                      os.path.basename(DENMAN_PDF): "created"}
+    assert "No product matched" in [r for r in report if r["status"] == "error"][0]["message"]
+    assert again[0]["status"] == "skipped"
+
+    po = session.query(PurchaseOrder).filter_by(vendor_reference="HE-881").one()
+    assert po.status == "Draft" and po.supplier.name == "Hill Estate Teas"
+    assert po.payment_terms == "Net 45"
+    assert [(l.product.sku, l.qty, l.cost) for l in po.lines] == [("DARJ-FF", 40, 12.5), ("NIL-BOP", 10, 3.0)]
+    assert po.po_number.startswith("PO-")
+    assert len(document_store.documents_for(session, "PurchaseOrder", po.id)) == 1
+
+if __name__ == "__main__":
+    test_parse_denman_pdf()
+    test_import_batch_in_parallel()
+    print("SUCCESS: supplier PDF import verified.")
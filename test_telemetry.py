@@ -0,0 +1,64 @@
+import os
+import tempfile
+import time
+from models import get_engine, init_db, get_session, Supplier
+import telemetry
+
+def test_screens_record_active_time_db_and_rows():
+    path = os.path.join(tempfile.mkdtemp(), "metrics.db")
+    engine = get_engine("sqlite://")
+    init_db(engine)
+    session = get_session(engine)
+    session.add_all([Supplier(name=f"S{i}") for i in range(3)])
+    session.commit()
+
+    assert telemetry.enable(path)
+    telemetry.instrument(engine)
+    try:
+        with telemetry.screen("supplier_menu", kind="menu"):
+            for _ in range(4):
+                with telemetry.screen("list_suppliers") as span:
+                    session.expunge_all()
+                    session.query(Supplier).all()
+                    with telemetry.waiting():
+                        time.sleep(0.02)  # operator reading the screen
+                    with telemetry.rendering():
+                        time.sleep(0.005)
+                assert span.queries == 1 and span.rows == 3 and span.input >= 0.02
+        try:
+            with telemetry.screen("broken"):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+        # Outside a screen nothing is collected
+        session.query(Supplier).all()
+    finally:
+        telemetry.disable()
+
+    stats = {s["screen"]: s for s in telemetry.screen_stats(path)}
+    assert set(stats) == {"supplier_menu", "list_suppliers", "broken"}
+    listing = stats["list_suppliers"]
+    assert listing["count"] == 4 and listing["kind"] == "action"
+    assert (listing["queries"], listing["rows"]) == (1, 3)
+    assert listing["render_ms"] >= 5
+    # Prompt time is excluded from the percentiles
+    assert listing["p50"] <= listing["p95"] <= listing["p99"] < 20
+    assert stats["supplier_menu"]["queries"] == 4
+    assert stats["broken"]["errors"] == 1
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert [telemetry.percentile(values, p) for p in (50, 95, 99)] == [50, 95, 99]
+    assert telemetry.percentile([7], 99) == 7
+    assert telemetry.percentile([], 50) is None
+
+def test_disabled_records_nothing():
+    with telemetry.screen("anything") as span:
+        pass
+    assert span is None and not telemetry.enabled()
+
+if __name__ == "__main__":
+    test_screens_record_active_time_db_and_rows()
+    test_percentile_nearest_rank()
+    test_disabled_records_nothing()
+    print("SUCCESS: telemetry verified.")
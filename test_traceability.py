@@ -0,0 +1,154 @@
+import argparse
+import csv
+import os
+import sqlite3
+import tempfile
+from datetime import datetime
+from sqlalchemy import delete, text
+from models import (get_engine, init_db, get_session, Supplier, Customer, Product, ProductLot, PurchaseOrder,
+                    PurchaseOrderLine, CustomerOrder, CustomerOrderLine)
+import archive_orders
+import dedup
+import traceability
+from traceability import TraceError, record_receipt, record_shipment, record_source
+
+def make_graph(url="sqlite://"):
+    """PO-1 -> L1 -> repack L3 -> blend L4 (with L2 from PO-2); each lot shipped to a different order."""
+    engine = get_engine(url)
+    init_db(engine)
+    session = get_session(engine)
+    supplier = Supplier(name="Assam Estate")
+    assam, blend = Product(sku="ASM", name="Assam"), Product(sku="BRK", name="Breakfast Blend")
+    cafes = [Customer(customer_name=f"Cafe {c}", email_address=f"{c}@cafe.example", ship_to_city="Irvine")
+             for c in "ABCD"]
+    session.add_all([supplier, assam, blend, *cafes])
+    session.flush()
+    pos = [PurchaseOrder(po_number=f"PO-{n}", supplier_id=supplier.id,
+                         lines=[PurchaseOrderLine(product_id=assam.id, qty=100, cost=3.0)]) for n in (1, 2)]
+    lots = {name: ProductLot(product_id=product.id, lot_number=name, quantity=qty)
+            for name, product, qty in (("L1", assam, 40), ("L2", assam, 60), ("L3", assam, 20), ("L4", blend, 30))}
+    orders = [CustomerOrder(customer_id=cafe.id, status="Invoiced", invoice_number=f"INV-{i}", date=datetime(2025, 3, i),
+                            lines=[CustomerOrderLine(product_id=(blend if i == 3 else assam).id, qty=5, selling_price=9.0)])
+              for i, cafe in enumerate(cafes, 1)]
+    session.add_all([*pos, *lots.values(), *orders])
+    record_receipt(session, lots["L1"], pos[0].lines[0], 100)
+    record_receipt(session, lots["L2"], pos[1].lines[0], 100)
+    record_source(session, lots["L3"], lots["L1"], 20)
+    record_source(session, lots["L4"], lots["L3"], 15)
+    record_source(session, lots["L4"], lots["L2"], 15)
+    for order, lot in zip(orders, ("L1", "L3", "L4", "L2")):
+        record_shipment(session, lots[lot], order.lines[0])
+    session.commit()
+    return session, pos, lots, orders
+
+def test_forward_and_backward_traces_follow_lot_genealogy():
+    session, pos, lots, orders = make_graph()
+    forward = traceability.trace_forward(session, po_id=pos[0].id)
+    assert [(r.customer_name, r.invoice_number, r.lot_number) for r in forward] == [
+        ("Cafe A", "INV-1", "L1"), ("Cafe B", "INV-2", "L3"), ("Cafe C", "INV-3", "L4")]
+    assert traceability.downstream_lot_ids(session, lot_ids=[lots["L2"].id]) == {lots["L2"].id, lots["L4"].id}
+    assert len(traceability.trace_forward(session, po_id=pos[1].id, lot_ids=[lots["L1"].id])) == 4
+
+    backward = traceability.trace_backward(session, co_id=orders[2].id)
+    assert [(r.po_number, r.lot_number, r.quantity) for r in backward] == [("PO-1", "L1", 100), ("PO-2", "L2", 100)]
+    assert [r.po_number for r in traceability.trace_backward(session, co_id=orders[3].id)] == ["PO-2"]
+    assert traceability.upstream_lot_ids(session, lot_ids=[lots["L3"].id]) == {lots["L3"].id, lots["L1"].id}
+
+def test_trace_reads_only_indexed_edges():
+    session, pos, lots, orders = make_graph()
+    query = traceability._shipments(traceability.closure(traceability.origin(po_id=pos[0].id)))
+    compiled = query.compile(session.get_bind(), compile_kwargs={"literal_binds": True})
+    plan = [row[-1] for row in session.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+    assert not [step for step in plan if step.startswith("SCAN lot_")], plan
+    assert any("ix_lot_receipts_po" in step for step in plan) and any("ix_lot_shipments_lot" in step for step in plan)
+
+def test_recall_report_survives_archived_orders():
+    session, pos, lots, orders = make_graph()
+    session.execute(delete(CustomerOrderLine).where(CustomerOrderLine.co_id == orders[0].id))
+    session.execute(delete(CustomerOrder).where(CustomerOrder.id == orders[0].id))  # as archive_orders.py does
+    session.commit()
+
+    report = traceability.recall(session, po_id=pos[0].id)
+    assert [lot.lot_number for lot in report.lots] == ["L1", "L3", "L4"]
+    assert [(c.customer_name, c[5], c[6]) for c in report.customers] == [("Cafe A", 1, 5), ("Cafe B", 1, 5), ("Cafe C", 1, 5)]
+    assert report.shipments[0].invoice_number is None
+
+    path = os.path.join(tempfile.mkdtemp(), "recall.csv")
+    assert traceability.export_recall(report, path) == 3
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert [(r["customer_name"], r["invoice_number"], r["email"]) for r in rows] == [
+        ("Cafe A", "(archived)", "A@cafe.example"), ("Cafe B", "INV-2", "B@cafe.example"),
+        ("Cafe C", "INV-3", "C@cafe.example")]
+    assert rows[0]["ship_to"] == "Irvine"
+
+def test_archived_order_numbers_resolve():
+    folder = tempfile.mkdtemp()
+    session, pos, lots, orders = make_graph(f"sqlite:///{os.path.join(folder, 'app.db')}")
+    po_id, co_id = pos[0].id, orders[2].id
+    archive_dir = os.path.join(folder, "archive")
+    archive_orders._ensure_history_db(2025, archive_dir)
+    with sqlite3.connect(archive_orders.history_path(2025, archive_dir)) as history:
+        history.execute("ATTACH DATABASE ? AS live", (os.path.join(folder, "app.db"),))
+        history.execute("INSERT INTO purchase_orders SELECT * FROM live.purchase_orders WHERE id = ?", (po_id,))
+        history.execute("INSERT INTO customer_orders SELECT * FROM live.customer_orders WHERE id = ?", (co_id,))
+    session.execute(delete(PurchaseOrderLine).where(PurchaseOrderLine.po_id == po_id))
+    session.execute(delete(PurchaseOrder).where(PurchaseOrder.id == po_id))
+    session.execute(delete(CustomerOrderLine).where(CustomerOrderLine.co_id == co_id))
+    session.execute(delete(CustomerOrder).where(CustomerOrder.id == co_id))
+    session.commit()
+
+    start = traceability._resolve(session, argparse.Namespace(po="PO-1", lot=None), archive_dir)
+    assert start == {"po_id": po_id}
+    assert [r.lot_number for r in traceability.trace_forward(session, **start)] == ["L1", "L3", "L4"]
+    start = traceability._resolve(session, argparse.Namespace(order="INV-3", lot=None), archive_dir)
+    assert start == {"co_id": co_id}
+    assert [r.lot_number for r in traceability.trace_backward(session, **start)] == ["L1", "L2"]
+    try:
+        traceability._resolve(session, argparse.Namespace(po="PO-9", lot=None), archive_dir)
+        assert False, "Expected TraceError"
+    except TraceError:
+        pass
+
+def test_recall_after_customer_and_supplier_merges():
+    session, pos, lots, orders = make_graph()
+    cafe_b, cafe_c = orders[1].customer_id, orders[2].customer_id
+    dedup.merge(session, "customers", cafe_b, [cafe_c])
+    report = traceability.recall(session, po_id=pos[0].id)
+    assert [s.customer_id for s in report.shipments] == [orders[0].customer_id, cafe_b, cafe_b]
+    assert [(c.customer_name, c[5]) for c in report.customers] == [("Cafe A", 1), ("Cafe B", 2)]
+
+    other = Supplier(name="Assam Estate Ltd")
+    session.add(other)
+    session.commit()
+    original = pos[0].supplier_id
+    dedup.merge(session, "suppliers", other.id, [original])
+    assert {r.supplier_id for r in traceability.trace_backward(session, co_id=orders[2].id)} == {other.id}
+
+    # A link whose customer row is gone anyway still shows up in the recall, by id
+    session.execute(delete(Customer).where(Customer.id == orders[0].customer_id))
+    session.commit()
+    report = traceability.recall(session, po_id=pos[0].id)
+    assert len(report.shipments) == 3
+    assert (report.customers[0].customer_id, report.customers[0].customer_name) == (orders[0].customer_id, None)
+
+def test_invalid_links_are_rejected():
+    session, pos, lots, orders = make_graph()
+    for attempt in (lambda: record_source(session, lots["L1"], lots["L4"], 5),   # L4 already comes from L1
+                    lambda: record_receipt(session, lots["L4"], pos[0].lines[0]),  # wrong product
+                    lambda: record_shipment(session, lots["L1"], orders[0].lines[0], 0),
+                    lambda: traceability.trace_forward(session)):
+        try:
+            attempt()
+            assert False, "Expected TraceError"
+        except TraceError:
+            pass
+
+if __name__ == "__main__":
+    test_forward_and_backward_traces_follow_lot_genealogy()
+    test_trace_reads_only_indexed_edges()
+    test_recall_report_survives_archived_orders()
+    test_archived_order_numbers_resolve()
+    test_recall_after_customer_and_supplier_merges()
+    test_invalid_links_are_rejected()
+    print("SUCCESS: lot traceability verified.")
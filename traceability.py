@@ -0,0 +1,325 @@
+"""
+Lot traceability, from supplier PO to customer shipment, for recalls.
+
+The lot graph has three kinds of edges (tables in models.py):
+
+    lot_receipts    PO line  -> lot        stock received into a lot
+    lot_sources     lot      -> lot        repacks and blends (parent -> child)
+    lot_shipments   lot      -> order line stock shipped to a customer
+
+record_receipt(), record_source() and record_shipment() add edges to the
+session; the caller commits, as with services.build_po().
+
+A trace is one SQL statement. It starts from a set of lots, e.g. every lot
+received on a PO, follows lot_sources with a recursive CTE, and joins the
+reachable lots to their shipments (forward) or receipts (backward). The
+recursion uses UNION rather than UNION ALL, so a lot reached twice is visited
+once. Every step reads an index: lot_sources is keyed on (parent, child) and
+indexed on (child, parent), and both link tables are indexed on lot_id and on
+their order columns. The cost depends on the size of the affected subgraph,
+not on years of history.
+
+Edges carry the order header, supplier and customer ids. After
+archive_orders.py moves old orders out, a recall still lists every affected
+customer and order id. Those rows have no invoice number or order date;
+`archive_orders.py find` looks them up. A PO or invoice number given on the
+command line is resolved in the archive when it is no longer live.
+
+Usage:
+    python traceability.py forward --po PO-2024-0042
+    python traceability.py forward --lot LOT-2405-000123-01
+    python traceability.py backward --order INV-2025-0107
+    python traceability.py recall --po PO-2024-0042 --out recall.csv
+"""
+import argparse
+import csv
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import select, union, func
+from tabulate import tabulate
+
+import archive_orders
+from models import (
+    get_engine, init_db, get_session, Product, ProductLot, PurchaseOrder, Supplier, Customer, CustomerOrder,
+    LotReceipt, LotShipment, LotSource,
+)
+
+Recall = namedtuple("Recall", "lots shipments customers")
+
+EXPORT_FIELDS = ["customer_id", "customer_name", "email", "phone", "ship_to", "co_id", "invoice_number",
+                 "order_date", "co_line_id", "sku", "lot_number", "quantity", "shipped_at"]
+
+
+class TraceError(Exception):
+    pass
+
+
+# --- Recording edges ---
+
+def _ensure_ids(session, *objs):
+    if any(obj.id is None for obj in objs):
+        session.flush()
+
+
+def record_receipt(session, lot, po_line, quantity=None, when=None):
+    """Links a lot to the PO line it was received on. `quantity` defaults to the lot's quantity."""
+    if lot.product_id != po_line.product_id:
+        raise TraceError(f"Lot {lot.lot_number} is not the product ordered on PO line {po_line.id}.")
+    quantity = lot.quantity if quantity is None else quantity
+    if not quantity or quantity <= 0:
+        raise TraceError("Received quantity must be positive.")
+    _ensure_ids(session, lot, po_line)
+    link = LotReceipt(lot_id=lot.id, po_line_id=po_line.id, po_id=po_line.po_id,
+                      supplier_id=po_line.order.supplier_id, quantity=quantity,
+                      received_at=when or lot.date_received or datetime.utcnow())
+    session.add(link)
+    return link
+
+
+def record_shipment(session, lot, co_line, quantity=None, when=None):
+    """Links an order line to a lot it was shipped from. `quantity` defaults to the line's qty."""
+    if lot.product_id != co_line.product_id:
+        raise TraceError(f"Lot {lot.lot_number} is not the product on order line {co_line.id}.")
+    quantity = co_line.qty if quantity is None else quantity
+    if not quantity or quantity <= 0:
+        raise TraceError("Shipped quantity must be positive.")
+    _ensure_ids(session, lot, co_line)
+    link = LotShipment(lot_id=lot.id, co_line_id=co_line.id, co_id=co_line.co_id,
+                       customer_id=co_line.order.customer_id, quantity=quantity,
+                       shipped_at=when or datetime.utcnow())
+    session.add(link)
+    return link
+
+
+def record_source(session, child, parent, quantity):
+    """Records that `quantity` of `parent` went into `child` (a repack or blend)."""
+    if quantity is None or quantity <= 0:
+        raise TraceError("Source quantity must be positive.")
+    _ensure_ids(session, child, parent)
+    if child.id == parent.id or parent.id in downstream_lot_ids(session, lot_ids=[child.id]):
+        raise TraceError(f"Lot {parent.lot_number} already comes from {child.lot_number}.")
+    link = LotSource(parent_lot_id=parent.id, child_lot_id=child.id, quantity=quantity)
+    session.add(link)
+    return link
+
+
+# --- Graph queries ---
+
+def origin(po_id=None, po_line_id=None, co_id=None, co_line_id=None, lot_ids=None):
+    """SELECT of the lot ids a trace starts from; any combination of starting points."""
+    parts = []
+    if po_id is not None:
+        parts.append(select(LotReceipt.lot_id).where(LotReceipt.po_id == po_id))
+    if po_line_id is not None:
+        parts.append(select(LotReceipt.lot_id).where(LotReceipt.po_line_id == po_line_id))
+    if co_id is not None:
+        parts.append(select(LotShipment.lot_id).where(LotShipment.co_id == co_id))
+    if co_line_id is not None:
+        parts.append(select(LotShipment.lot_id).where(LotShipment.co_line_id == co_line_id))
+    if lot_ids:
+        parts.append(select(ProductLot.id.label("lot_id")).where(ProductLot.id.in_(list(lot_ids))))
+    if not parts:
+        raise TraceError("Nothing to trace from: give a PO, an order or a lot.")
+    return parts[0] if len(parts) == 1 else select(union(*parts).subquery().c.lot_id)
+
+
+def closure(start, forward=True):
+    """Recursive CTE (column lot_id) of the start lots and every lot made from them, or that they came from."""
+    lots = start.cte("traced_lots", recursive=True)
+    step_from, step_to = ((LotSource.parent_lot_id, LotSource.child_lot_id) if forward
+                          else (LotSource.child_lot_id, LotSource.parent_lot_id))
+    return lots.union(select(step_to.label("lot_id")).join(lots, step_from == lots.c.lot_id))
+
+
+def downstream_lot_ids(session, **start):
+    return set(session.scalars(select(closure(origin(**start), forward=True).c.lot_id)))
+
+
+def upstream_lot_ids(session, **start):
+    return set(session.scalars(select(closure(origin(**start), forward=False).c.lot_id)))
+
+
+def _lots(session, lots):
+    return session.execute(
+        select(ProductLot.id, Product.sku, ProductLot.lot_number, ProductLot.warehouse, ProductLot.quantity,
+               ProductLot.expiration_date)
+        .join(lots, ProductLot.id == lots.c.lot_id)
+        .join(Product, Product.id == ProductLot.product_id)
+        .order_by(Product.sku, ProductLot.lot_number)
+    ).all()
+
+
+def _shipments(lots):
+    return (
+        select(LotShipment.customer_id, Customer.customer_name, LotShipment.co_id, CustomerOrder.invoice_number,
+               CustomerOrder.date, LotShipment.co_line_id, Product.sku, ProductLot.lot_number,
+               LotShipment.quantity, LotShipment.shipped_at)
+        .join(lots, LotShipment.lot_id == lots.c.lot_id)
+        .join(ProductLot, ProductLot.id == LotShipment.lot_id)
+        .join(Product, Product.id == ProductLot.product_id)
+        .outerjoin(Customer, Customer.id == LotShipment.customer_id)  # never drop a shipment from a recall
+        .outerjoin(CustomerOrder, CustomerOrder.id == LotShipment.co_id)  # NULL once archived
+        .order_by(Customer.customer_name, LotShipment.co_id, LotShipment.co_line_id, ProductLot.lot_number)
+    )
+
+
+def trace_forward(session, **start):
+    """
+    Every shipment of the start lots and the lots made from them:
+    (customer_id, customer_name, co_id, invoice_number, order_date, co_line_id, sku, lot_number, quantity, shipped_at).
+    """
+    return session.execute(_shipments(closure(origin(**start), forward=True))).all()
+
+
+def trace_backward(session, **start):
+    """
+    Every receipt behind the start lots, through the lots they came from:
+    (po_id, po_number, po_date, supplier_id, supplier, po_line_id, sku, lot_number, quantity, received_at).
+    """
+    lots = closure(origin(**start), forward=False)
+    return session.execute(
+        select(LotReceipt.po_id, PurchaseOrder.po_number, PurchaseOrder.date, LotReceipt.supplier_id, Supplier.name,
+               LotReceipt.po_line_id, Product.sku, ProductLot.lot_number, LotReceipt.quantity, LotReceipt.received_at)
+        .join(lots, LotReceipt.lot_id == lots.c.lot_id)
+        .join(ProductLot, ProductLot.id == LotReceipt.lot_id)
+        .join(Product, Product.id == ProductLot.product_id)
+        .outerjoin(Supplier, Supplier.id == LotReceipt.supplier_id)
+        .outerjoin(PurchaseOrder, PurchaseOrder.id == LotReceipt.po_id)  # NULL once archived
+        .order_by(LotReceipt.po_id, LotReceipt.po_line_id, ProductLot.lot_number)
+    ).all()
+
+
+def recall(session, **start):
+    """
+    Everything a recall of the start lots touches, as a Recall of
+    lots:      every downstream lot, with the stock still on hand to quarantine
+    shipments: as trace_forward()
+    customers: (customer_id, name, email, phone, ship_to, orders, quantity, first_shipped, last_shipped)
+    """
+    lots = closure(origin(**start), forward=True)
+    shipped = select(LotShipment).join(lots, LotShipment.lot_id == lots.c.lot_id).subquery()
+    # Grouped on the link's customer_id: a customer row that no longer exists still shows up, by id
+    customers = session.execute(
+        select(shipped.c.customer_id, Customer.customer_name, Customer.email_address, Customer.ship_to_phone,
+               Customer.ship_to_formatted, func.count(shipped.c.co_id.distinct()), func.sum(shipped.c.quantity),
+               func.min(shipped.c.shipped_at), func.max(shipped.c.shipped_at))
+        .outerjoin(Customer, Customer.id == shipped.c.customer_id)
+        .group_by(shipped.c.customer_id)
+        .order_by(Customer.customer_name, shipped.c.customer_id)
+    ).all()
+    return Recall(_lots(session, lots), session.execute(_shipments(lots)).all(), customers)
+
+
+def export_recall(report, path):
+    """Writes one CSV row per affected shipment, with the customer's contact details."""
+    contacts = {c[0]: c for c in report.customers}
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for cid, name, co_id, invoice, date, line_id, sku, lot, qty, shipped in report.shipments:
+            _, _, email, phone, ship_to = contacts[cid][:5]
+            writer.writerow({
+                "customer_id": cid, "customer_name": name, "email": email, "phone": phone,
+                "ship_to": (ship_to or "").replace("\n", ", "), "co_id": co_id,
+                "invoice_number": invoice if date else "(archived)", "order_date": _date(date),
+                "co_line_id": line_id, "sku": sku, "lot_number": lot, "quantity": qty, "shipped_at": _date(shipped),
+            })
+    return len(report.shipments)
+
+
+# --- CLI ---
+
+def _date(value):
+    return value.strftime("%Y-%m-%d") if value else ""
+
+
+def _order_id(session, kind, number, archive_dir=archive_orders.ARCHIVE_DIR):
+    """Id of the PO ('PO') or customer order ('CO') with this number, live or archived; None if there is none."""
+    model, column = (PurchaseOrder, PurchaseOrder.po_number) if kind == "PO" else \
+        (CustomerOrder, CustomerOrder.invoice_number)
+    order_id = session.scalar(select(model.id).where(column == number))
+    if order_id is not None or session.get_bind().dialect.name != "sqlite":
+        return order_id
+    ids = {row[1] for row in archive_orders.find_order(session.get_bind(), number, archive_dir)
+           if row[0] == kind and row[2] == number}
+    if len(ids) > 1:
+        raise TraceError(f"{number} matches archived orders {', '.join(str(i) for i in sorted(ids))}; give the id.")
+    return ids.pop() if ids else None
+
+
+def _resolve(session, args, archive_dir=archive_orders.ARCHIVE_DIR):
+    """
+    Turns the --po/--order/--lot options into origin() keyword arguments.
+    Order numbers are looked up in the archive too (see archive_orders.py).
+    """
+    start = {}
+    if getattr(args, "po", None):
+        po_id = _order_id(session, "PO", args.po, archive_dir)
+        if po_id is None and not args.po.isdigit():
+            raise TraceError(f"PO {args.po} not found.")
+        start["po_id"] = po_id if po_id is not None else int(args.po)
+    if getattr(args, "order", None):
+        co_id = _order_id(session, "CO", args.order, archive_dir)
+        if co_id is None and not args.order.isdigit():
+            raise TraceError(f"Order {args.order} not found.")
+        start["co_id"] = co_id if co_id is not None else int(args.order)
+    if args.lot:
+        lot_ids = list(session.scalars(select(ProductLot.id).where(ProductLot.lot_number.in_(args.lot))))
+        if not lot_ids:
+            raise TraceError(f"No lot numbered {', '.join(args.lot)}.")
+        start["lot_ids"] = lot_ids
+    if not start:
+        raise TraceError("Give a starting point (see --help).")
+    return start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trace lots from supplier POs to customer shipments.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("forward", "Shipments made from a PO or lot"),
+                            ("recall", "Lots, shipments and customers affected by a PO or lot")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--po", help="PO number (or id)")
+        p.add_argument("--lot", nargs="+", help="Lot number(s)")
+        if name == "recall":
+            p.add_argument("--out", help="Write affected shipments to this CSV file")
+    b = sub.add_parser("backward", help="POs and suppliers behind an order or lot")
+    b.add_argument("--order", help="Invoice number (or order id)")
+    b.add_argument("--lot", nargs="+", help="Lot number(s)")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    init_db(engine)
+    session = get_session(engine)
+
+    try:
+        start = _resolve(session, args)
+    except TraceError as e:
+        print(f"Error: {e}")
+        return
+
+    if args.command == "forward":
+        rows = [(name or f"#{cid} (not found)", co_id, invoice if date else "(archived)", _date(date), sku, lot, qty,
+                 _date(shipped))
+                for cid, name, co_id, invoice, date, _, sku, lot, qty, shipped in trace_forward(session, **start)]
+        print(tabulate(rows, headers=["Customer", "Order", "Invoice #", "Date", "SKU", "Lot #", "Qty", "Shipped"]))
+    elif args.command == "backward":
+        rows = [(po_number or f"#{po_id} (archived)", _date(date), supplier, sku, lot, qty, _date(received))
+                for po_id, po_number, date, _, supplier, _, sku, lot, qty, received in trace_backward(session, **start)]
+        print(tabulate(rows, headers=["PO", "Date", "Supplier", "SKU", "Lot #", "Qty", "Received"]))
+    else:
+        report = recall(session, **start)
+        print(f"Lots affected: {len(report.lots)} ({sum(lot.quantity or 0 for lot in report.lots)} units still on hand)")
+        print(tabulate([(sku, lot, w or "", q, _date(exp)) for _, sku, lot, w, q, exp in report.lots],
+                       headers=["SKU", "Lot #", "Warehouse", "On hand", "Expires"]))
+        print(f"\nCustomers to notify: {len(report.customers)}")
+        print(tabulate([(name or f"#{cid} (not found)", email or "", orders, qty, _date(first), _date(last))
+                        for cid, name, email, _, _, orders, qty, first, last in report.customers],
+                       headers=["Customer", "Email", "Orders", "Qty", "First shipped", "Last shipped"]))
+        if args.out:
+            print(f"\nWrote {export_recall(report, args.out)} shipments to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
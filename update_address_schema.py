@@ -0,0 +1,52 @@
+import sqlite3
+import os
+
+DB_FILE = 'app.db'
+
+def add_column_if_not_exists(cursor, table, column, col_type):
+    try:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
+        print(f"Added column {column} to {table}")
+    except sqlite3.OperationalError as e:
+        if 'duplicate column name' in str(e):
+            print(f"Column {column} already exists in {table}")
+        else:
+            raise e
+
+def main():
+    if not os.path.exists(DB_FILE):
+        print(f"Database file {DB_FILE} not found.")
+        return
+
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+
+    # Precomputed address blocks (see addresses.py)
+    columns_to_add = [
+        ('customers', 'ship_to_formatted', 'TEXT'),
+        ('customers', 'bill_to_formatted', 'TEXT'),
+        ('suppliers', 'address_formatted', 'TEXT'),
+        ('suppliers', 'bill_to_formatted', 'TEXT'),
+        ('our_company', 'address_formatted', 'TEXT'),
+    ]
+
+    print("Updating schema (formatted addresses)...")
+    for table_name, col_name, col_type in columns_to_add:
+        add_column_if_not_exists(cursor, table_name, col_name, col_type)
+
+    conn.commit()
+    conn.close()
+
+    # Backfill through the ORM so the same formatter fills every row
+    from addresses import refresh_all
+    from models import get_engine, get_session, Customer, Supplier, OurCompany
+    engine = get_engine(f"sqlite:///{DB_FILE}")
+    session = get_session(engine)
+    for cls in (Customer, Supplier, OurCompany):
+        print(f"Formatted addresses of {refresh_all(session, cls)} {cls.__tablename__} rows")
+    session.close()
+    engine.dispose()
+    print("Address schema update complete.")
+
+if __name__ == "__main__":
+    main()
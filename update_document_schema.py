@@ -0,0 +1,65 @@
+import sqlite3
+import os
+from datetime import datetime
+
+from document_store import file_metadata
+
+DB_FILE = 'app.db'
+
+def add_column_if_not_exists(cursor, table, column, col_type):
+    try:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
+        print(f"Added column {column} to {table}")
+    except sqlite3.OperationalError as e:
+        if 'duplicate column name' in str(e):
+            print(f"Column {column} already exists in {table}")
+        else:
+            raise e
+
+def main():
+    if not os.path.exists(DB_FILE):
+        print(f"Database file {DB_FILE} not found.")
+        return
+
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+
+    columns_to_add = [
+        ('documents', 'original_name', 'VARCHAR(255)'),
+        ('documents', 'size_bytes', 'INTEGER'),
+        ('documents', 'sha256', 'VARCHAR(64)'),
+        ('documents', 'mime_type', 'VARCHAR(100)'),
+        ('documents', 'created_at', 'DATETIME'),
+        ('documents', 'updated_at', 'DATETIME'),
+    ]
+
+    print("Updating schema (document metadata)...")
+    for table_name, col_name, col_type in columns_to_add:
+        add_column_if_not_exists(cursor, table_name, col_name, col_type)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_documents_reference ON documents (reference_type, reference_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_documents_sha256 ON documents (sha256)")
+
+    # Backfill metadata for documents registered before this change
+    rows = cursor.execute("SELECT id, file_path FROM documents WHERE sha256 IS NULL").fetchall()
+    now = datetime.utcnow().isoformat(sep=' ')
+    updated = 0
+    for doc_id, path in rows:
+        if not os.path.isfile(path):
+            print(f"Document {doc_id}: file missing ({path}), skipped")
+            continue
+        meta = file_metadata(path)
+        cursor.execute(
+            "UPDATE documents SET original_name = ?, size_bytes = ?, sha256 = ?, mime_type = ?, "
+            "created_at = COALESCE(created_at, ?), updated_at = COALESCE(updated_at, ?) WHERE id = ?",
+            (os.path.basename(path), meta['size_bytes'], meta['sha256'], meta['mime_type'], now, now, doc_id),
+        )
+        updated += 1
+    print(f"Backfilled metadata for {updated} document(s).")
+
+    conn.commit()
+    conn.close()
+    print("Document schema update complete.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import sqlite3
+import os
+
+DB_FILE = 'app.db'
+
+def add_column_if_not_exists(cursor, table, column, col_type):
+    try:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
+        print(f"Added column {column} to {table}")
+    except sqlite3.OperationalError as e:
+        if 'duplicate column name' in str(e):
+            print(f"Column {column} already exists in {table}")
+        else:
+            raise e
+
+def main():
+    if not os.path.exists(DB_FILE):
+        print(f"Database file {DB_FILE} not found.")
+        return
+
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+
+    print("Updating schema (lot expiry monitoring)...")
+    add_column_if_not_exists(cursor, 'product_lots', 'warehouse', 'VARCHAR(50)')
+
+    # Partial covering index for the expiry scans (see expiry_monitor.py)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS ix_product_lots_expiry ON product_lots "
+        "(expiration_date, product_id, warehouse, quantity, cost_price) WHERE quantity > 0"
+    )
+    print("Ensured index ix_product_lots_expiry")
+
+    conn.commit()
+    conn.close()
+
+    # expiry_alerts is a new table; create_all adds it
+    from models import get_engine, init_db
+    engine = get_engine(f"sqlite:///{DB_FILE}")
+    init_db(engine)
+    engine.dispose()
+    print("Expiry schema update complete.")
+
+if __name__ == "__main__":
+    main()
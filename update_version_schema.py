@@ -0,0 +1,45 @@
+import sqlite3
+import os
+
+DB_FILE = 'app.db'
+
+def add_column_if_not_exists(cursor, table, column, col_type):
+    try:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
+        print(f"Added column {column} to {table}")
+    except sqlite3.OperationalError as e:
+        if 'duplicate column name' in str(e):
+            print(f"Column {column} already exists in {table}")
+        else:
+            raise e
+
+def main():
+    if not os.path.exists(DB_FILE):
+        print(f"Database file {DB_FILE} not found.")
+        return
+
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+
+    # Optimistic locking columns (SQLAlchemy version_id_col)
+    columns_to_add = [
+        ('purchase_orders', 'version_id', 'INTEGER NOT NULL DEFAULT 1'),
+        ('customer_orders', 'version_id', 'INTEGER NOT NULL DEFAULT 1'),
+        ('products', 'version_id', 'INTEGER NOT NULL DEFAULT 1'),
+        ('product_lots', 'version_id', 'INTEGER NOT NULL DEFAULT 1'),
+    ]
+
+    print("Updating schema (version columns)...")
+    for table_name, col_name, col_type in columns_to_add:
+        add_column_if_not_exists(cursor, table_name, col_name, col_type)
+
+    # Many concurrent writers: switch the database file to WAL journaling
+    mode = cursor.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+    print(f"Journal mode: {mode}")
+
+    conn.commit()
+    conn.close()
+    print("Version schema update complete.")
+
+if __name__ == "__main__":
+    main()